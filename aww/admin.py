@@ -11,8 +11,11 @@ from .models import (
     Group,
     IndividualShoppingItem,
     IndividualMeal,
-    Individual
+    Individual,
+    OutgoingEmail
 )
+from .signals import recipes_changed
+from .versioning import bump_version
 
 # ********* RECIPE *********
 class RecipeIngredientInline(admin.StackedInline):
@@ -24,9 +27,15 @@ class RecipeStepInline(admin.StackedInline):
     extra = 1
 
 class RecipeAdmin(admin.ModelAdmin):
-    fields = ['name', 'photo', 'url']
+    fields = ['name', 'photo', 'url', 'servings']
     inlines = [RecipeIngredientInline, RecipeStepInline]
 
+    # The inlines are saved after the recipe itself
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        bump_version(form.instance)
+        recipes_changed.send(sender=Recipe, recipe_ids=[form.instance.id])
+
 # ********* GROUP *********
 class GroupShoppingItemInline(admin.StackedInline):
     model = GroupShoppingItem
@@ -40,6 +49,11 @@ class GroupAdmin(admin.ModelAdmin):
     fields = ['name', 'members', 'join_requests']
     inlines = [GroupMealsInline, GroupShoppingItemInline]
 
+    # Meals/shopping items edited here also make the clients' versions (and the generated shopping list) stale
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        bump_version(form.instance)
+
 # ********* INDIVIDUAL *********
 class IndividualShoppingItemInline(admin.StackedInline):
     model = IndividualShoppingItem
@@ -53,9 +67,20 @@ class IndividualAdmin(admin.ModelAdmin):
     fields = ['groups', 'group_requests']
     inlines = [IndividualMealInline, IndividualShoppingItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        bump_version(form.instance)
+
+# ********* EMAIL *********
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'created_at', 'attempts', 'sent_at', 'failed_at']
+    list_filter = ['sent_at', 'failed_at']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Individual, IndividualAdmin)
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
 # The regular Django groups aren't used since we don't care about privileges
 # other than the super user.
 admin.site.unregister(DjangoGroup)
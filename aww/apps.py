@@ -5,4 +5,6 @@ class AwwConfig(AppConfig):
     name = 'aww'
 
     def ready(self):
-        import aww.signals
\ No newline at end of file
+        import aww.signals
+        from aww.emails import compile_emails
+        compile_emails()
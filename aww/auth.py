@@ -0,0 +1,116 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from graphql_auth.backends import GraphQLAuthBackend
+from graphql_auth.models import UserStatus
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_credentials, get_payload
+
+from .models import Individual
+
+# graphql_jwt's JSONWebTokenMiddleware authenticates the request when its first field is resolved
+# (and again for every field while there's no user, so an invalid token was decoded once per field),
+# querying the user, and then almost every resolver queries the user's individual.
+# JWTBackend (c.f. AUTHENTICATION_BACKENDS) decodes and verifies the token once per request and loads
+# the user with their status and individual in one query. The rows are kept for USER_CACHE_TTL seconds
+# by username, so the user's next requests don't query them at all; each request gets its own instances.
+# Only the individual's id is kept: its version changes with every update of the individual
+# (c.f. versioning.py), so it's loaded the first time a request reads it.
+# A user's rows are dropped when the user or their status is saved or deleted (c.f. signals.py),
+# changes made by another process show up after USER_CACHE_TTL at most.
+# graphql_jwt's tokens have no jti: the cache is keyed by the username, the token being verified
+# (signature and expiration) on every request.
+USER_CACHE_TTL = 30
+MAX_CACHED_USERS = 10000
+
+_users = {}
+_usernames = {}
+_lock = threading.Lock()
+
+
+def _row(instance):
+    return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def _instance(model, row):
+    return model.from_db(DEFAULT_DB_ALIAS, [field.attname for field in model._meta.concrete_fields], row)
+
+
+def _load(username):
+    User = get_user_model()
+    user = User.objects.select_related('status', 'individual').filter(**{User.USERNAME_FIELD: username}).first()
+    if user is None:
+        return None
+    status = _row(user.status) if hasattr(user, 'status') else None
+    individual = user.individual.id if hasattr(user, 'individual') else None
+    return user.pk, _row(user), status, individual
+
+
+def _build(entry):
+    _, user_row, status_row, individual_id = entry
+    user = _instance(get_user_model(), user_row)
+    if status_row is not None:
+        user.status = _instance(UserStatus, status_row)
+    if individual_id is not None:
+        # Its version (and anything else but its id) is read from the database if it's used
+        individual = Individual.from_db(DEFAULT_DB_ALIAS, ['id', 'user_id'], [individual_id, user.pk])
+        user.individual = individual
+    return user
+
+
+def cached_user(username):
+    """A new User (with its status and individual) of the username, from the cache if it's recent enough"""
+    now = time.monotonic()
+    cached = _users.get(username)
+    if cached is not None and cached[0] > now:
+        return _build(cached[1])
+    entry = _load(username)
+    if entry is None:
+        return None
+    with _lock:
+        if len(_users) >= MAX_CACHED_USERS:
+            _users.clear()
+            _usernames.clear()
+        _users[username] = (now + USER_CACHE_TTL, entry)
+        _usernames[entry[0]] = username
+    return _build(entry)
+
+
+def forget_user(user_id, username=None):
+    """Drops the cached rows of the user, and of whoever had their username (it may have been someone else's)"""
+    with _lock:
+        for name in (_usernames.pop(user_id, None), username):
+            if name is not None:
+                _users.pop(name, None)
+
+
+def user_for_token(token, request=None):
+    """The active user of the token, None if the token isn't valid (or has expired)"""
+    try:
+        payload = get_payload(token, request)
+    except JSONWebTokenError:
+        return None
+    username = jwt_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(payload)
+    if not username:
+        return None
+    user = cached_user(username)
+    return user if user is not None and user.is_active else None
+
+
+class JWTBackend(GraphQLAuthBackend):
+    """GraphQLAuthBackend that authenticates each request once, c.f. above"""
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, "_jwt_token_auth", False):
+            return None
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+        authenticated = getattr(request, '_jwt_authenticated', None)
+        if authenticated is None or authenticated[0] != token:
+            authenticated = (token, user_for_token(token, request))
+            request._jwt_authenticated = authenticated
+        return authenticated[1]
@@ -0,0 +1,101 @@
+import threading
+
+from django.db import IntegrityError, transaction
+
+from utils.ingredients import ingredient_key
+
+from .indexes import ingredient_prefixes
+from .models import Ingredient
+
+# Every ingredient row (of a recipe or a shopping list) references the catalogue entry of its name.
+# The entry is found by the normalized name ("Tomatoes, diced" and "tomato" are the same entry)
+# and created the first time a name is seen, the spellings being kept as its aliases.
+# The spellings this process has interned are cached, so saving an ingredient only queries
+# the catalogue the first time its spelling is seen. A spelling is only cached once the transaction
+# that interned it has committed, so a rolled back entry is never referenced from the cache.
+MAX_CACHED_SPELLINGS = 10000
+MAX_ALIASES = 50
+
+_spellings = {}
+_lock = threading.Lock()
+
+
+def spelling(name):
+    return ' '.join(name.lower().split())[:100]
+
+
+def _cache(alias, ingredient_id):
+    with _lock:
+        if len(_spellings) >= MAX_CACHED_SPELLINGS:
+            _spellings.clear()
+        _spellings[alias] = ingredient_id
+
+
+def clear_cache():
+    with _lock:
+        _spellings.clear()
+
+
+def _entry(alias):
+    key = ingredient_key(alias)[:100]
+    ingredient = Ingredient.objects.filter(name=key).first()
+    if ingredient is None:
+        try:
+            with transaction.atomic():
+                return Ingredient.objects.create(name=key, aliases=[alias]).id
+        # Created by someone else in the meantime
+        except IntegrityError:
+            ingredient = Ingredient.objects.get(name=key)
+    if alias not in ingredient.aliases and len(ingredient.aliases) < MAX_ALIASES:
+        with transaction.atomic():
+            ingredient = Ingredient.objects.select_for_update().get(pk=ingredient.pk)
+            if alias not in ingredient.aliases:
+                ingredient.aliases.append(alias)
+                ingredient.save(update_fields=['aliases'])
+    return ingredient.id
+
+
+def intern_ingredient(name):
+    """Returns the id of the catalogue entry of an ingredient's name, creating the entry if there isn't one"""
+    alias = spelling(name)
+    ingredient_id = _spellings.get(alias)
+    if ingredient_id is None:
+        ingredient_id = _entry(alias)
+        transaction.on_commit(lambda: _cache(alias, ingredient_id))
+    return ingredient_id
+
+
+def intern_ingredients(names):
+    """
+    Returns {name: id of its catalogue entry} for the names, like intern_ingredient
+    but with a query for all the entries that aren't cached (used by bulk writes, c.f. importer.py)
+    """
+    aliases = {name: spelling(name) for name in names}
+    ids = {alias: _spellings.get(alias) for alias in set(aliases.values())}
+    missing = {alias: ingredient_key(alias)[:100] for alias, ingredient_id in ids.items() if ingredient_id is None}
+    if missing:
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=key, aliases=[]) for key in set(missing.values())], ignore_conflicts=True
+            )
+            # Locked in the same order by everyone, so concurrent imports don't deadlock
+            entries = {
+                ingredient.name: ingredient
+                for ingredient in Ingredient.objects.select_for_update().filter(name__in=set(missing.values())).order_by('name')
+            }
+            changed = {}
+            for alias, key in missing.items():
+                ingredient = entries[key]
+                if alias not in ingredient.aliases and len(ingredient.aliases) < MAX_ALIASES:
+                    ingredient.aliases.append(alias)
+                    changed[ingredient.pk] = ingredient
+                ids[alias] = ingredient.id
+            Ingredient.objects.bulk_update(changed.values(), ['aliases'])
+
+        def cache():
+            for alias in missing:
+                _cache(alias, ids[alias])
+            # bulk_update doesn't send post_save, the autocomplete index reads the new spellings itself
+            ingredient_prefixes.refresh(list(changed))
+        transaction.on_commit(cache)
+    return {name: ids[alias] for name, alias in aliases.items()}
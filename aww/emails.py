@@ -0,0 +1,117 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.dispatch import receiver
+from django.template import Context, engines
+from django.template.loader import get_template
+from django.utils.autoreload import file_changed
+from django.utils.html import strip_tags
+
+from graphql_auth.constants import TokenAction
+from graphql_auth.settings import graphql_auth_settings as auth_settings
+from graphql_auth.utils import get_token
+
+# The account emails (activation, password set and reset, c.f. templates/email/) are compiled once,
+# when the app starts (AwwConfig.ready), and each email only renders its recipient's variables
+# into the compiled templates. graphql_auth renders the emails it sends one at a time with render_to_string,
+# which finds the same compiled templates in the cached template loader (c.f. TEMPLATES in settings).
+# The plain text version graphql_auth sends is strip_tags of the html, which costs more than rendering it:
+# here it's strip_tags of the template itself, compiled as its own template, which renders the same text
+# as long as the template has no tags ({% %}) or |safe variables (the others are escaped, so they can't
+# add html tags), otherwise each email's html is stripped like graphql_auth does.
+# Emails sent in bulk (the resend_activation command) share everything but the user and their token.
+BATCH_SIZE = 500
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+class CompiledEmail:
+    def __init__(self, subject, template):
+        self.subject = get_template(subject).template
+        self.html = get_template(template).template
+        source = self.html.source
+        if '{%' in source or '|safe' in source:
+            self.text = None
+        else:
+            self.text = engines['django'].from_string(strip_tags(source)).template
+
+    def render(self, context):
+        """Returns (subject, text, html) of the email for the template Context"""
+        subject = self.subject.render(context).replace("\n", " ").strip()
+        html = self.html.render(context)
+        text = self.text.render(context) if self.text is not None else strip_tags(html)
+        return subject, text, html
+
+
+def compiled(subject, template):
+    """The CompiledEmail of the subject and html templates, compiled the first time they're asked for"""
+    key = (subject, template)
+    email = _compiled.get(key)
+    if email is None:
+        email = CompiledEmail(subject, template)
+        with _lock:
+            _compiled[key] = email
+    return email
+
+
+@receiver(file_changed, dispatch_uid='compiled_emails_template_changed')
+def clear_compiled(**kwargs):
+    """runserver reloads the templates that changed without restarting, so they're compiled again"""
+    with _lock:
+        _compiled.clear()
+
+
+def compile_emails():
+    """Compiles the templates of every email graphql_auth sends, so no email pays for it"""
+    for kind in ('ACTIVATION', 'ACTIVATION_RESEND', 'SECONDARY_EMAIL_ACTIVATION', 'PASSWORD_SET', 'PASSWORD_RESET'):
+        compiled(getattr(auth_settings, f'EMAIL_SUBJECT_{kind}'), getattr(auth_settings, f'EMAIL_TEMPLATE_{kind}'))
+
+
+def render_emails(email, shared, recipients):
+    """
+    Yields (subject, text, html) of the CompiledEmail for each recipient's variables (dicts),
+    shared being the variables of every recipient
+    """
+    context = Context(shared)
+    for variables in recipients:
+        with context.push(variables):
+            yield email.render(context)
+
+
+def unverified_users():
+    return (
+        get_user_model().objects
+        .filter(status__verified=False, status__archived=False)
+        .exclude(email='')
+        .order_by('pk')
+    )
+
+
+def send_activation_emails(users, batch_size=BATCH_SIZE, connection=None):
+    """
+    Sends the activation email again to the users (like graphql_auth's resendActivationEmail, in batches,
+    each batch going to the outbox at once), returns how many were sent
+    """
+    email = compiled(auth_settings.EMAIL_SUBJECT_ACTIVATION_RESEND, auth_settings.EMAIL_TEMPLATE_ACTIVATION_RESEND)
+    shared = {
+        "path": auth_settings.ACTIVATION_PATH_ON_EMAIL,
+        "timestamp": time.time(),
+        **auth_settings.EMAIL_TEMPLATE_VARIABLES,
+    }
+    connection = connection or get_connection(fail_silently=False)
+    users = iter(users)
+    sent = 0
+    while True:
+        batch = [user for _, user in zip(range(batch_size), users)]
+        if not batch:
+            return sent
+        recipients = ({"user": user, "token": get_token(user, TokenAction.ACTIVATION)} for user in batch)
+        messages = []
+        for user, (subject, text, html) in zip(batch, render_emails(email, shared, recipients)):
+            message = EmailMultiAlternatives(subject, text, auth_settings.EMAIL_FROM, [user.email], connection=connection)
+            message.attach_alternative(html, 'text/html')
+            messages.append(message)
+        sent += connection.send_messages(messages)
@@ -0,0 +1,113 @@
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import (
+    Group,
+    GroupMeal,
+    GroupShoppingItem,
+    Individual,
+    IndividualMeal,
+    IndividualShoppingItem,
+    Recipe,
+    RecipeIngredient,
+    RecipeStep
+)
+
+# Exports of the recipes, groups and individuals as NDJSON (a JSON object per line), written as they're read
+# so memory stays flat whatever the size of the data: the rows are read with a server-side cursor
+# (.iterator(chunk_size)), and for every chunk of chunk_size rows their ingredients/steps/meals/shopping items
+# are read with one query per relation (prefetch_related doesn't work with iterator).
+# Every object has a "type": "recipe", "group" or "individual".
+CHUNK_SIZE = 500
+INGREDIENT_FIELDS = ('name', 'quantity', 'unit')
+MEAL_FIELDS = ('day', 'time', 'text', 'recipe_id')
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _related(model, key, ids, fields, order_by=None):
+    """{key: [{field: value}]} of the rows of model whose key is in ids"""
+    related = defaultdict(list)
+    rows = model.objects.filter(**{f'{key}__in': ids})
+    if order_by:
+        rows = rows.order_by(key, order_by)
+    for row in rows.values(key, *fields):
+        related[row.pop(key)].append(row)
+    return related
+
+
+def export_recipes(chunk_size=CHUNK_SIZE):
+    recipes = Recipe.objects.order_by('id').values('id', 'name', 'photo', 'url', 'servings', 'version')
+    for chunk in _chunks(recipes.iterator(chunk_size=chunk_size), chunk_size):
+        ids = [recipe['id'] for recipe in chunk]
+        ingredients = _related(RecipeIngredient, 'recipe_id', ids, INGREDIENT_FIELDS)
+        steps = _related(RecipeStep, 'recipe_id', ids, ('step',), order_by='position')
+        for recipe in chunk:
+            yield {
+                'type': 'recipe',
+                **recipe,
+                'ingredients': ingredients[recipe['id']],
+                'steps': [step['step'] for step in steps[recipe['id']]],
+            }
+
+
+def export_groups(groups, chunk_size=CHUNK_SIZE):
+    for chunk in _chunks(groups.order_by('id').values('id', 'name', 'version').iterator(chunk_size=chunk_size), chunk_size):
+        ids = [group['id'] for group in chunk]
+        members = _related(Group.members.through, 'group_id', ids, ('individual__user__email',))
+        meals = _related(GroupMeal, 'group_id', ids, MEAL_FIELDS)
+        shopping_list = _related(GroupShoppingItem, 'group_id', ids, INGREDIENT_FIELDS)
+        for group in chunk:
+            yield {
+                'type': 'group',
+                **group,
+                'members': [member['individual__user__email'] for member in members[group['id']]],
+                'meals': meals[group['id']],
+                'shopping_list': shopping_list[group['id']],
+            }
+
+
+def export_individuals(individuals, chunk_size=CHUNK_SIZE):
+    individuals = individuals.order_by('id').values('id', 'user__email', 'user__username', 'version')
+    for chunk in _chunks(individuals.iterator(chunk_size=chunk_size), chunk_size):
+        ids = [individual['id'] for individual in chunk]
+        meals = _related(IndividualMeal, 'individual_id', ids, MEAL_FIELDS)
+        shopping_list = _related(IndividualShoppingItem, 'individual_id', ids, INGREDIENT_FIELDS)
+        for individual in chunk:
+            yield {
+                'type': 'individual',
+                'id': individual['id'],
+                'email': individual['user__email'],
+                'username': individual['user__username'],
+                'version': individual['version'],
+                'meals': meals[individual['id']],
+                'shopping_list': shopping_list[individual['id']],
+            }
+
+
+def export_everything(chunk_size=CHUNK_SIZE):
+    yield from export_recipes(chunk_size)
+    yield from export_groups(Group.objects.all(), chunk_size)
+    yield from export_individuals(Individual.objects.all(), chunk_size)
+
+
+def export_user(user, chunk_size=CHUNK_SIZE):
+    """The individual of the user and the groups they're a member of"""
+    yield from export_individuals(Individual.objects.filter(user=user), chunk_size)
+    yield from export_groups(Group.objects.filter(members__user=user), chunk_size)
+
+
+def ndjson(objects):
+    for obj in objects:
+        yield json.dumps(obj, cls=DjangoJSONEncoder) + '\n'
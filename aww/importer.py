@@ -0,0 +1,219 @@
+import csv
+import json
+import time
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from utils.fractional_index import spread_keys
+from utils.ingredient_lines import parse_line
+
+from .catalogue import intern_ingredients
+from .indexes import recipe_names
+from .models import Recipe, RecipeIngredient, RecipeRevision, RecipeStep
+from .revisions import EMPTY_STATE, diff
+from .signals import recipes_changed
+
+# Imports recipes from NDJSON (the format of the recipe export, c.f. export.py) or CSV, read as a stream.
+# The rows are validated and written a chunk at a time: the names and URLs of a chunk are checked against
+# the existing recipes with one (indexed) query each, then the recipes, ingredients, steps and first revisions
+# are written with a bulk_create per table in a transaction per chunk, and recipes_changed is sent once
+# for the chunk. bulk_create doesn't send signals, so the amounts, catalogue entries and step positions
+# that the signals would assign are assigned here.
+# An ingredient is either {name, quantity, unit} or a free text line ("2 cups flour", c.f. utils/ingredient_lines.py).
+# A CSV has the columns name, photo, url, servings, ingredients and steps, the ingredients being
+# a "quantity | unit | name" or a free text line per line and the steps a step per line.
+CHUNK_SIZE = 500
+MAX_ERRORS = 100
+# Well within the servings column (a 32 bit integer on Postgres), so a huge number is a row error rather than a failed chunk
+MAX_SERVINGS = 1000
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def recipes_per_second(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Line {line}: {message}")
+
+
+def read_ndjson(lines):
+    """Yields (line number, recipe or the error message) for each non blank line"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        yield number, row if isinstance(row, dict) else "A recipe must be a JSON object"
+
+
+def read_csv(lines):
+    """Yields (line number, recipe) for each row"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        ingredients = []
+        for line in (row.get('ingredients') or '').splitlines():
+            if '|' in line:
+                quantity, unit, name = ([part.strip() for part in line.split('|', 2)] + ['', ''])[:3]
+                ingredients.append({'name': name, 'quantity': quantity, 'unit': unit})
+            elif line.strip():
+                ingredients.append(line)
+        servings = (row.get('servings') or '').strip()
+        yield reader.line_num, {
+            'name': row.get('name'),
+            'photo': row.get('photo'),
+            'url': row.get('url'),
+            'servings': int(servings) if servings.isdigit() else servings or None,
+            'ingredients': ingredients,
+            'steps': [step.strip() for step in (row.get('steps') or '').splitlines() if step.strip()],
+        }
+
+
+def _text(value, length, field):
+    value = '' if value is None else value
+    if not isinstance(value, str):
+        raise Exception(f"The {field} must be a string")
+    value = value.strip()
+    if len(value) > length:
+        raise Exception(f"The {field} can be at most {length} characters")
+    return value
+
+
+def clean(row):
+    """Returns the recipe as {name, photo, url, servings, ingredients: [[name, quantity, unit]], steps}"""
+    name = _text(row.get('name'), 200, 'name')
+    if not name:
+        raise Exception("A recipe must have a name")
+    servings = row.get('servings')
+    if servings is not None and (not isinstance(servings, int) or isinstance(servings, bool) or servings < 1):
+        raise Exception("A recipe must serve at least 1 person")
+    if servings is not None and servings > MAX_SERVINGS:
+        raise Exception(f"A recipe can serve at most {MAX_SERVINGS} people")
+    ingredients = row.get('ingredients') or []
+    steps = row.get('steps') or []
+    if not isinstance(ingredients, list) or not isinstance(steps, list):
+        raise Exception("The ingredients and steps must be lists")
+    if len(ingredients) > 150:
+        raise Exception("A recipe may only have 150 ingredients")
+    if len(steps) > 200:
+        raise Exception("A recipe may only have 200 steps")
+    ingredients = [
+        dict(zip(('name', 'quantity', 'unit'), parse_line(ing))) if isinstance(ing, str) else ing for ing in ingredients
+    ]
+    if not all(isinstance(ing, dict) for ing in ingredients):
+        raise Exception("An ingredient must be a line or have a name, quantity and unit")
+    return {
+        'name': name,
+        'photo': _text(row.get('photo'), 300, 'photo'),
+        'url': _text(row.get('url'), 200, 'url'),
+        'servings': servings,
+        'ingredients': [
+            [
+                _text(ing.get('name'), 100, 'ingredient name'),
+                _text(ing.get('quantity'), 100, 'ingredient quantity'),
+                _text(ing.get('unit'), 50, 'ingredient unit')
+            ]
+            for ing in ingredients
+        ],
+        'steps': [_text(step, 10000, 'step') for step in steps],
+    }
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _new(chunk, result):
+    """The valid recipes of the chunk whose name and URL aren't taken, by an existing recipe or an earlier row"""
+    recipes = []
+    for number, row in chunk:
+        try:
+            if isinstance(row, str):
+                raise Exception(row)
+            recipes.append((number, clean(row)))
+        except Exception as error:
+            result.error(number, str(error))
+    names = set(Recipe.objects.filter(name__in=[recipe['name'] for _, recipe in recipes]).values_list('name', flat=True))
+    urls = set(Recipe.objects.filter(url__in=[recipe['url'] for _, recipe in recipes if recipe['url']]).values_list('url', flat=True))
+    new = []
+    for number, recipe in recipes:
+        if recipe['name'] in names or recipe['url'] in urls:
+            result.skipped += 1
+            continue
+        names.add(recipe['name'])
+        if recipe['url']:
+            urls.add(recipe['url'])
+        new.append((number, recipe))
+    return new
+
+
+def _write(recipes, author):
+    rows, ingredients, steps, revisions = [], [], [], []
+    catalogue = intern_ingredients({name for recipe in recipes for name, _, _ in recipe['ingredients']})
+    for recipe in recipes:
+        row = Recipe(
+            id=uuid.uuid4(), name=recipe['name'], photo=recipe['photo'], url=recipe['url'], servings=recipe['servings']
+        )
+        rows.append(row)
+        for name, quantity, unit in recipe['ingredients']:
+            ingredient = RecipeIngredient(name=name, quantity=quantity, unit=unit, recipe=row)
+            ingredient.parse_amount()
+            ingredient.ingredient_id = catalogue[name]
+            ingredients.append(ingredient)
+        for order, (step, position) in enumerate(zip(recipe['steps'], spread_keys(len(recipe['steps']))), 1):
+            steps.append(RecipeStep(step=step, order=order, position=position, recipe=row))
+        # The same first revision createRecipe records
+        state = {**recipe, 'ingredients': sorted(recipe['ingredients'])}
+        revisions.append(RecipeRevision(recipe=row, revision=1, author=author, delta=diff(EMPTY_STATE, state)))
+    Recipe.objects.bulk_create(rows)
+    RecipeIngredient.objects.bulk_create(ingredients)
+    RecipeStep.objects.bulk_create(steps)
+    RecipeRevision.objects.bulk_create(revisions)
+    return [row.id for row in rows]
+
+
+def import_recipes(rows, chunk_size=CHUNK_SIZE, author=None, progress=None):
+    """
+    Creates the recipes of rows ((line number, recipe) pairs, c.f. read_ndjson and read_csv) a chunk at a time.
+    The recipes whose name or URL is already taken are skipped, the invalid ones are reported as errors.
+    progress is called with the result after every chunk.
+    """
+    author = author if author is not None and author.is_authenticated else None
+    result = ImportResult()
+    started = time.monotonic()
+    for chunk in _chunks(rows, chunk_size):
+        new = _new(chunk, result)
+        if new:
+            try:
+                with transaction.atomic():
+                    recipe_ids = _write([recipe for _, recipe in new], author)
+                    recipes_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+                    transaction.on_commit(lambda recipe_ids=recipe_ids: recipe_names.refresh(recipe_ids))
+                result.created += len(recipe_ids)
+            # A recipe with one of the names was created in the meantime
+            except IntegrityError:
+                for number, _ in new:
+                    result.error(number, "A recipe with one of the names of this chunk was created during the import")
+        result.seconds = time.monotonic() - started
+        if progress is not None:
+            progress(result)
+    result.seconds = time.monotonic() - started
+    return result
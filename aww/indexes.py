@@ -0,0 +1,92 @@
+import threading
+import time
+
+from utils.prefixes import PrefixIndex
+from utils.trigrams import TrigramIndex
+
+from .models import Group, Ingredient, Recipe
+
+# In-process indexes of the names of the recipes/groups that aren't deleted.
+# An index is built on its first use, kept up to date by the post_save signals of this process
+# (rows that turn out to be deleted when they're looked up are removed, c.f. suggestions.py)
+# and rebuilt from the database once it's older than its ttl, which also picks up
+# what other processes (or bulk writes that don't send signals) have changed in the meantime.
+# The trigram indexes serve suggestions (c.f. suggestions.py), the prefix indexes autocomplete.
+
+
+class NameIndex:
+    # The fields of a row the index gets, as the arguments of index.add(key, ...) after the row's id (c.f. entry)
+    fields = ['name']
+
+    def __init__(self, model, index_class, ttl=300):
+        self.model = model
+        self.index_class = index_class
+        self.ttl = ttl
+        self._index = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def entry(self, name):
+        return (name,)
+
+    def get(self):
+        with self._lock:
+            if self._index is None or time.monotonic() - self._built_at > self.ttl:
+                rows = self.model.objects.values_list('id', *self.fields).iterator()
+                self._index = self.index_class((key, *self.entry(*values)) for key, *values in rows)
+                self._built_at = time.monotonic()
+            return self._index
+
+    def update(self, instance):
+        """Updates the index with a saved row, if the index has been built"""
+        with self._lock:
+            if self._index is None:
+                return
+            if getattr(instance, 'deleted_at', None) is None:
+                self._index.add(instance.id, *self.entry(*[getattr(instance, field) for field in self.fields]))
+            else:
+                self._index.remove(instance.id)
+
+    def remove(self, keys):
+        with self._lock:
+            if self._index is None:
+                return
+            for key in keys:
+                self._index.remove(key)
+
+    def refresh(self, keys):
+        """Updates the index with the rows of keys as they are in the database, if the index has been built"""
+        if self._index is None:
+            return
+        rows = {key: values for key, *values in self.model.objects.filter(pk__in=keys).values_list('id', *self.fields)}
+        with self._lock:
+            if self._index is None:
+                return
+            for key in keys:
+                if key in rows:
+                    self._index.add(key, *self.entry(*rows[key]))
+                else:
+                    self._index.remove(key)
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+class IngredientNameIndex(NameIndex):
+    """
+    The catalogue entries, shown as the first way they were written rather than their name
+    (the key they're merged by, i.e. "breast chicken") and found by any of the ways they were written
+    """
+    fields = ['name', 'aliases']
+
+    def entry(self, name, aliases):
+        spellings = aliases or [name]
+        return spellings[0], spellings
+
+
+recipe_names = NameIndex(Recipe, TrigramIndex)
+group_names = NameIndex(Group, TrigramIndex)
+recipe_prefixes = NameIndex(Recipe, PrefixIndex)
+ingredient_prefixes = IngredientNameIndex(Ingredient, PrefixIndex)
+PREFIX_INDEXES = {Recipe: recipe_prefixes, Ingredient: ingredient_prefixes}
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+from utils.ingredients import ingredient_tokens
+
+from .models import IngredientToken, Recipe, RecipeIngredient
+
+# "What can I cook with what I have": every ingredient of a recipe is indexed by the tokens of its name,
+# so the recipes that use something are found by looking up its tokens instead of reading every recipe.
+# An ingredient is covered by an item someone has when it has all of that item's tokens
+# ("chicken" covers "boneless chicken breasts", "chicken breast" doesn't cover "chicken thighs")
+
+
+def index_ingredients(recipe_ids):
+    """Rewrites the tokens of the ingredients of the recipes"""
+    recipe_ids = list(recipe_ids)
+    IngredientToken.objects.filter(recipe_id__in=recipe_ids).delete()
+    IngredientToken.objects.bulk_create([
+        IngredientToken(token=token, recipe_id=recipe_id, ingredient_id=ingredient_id)
+        for ingredient_id, recipe_id, name in (
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('id', 'recipe_id', 'name').iterator()
+        )
+        for token in ingredient_tokens(name)
+    ], batch_size=1000)
+
+
+class RecipeMatch:
+    def __init__(self, recipe, covered, total, missing):
+        self.recipe = recipe
+        self.matched = len(covered)
+        self.total = total
+        self.coverage = len(covered) / total if total else 0.0
+        self.missing = missing
+
+
+def recipes_by_ingredients(have, min_match=1, limit=20):
+    """
+    Returns the recipes that have at least min_match ingredients covered by the have items as RecipeMatch,
+    the recipes whose ingredients are the most covered first
+    """
+    wanted = [set(ingredient_tokens(item)) for item in have]
+    wanted = [tokens for tokens in wanted if tokens]
+    if not wanted:
+        return []
+
+    # The postings of the tokens: which tokens of the wanted ones each ingredient has
+    tokens_of = defaultdict(set)
+    recipe_of = {}
+    postings = IngredientToken.objects.filter(
+        token__in=set().union(*wanted)
+    ).values_list('ingredient_id', 'recipe_id', 'token')
+    for ingredient_id, recipe_id, token in postings.iterator():
+        tokens_of[ingredient_id].add(token)
+        recipe_of[ingredient_id] = recipe_id
+
+    covered = defaultdict(set)
+    for ingredient_id, tokens in tokens_of.items():
+        if any(item <= tokens for item in wanted):
+            covered[recipe_of[ingredient_id]].add(ingredient_id)
+    candidates = [recipe_id for recipe_id, ingredients in covered.items() if len(ingredients) >= min_match]
+    if not candidates:
+        return []
+
+    totals = dict(
+        RecipeIngredient.objects.filter(recipe_id__in=candidates)
+        .values('recipe').annotate(total=Count('id')).values_list('recipe', 'total')
+    )
+    recipes = Recipe.objects.in_bulk(candidates)
+    ranked = sorted(
+        (recipe_id for recipe_id in candidates if recipe_id in recipes),
+        key=lambda recipe_id: (
+            -len(covered[recipe_id]) / totals[recipe_id], -len(covered[recipe_id]), recipes[recipe_id].name
+        )
+    )[:limit]
+
+    # What's missing is only read for the recipes that are returned
+    missing = defaultdict(list)
+    for ingredient_id, recipe_id, name in RecipeIngredient.objects.filter(
+            recipe_id__in=ranked).values_list('id', 'recipe_id', 'name'):
+        if ingredient_id not in covered[recipe_id]:
+            missing[recipe_id].append(name)
+    return [
+        RecipeMatch(recipes[recipe_id], covered[recipe_id], totals[recipe_id], sorted(missing[recipe_id]))
+        for recipe_id in ranked
+    ]
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from aww.outbox import BATCH_SIZE, deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Sends the emails of the outbox in batches, trying the failed ones again later"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep running, checking the outbox every --interval seconds")
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_outbox(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
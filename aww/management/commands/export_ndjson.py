@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from aww.export import CHUNK_SIZE, export_everything, export_groups, export_individuals, export_recipes, ndjson
+from aww.models import Group, Individual
+
+
+class Command(BaseCommand):
+    help = "Writes the recipes, groups and individuals as NDJSON (a JSON object per line) without loading them all in memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write to instead of the standard output")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--only', choices=['recipes', 'groups', 'individuals'])
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['only'] == 'recipes':
+            objects = export_recipes(chunk_size)
+        elif options['only'] == 'groups':
+            objects = export_groups(Group.objects.all(), chunk_size)
+        elif options['only'] == 'individuals':
+            objects = export_individuals(Individual.objects.all(), chunk_size)
+        else:
+            objects = export_everything(chunk_size)
+
+        if not options['output']:
+            for line in ndjson(objects):
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for line in ndjson(objects):
+                output.write(line)
+                count += 1
+        self.stdout.write(f"Exported {count} objects to {options['output']}")
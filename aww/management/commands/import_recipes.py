@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from aww.importer import CHUNK_SIZE, import_recipes, read_csv, read_ndjson
+
+
+class Command(BaseCommand):
+    help = "Creates the recipes of an NDJSON or CSV file in chunks, skipping the ones whose name or URL is taken"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="File to read, - for the standard input")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help="By default, csv if the file ends with .csv")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def progress(self, result):
+        self.stdout.write(
+            f"{result.created} created, {result.skipped} skipped ({result.recipes_per_second:.0f} recipes/s)"
+        )
+
+    def handle(self, *args, **options):
+        is_csv = options['format'] == 'csv' or (not options['format'] and options['file'].endswith('.csv'))
+        source = sys.stdin if options['file'] == '-' else open(options['file'], encoding='utf-8', newline='')
+        try:
+            rows = read_csv(source) if is_csv else read_ndjson(source)
+            result = import_recipes(rows, chunk_size=options['chunk_size'], progress=self.progress)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            f"Imported {result.created} recipes in {result.seconds:.1f}s ({result.recipes_per_second:.0f} recipes/s), "
+            f"{result.skipped} skipped, {len(result.errors)} errors"
+        )
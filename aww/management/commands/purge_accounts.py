@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from aww.purge import purge_rate_limit_counts, purge_refresh_tokens, purge_unverified_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes the expired or revoked refresh tokens, the accounts that were never verified "
+        "and the expired rate limit counts, in bounded batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--unverified-days', type=int, default=30,
+            help="Only purge unverified accounts created (and last logged in) at least this many days ago"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        expired, revoked = purge_refresh_tokens(options['batch_size'])
+        self.stdout.write(f"Purged {expired} expired and {revoked} revoked refresh tokens")
+        users = purge_unverified_users(options['unverified_days'], options['batch_size'])
+        self.stdout.write(f"Purged {users} unverified accounts")
+        counts = purge_rate_limit_counts(options['batch_size'])
+        self.stdout.write(f"Purged {counts} expired rate limit counts")
+        seconds = time.perf_counter() - started
+        self.stdout.write(f"Purged {expired + revoked + users + counts} rows in {seconds:.1f}s")
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from aww.purge import SOFT_DELETE_MODELS, purge_soft_deleted
+
+
+class Command(BaseCommand):
+    help = "Physically removes soft-deleted recipes and groups in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help="Only purge rows that were deleted at least this many hours ago"
+        )
+
+    def handle(self, *args, **options):
+        grace = timedelta(hours=options['grace_hours'])
+        for model in SOFT_DELETE_MODELS:
+            purged = purge_soft_deleted(model, batch_size=options['batch_size'], grace=grace)
+            self.stdout.write(f"Purged {purged} {model._meta.verbose_name_plural}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from aww.similarity import refresh_similar_recipes
+
+
+class Command(BaseCommand):
+    help = "Recomputes the similar recipes of the recipes that changed since the last refresh"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recompute the similar recipes of every recipe"
+        )
+
+    def handle(self, *args, **options):
+        refreshed = refresh_similar_recipes(full=options['full'])
+        self.stdout.write(f"Refreshed the similar recipes of {refreshed} recipes")
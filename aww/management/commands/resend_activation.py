@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from aww.emails import BATCH_SIZE, send_activation_emails, unverified_users
+
+
+class Command(BaseCommand):
+    help = "Sends the activation email again to every user who hasn't verified their account"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        users = unverified_users().iterator(chunk_size=options['batch_size'])
+        sent = send_activation_emails(users, options['batch_size'])
+        self.stdout.write(f"Put {sent} activation emails in the outbox")
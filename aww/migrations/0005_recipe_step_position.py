@@ -0,0 +1,41 @@
+# Generated by Django 3.2.5 on 2026-10-18 22:59
+
+from django.db import migrations, models
+import django.db.models.constraints
+
+from utils.fractional_index import spread_keys
+
+
+def assign_positions(apps, schema_editor):
+    # Existing steps keep the order they had
+    RecipeStep = apps.get_model('aww', 'RecipeStep')
+    recipe_ids = RecipeStep.objects.values_list('recipe_id', flat=True).distinct()
+    for recipe_id in recipe_ids.iterator():
+        steps = list(RecipeStep.objects.filter(recipe_id=recipe_id).order_by('order'))
+        for step, position in zip(steps, spread_keys(len(steps))):
+            step.position = position
+        RecipeStep.objects.bulk_update(steps, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0004_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipestep',
+            options={'ordering': ['position']},
+        ),
+        migrations.AddField(
+            model_name='recipestep',
+            name='position',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(assign_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recipestep',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], fields=('recipe', 'position'), name='unique_recipe_step_position'),
+        ),
+    ]
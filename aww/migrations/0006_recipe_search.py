@@ -0,0 +1,52 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The GIN index can't be declared in Recipe.Meta.indexes since it would fail on SQLite,
+# and SQLite gets an FTS5 table instead of the search_vector column
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE INDEX aww_recipe_search_vector_gin ON aww_recipe USING gin (search_vector)")
+        schema_editor.execute(
+            "UPDATE aww_recipe SET search_vector = "
+            "setweight(to_tsvector('english', name), 'A') || "
+            "setweight(to_tsvector('english', coalesce((SELECT string_agg(name, ' ') FROM aww_recipeingredient WHERE recipe_id = aww_recipe.id), '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce((SELECT string_agg(step, ' ') FROM aww_recipestep WHERE recipe_id = aww_recipe.id), '')), 'C')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE aww_recipe_fts USING fts5(recipe_id UNINDEXED, name, ingredients, steps, tokenize='porter unicode61')")
+        schema_editor.execute(
+            "INSERT INTO aww_recipe_fts (recipe_id, name, ingredients, steps) "
+            "SELECT id, name, "
+            "coalesce((SELECT group_concat(name, ' ') FROM aww_recipeingredient WHERE recipe_id = aww_recipe.id), ''), "
+            "coalesce((SELECT group_concat(step, ' ') FROM aww_recipestep WHERE recipe_id = aww_recipe.id), '') "
+            "FROM aww_recipe"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS aww_recipe_search_vector_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS aww_recipe_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0005_recipe_step_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# pg_trgm isn't installed on every Postgres (and needs the right privileges to be created),
+# without it the name suggestions fall back to an in-process index (c.f. suggestions.py)
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in ['aww_recipe', 'aww_group']:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_name_trgm ON {table} "
+            f"USING gin (name gin_trgm_ops) WHERE deleted_at IS NULL"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in ['aww_recipe', 'aww_group']:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
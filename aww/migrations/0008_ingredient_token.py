@@ -0,0 +1,40 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from utils.ingredients import ingredient_tokens
+
+
+def index_existing_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('aww', 'RecipeIngredient')
+    IngredientToken = apps.get_model('aww', 'IngredientToken')
+    IngredientToken.objects.bulk_create([
+        IngredientToken(token=token, recipe_id=recipe_id, ingredient_id=ingredient_id)
+        for ingredient_id, recipe_id, name in RecipeIngredient.objects.values_list('id', 'recipe_id', 'name').iterator()
+        for token in ingredient_tokens(name)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0007_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=50)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='aww.recipeingredient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='aww.recipe')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ingredienttoken',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'token'), name='unique_ingredient_token'),
+        ),
+        migrations.RunPython(index_existing_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:13
+
+from django.db import migrations, models
+
+from utils.units import parse_amount
+
+INGREDIENT_MODELS = ['RecipeIngredient', 'GroupShoppingItem', 'IndividualShoppingItem']
+BATCH_SIZE = 1000
+
+
+def backfill_amounts(apps, schema_editor):
+    # In batches by primary key, so no batch holds more than BATCH_SIZE rows in memory
+    for model_name in INGREDIENT_MODELS:
+        model = apps.get_model('aww', model_name)
+        last_id = None
+        while True:
+            rows = model.objects.order_by('id')
+            if last_id is not None:
+                rows = rows.filter(id__gt=last_id)
+            batch = list(rows.only('id', 'quantity', 'unit')[:BATCH_SIZE])
+            if not batch:
+                break
+            for row in batch:
+                row.amount, row.canonical_unit = parse_amount(row.quantity, row.unit)
+                row.canonical_unit = row.canonical_unit[:50]
+            model.objects.bulk_update(batch, ['amount', 'canonical_unit'])
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0008_ingredient_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupshoppingitem',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupshoppingitem',
+            name='canonical_unit',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='individualshoppingitem',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='individualshoppingitem',
+            name='canonical_unit',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='canonical_unit',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.RunPython(backfill_amounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0009_ingredient_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='servings',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
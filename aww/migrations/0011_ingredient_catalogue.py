@@ -0,0 +1,82 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from utils.ingredients import ingredient_key
+
+INGREDIENT_MODELS = ['RecipeIngredient', 'GroupShoppingItem', 'IndividualShoppingItem']
+BATCH_SIZE = 1000
+MAX_ALIASES = 50
+
+
+def spelling(name):
+    return ' '.join(name.lower().split())[:100]
+
+
+def build_catalogue(apps, schema_editor):
+    # The names repeated across the ingredient tables become one entry per normalized name,
+    # then every row is pointed at its entry, in batches by primary key (c.f. 0009_ingredient_amount)
+    Ingredient = apps.get_model('aww', 'Ingredient')
+    aliases = {}
+    for model_name in INGREDIENT_MODELS:
+        model = apps.get_model('aww', model_name)
+        for name in model.objects.values_list('name', flat=True).distinct().iterator():
+            alias = spelling(name)
+            entry = aliases.setdefault(ingredient_key(alias)[:100], [])
+            if alias not in entry and len(entry) < MAX_ALIASES:
+                entry.append(alias)
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=key, aliases=spellings) for key, spellings in aliases.items()],
+        batch_size=BATCH_SIZE
+    )
+    ids = dict(Ingredient.objects.values_list('name', 'id'))
+
+    for model_name in INGREDIENT_MODELS:
+        model = apps.get_model('aww', model_name)
+        last_id = None
+        while True:
+            rows = model.objects.order_by('id')
+            if last_id is not None:
+                rows = rows.filter(id__gt=last_id)
+            batch = list(rows.only('id', 'name')[:BATCH_SIZE])
+            if not batch:
+                break
+            for row in batch:
+                row.ingredient_id = ids[ingredient_key(spelling(row.name))[:100]]
+            model.objects.bulk_update(batch, ['ingredient'])
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0010_recipe_servings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('aliases', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='groupshoppingitem',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='aww.ingredient'),
+        ),
+        migrations.AddField(
+            model_name='individualshoppingitem',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='aww.ingredient'),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='aww.ingredient'),
+        ),
+        migrations.RunPython(build_catalogue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0012_recipe_similarity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='url',
+            field=models.URLField(blank=True, db_index=True),
+        ),
+    ]
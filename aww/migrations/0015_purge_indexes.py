@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+# Indexes of the purge_accounts command (c.f. purge.py) on tables of graphql_jwt and graphql_auth,
+# whose models can't declare them: the refresh tokens by creation (the expired ones) and revocation,
+# and the statuses of the accounts that haven't been verified
+PURGE_INDEXES = {
+    'refresh_token_refreshtoken_created': "refresh_token_refreshtoken (created)",
+    'refresh_token_refreshtoken_revoked': "refresh_token_refreshtoken (revoked) WHERE revoked IS NOT NULL",
+    'graphql_auth_userstatus_unverified': "graphql_auth_userstatus (user_id) WHERE NOT verified",
+}
+
+
+def create_purge_indexes(apps, schema_editor):
+    for name, definition in PURGE_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def drop_purge_indexes(apps, schema_editor):
+    for name in PURGE_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0014_outgoing_email'),
+        ('refresh_token', '0002_auto_20190130_0900'),
+        ('graphql_auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_purge_indexes, drop_purge_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-19 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aww', '0015_purge_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCount',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,8 +1,37 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
+from utils.units import parse_amount
+
 # ********* BASE/ABSTRACT CLASSES *********
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        # A single UPDATE - the rows (and everything that cascades from them)
+        # are physically removed later by the purge_deleted command
+        return self.filter(deleted_at__isnull=True).update(deleted_at=timezone.now())
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Default manager that hides soft-deleted rows"""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SoftDeleteModel(models.Model):
+    class Meta:
+        abstract = True
+
+    deleted_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    # objects is declared first so it's the default manager, meaning related
+    # managers (i.e. individual.groups) hide deleted rows too
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+
 class BaseIngredient(models.Model):
     class Meta:
         abstract = True
@@ -11,10 +40,20 @@ class BaseIngredient(models.Model):
     name = models.CharField(max_length=100)
     quantity = models.CharField(max_length=100)
     unit = models.CharField(max_length=50)
+    # Parsed from the quantity and unit when saved (c.f. utils/units.py) so they can be summed,
+    # scaled and compared in SQL. amount is null if the quantity isn't a number (i.e. "a pinch")
+    amount = models.DecimalField(max_digits=12, decimal_places=4, blank=True, null=True, editable=False)
+    canonical_unit = models.CharField(max_length=50, blank=True, editable=False)
+    # The ingredient's entry in the catalogue, interned from the name when saved (c.f. catalogue.py)
+    ingredient = models.ForeignKey('Ingredient', on_delete=models.PROTECT, blank=True, null=True, editable=False)
 
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.name}({self.id})"
 
+    def parse_amount(self):
+        self.amount, self.canonical_unit = parse_amount(self.quantity, self.unit)
+        self.canonical_unit = self.canonical_unit[:50]
+
 
 class BaseMeal(models.Model):
     class Meta:
@@ -52,6 +91,17 @@ class BaseMeal(models.Model):
         return f"Meal: {self.text} for {self.day} at {self.time}({self.id})"
 
 # ********* RECIPE *********
+# Catalogue of the ingredients, one entry per normalized name (c.f. utils/ingredients.py),
+# so the ingredients of recipes and shopping lists can be joined and grouped by an integer key
+class Ingredient(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # The lowercased ways the ingredient has been written ("tomatoes", "diced tomato")
+    aliases = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
 class RecipeIngredient(BaseIngredient):
     recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
 
@@ -59,24 +109,105 @@ class RecipeIngredient(BaseIngredient):
 class RecipeStep(models.Model):
     step = models.TextField()
     order = models.IntegerField()
+    # Sortable key that decides where the step is in the recipe (c.f. step_positions.py)
+    # It's assigned from the order by a signal if it isn't set
+    position = models.CharField(max_length=64, default='', editable=False)
     recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
 
     class Meta:
-        ordering = ['order']
+        ordering = ['position']
+        constraints = [
+            # Checked at the end of each statement so a bulk_update can swap positions
+            models.UniqueConstraint(
+                fields=['recipe', 'position'],
+                name='unique_recipe_step_position',
+                deferrable=models.Deferrable.IMMEDIATE
+            )
+        ]
 
     def __str__(self):
         return self.step
 
 
-class Recipe(models.Model):
+class Recipe(SoftDeleteModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    name = models.CharField(max_length=200, unique=True)
+    name = models.CharField(max_length=200)
     photo = models.URLField(max_length=300, blank=True)
-    url = models.URLField(max_length=200, blank=True)
+    # Indexed so an import (c.f. importer.py) can look up the URLs of a batch of recipes at once
+    url = models.URLField(max_length=200, blank=True, db_index=True)
+    # How many people the ingredients are for, so they can be scaled to another number (c.f. scaling.py)
+    servings = models.PositiveIntegerField(blank=True, null=True)
+    # Incremented on every update, c.f. versioning.py
+    version = models.PositiveIntegerField(default=1)
+    # Name, ingredient names and steps, kept up to date by search.py (Postgres only)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    # Set whenever the recipe changes, until refresh_similar_recipes recomputes its similar recipes
+    similar_stale = models.BooleanField(default=True, editable=False, db_index=True)
+
+    class Meta:
+        # Names only have to be unique among the recipes that haven't been deleted
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='unique_live_recipe_name'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
+
+# The most similar recipes of a recipe by their ingredients, computed by the refresh_similar_recipes command
+# (c.f. similarity.py)
+class RecipeSimilarity(models.Model):
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey('Recipe', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'similar'], name='unique_recipe_similarity')
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} is {self.score:.2f} similar to {self.recipe_id}"
+
+
+# Inverted index from the tokens of an ingredient's name to the ingredient and its recipe
+# (c.f. ingredient_index.py), rewritten whenever the recipe changes
+class IngredientToken(models.Model):
+    token = models.CharField(max_length=50, db_index=True)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey('RecipeIngredient', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ingredient', 'token'], name='unique_ingredient_token')
+        ]
+
+    def __str__(self):
+        return f"{self.token} in {self.ingredient_id}"
+
+
+# Append-only history of the edits made to a recipe (c.f. revisions.py)
+class RecipeRevision(models.Model):
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    revision = models.PositiveIntegerField()
+    author = models.ForeignKey(User, blank=True, null=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delta = models.JSONField()
+
+    class Meta:
+        ordering = ['-revision']
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'revision'], name='unique_recipe_revision')
+        ]
+
+    def __str__(self):
+        return f"Revision {self.revision} of {self.recipe}"
+
 # ********* GROUP *********
 class GroupShoppingItem(BaseIngredient):
     group = models.ForeignKey('Group', on_delete=models.CASCADE)
@@ -86,11 +217,21 @@ class GroupMeal(BaseMeal):
     group = models.ForeignKey('Group', on_delete=models.CASCADE)
 
 
-class Group(models.Model):
+class Group(SoftDeleteModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    name = models.CharField(max_length=200, unique=True)
+    name = models.CharField(max_length=200)
     members = models.ManyToManyField('Individual')
     join_requests = models.ManyToManyField('Individual', related_name="requests_received", blank=True)
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='unique_live_group_name'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -115,6 +256,54 @@ class Individual(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     groups = models.ManyToManyField('Group', blank=True)
     group_requests = models.ManyToManyField('Group', related_name="requests_made", blank=True)
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return self.user.username
+
+
+# ********* EMAIL *********
+# Emails are sent by putting them here (c.f. outbox.py) and the deliver_outbox worker sends them
+# with the real backend, so a slow provider never holds up a request
+class OutgoingEmail(models.Model):
+    subject = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Not tried again before then: pushed back while a worker is sending it and after every failed attempt
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    # Set once it has failed too many times, it's then left alone
+    failed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['send_after'],
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True),
+                name='pending_outgoing_email'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
+
+
+# ********* RATE LIMITS *********
+# The calls counted by the rate limits (c.f. schema/rate_limits.py), a row per operation, limit, caller and window,
+# removed by the purge_accounts command once expired
+class RateLimitCount(models.Model):
+    key = models.CharField(max_length=255, primary_key=True)
+    calls = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.calls}"
@@ -0,0 +1,122 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# Every email (messageMe, and graphql_auth's activation/password reset emails, which use send_mail too)
+# goes through OutboxBackend, settings.EMAIL_BACKEND: sending one only inserts a row, in the transaction
+# of the request, so it's only sent if the request's changes are committed.
+# The deliver_outbox worker sends them with settings.OUTBOX_DELIVERY_BACKEND (SendGrid, or the console
+# or file backend to try it offline). A worker claims a batch by pushing their send_after back by CLAIM_TIME,
+# sends them outside of any transaction and marks them sent, or pushes them back exponentially longer
+# after each failure (BACKOFF * 2 ** (attempts - 1), up to MAX_BACKOFF) until MAX_ATTEMPTS.
+# An email whose worker died while sending it is sent again once its claim is over (at least once delivery).
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+BACKOFF = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+CLAIM_TIME = timedelta(minutes=5)
+
+
+class OutboxBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            if message.attachments:
+                raise ValueError("The outbox doesn't keep attachments")
+            html = [content for content, mimetype in getattr(message, 'alternatives', []) if mimetype == 'text/html']
+            rows.append(OutgoingEmail(
+                subject=message.subject,
+                body=message.body,
+                html_body=html[0] if html else '',
+                from_email=message.from_email or '',
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                reply_to=list(message.reply_to),
+                headers=dict(message.extra_headers)
+            ))
+        OutgoingEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        connection=connection
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def backoff(attempts):
+    delay = min(BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+    # Spread out so the emails that failed together aren't all tried again at the same moment
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, failed_at__isnull=True, send_after__lte=now)
+            .order_by('send_after')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            send_after=now + CLAIM_TIME, attempts=F('attempts') + 1
+        )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def deliver_batch(batch_size=BATCH_SIZE, connection=None):
+    """Sends the emails that are due (at most batch_size), returns (sent, failed) counts"""
+    emails = _claim(batch_size)
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection(settings.OUTBOX_DELIVERY_BACKEND, fail_silently=False)
+    sent = failed = 0
+    with connection:
+        for email in emails:
+            try:
+                connection.send_messages([_message(email, connection)])
+            except Exception as error:
+                failed += 1
+                now = timezone.now()
+                OutgoingEmail.objects.filter(pk=email.pk).update(
+                    last_error=str(error)[:1000],
+                    send_after=now + backoff(email.attempts),
+                    failed_at=now if email.attempts >= MAX_ATTEMPTS else None
+                )
+            else:
+                # Right away, so a worker that dies later in the batch doesn't send it again
+                sent += 1
+                OutgoingEmail.objects.filter(pk=email.pk).update(sent_at=timezone.now())
+    return sent, failed
+
+
+def deliver_outbox(batch_size=BATCH_SIZE):
+    """Sends batches until no email is due, returns (sent, failed) counts"""
+    sent = failed = 0
+    while True:
+        batch_sent, batch_failed = deliver_batch(batch_size)
+        sent, failed = sent + batch_sent, failed + batch_failed
+        if batch_sent + batch_failed < batch_size:
+            return sent, failed
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy as np
+from django.db import connection
+
+from utils.planning import plan_rows
+
+from .models import BaseMeal, Group, GroupMeal, IndividualMeal, Recipe
+from .shopping import recipes_generation
+from .similarity import recipe_matrix
+
+# Suggests recipes for the open meal slots of a group/individual so the week's meals, the ones already planned
+# included, need as few distinct ingredients as possible (c.f. utils/planning.py). Nothing is saved, the meals
+# are added with updateGroup/updateIndividual. The recipes x ingredients matrix is kept by each process
+# until the recipes' generation changes (c.f. shopping.py), so a suggestion doesn't read every recipe.
+# Since the generation may be in a cache local to the process, the matrix is also rebuilt once it's older than
+# RECIPE_MATRIX_TTL, which bounds how long the recipes other processes have changed are missed.
+# Only the first suggestion of a process waits for the matrix to be built: afterwards it's rebuilt by a background
+# thread, one at a time, and swapped in once it's ready, the previous matrix being used until then.
+PLAN_BUDGET = 0.2
+RECIPE_MATRIX_TTL = 300
+DAYS = [day for day, _ in BaseMeal.DaysOfTheWeek.choices]
+TIMES = [time for time, _ in BaseMeal.MealTimes.choices]
+
+_matrix = {}
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+class PlannedMeal:
+    def __init__(self, day, time, recipe):
+        self.day = day
+        self.time = time
+        self.recipe = recipe
+
+
+def _build(generation):
+    recipe_ids, matrix = recipe_matrix()
+    built = {
+        'generation': generation,
+        'built_at': time.monotonic(),
+        'recipe_ids': recipe_ids,
+        'row_of': {str(recipe_id): row for row, recipe_id in enumerate(recipe_ids)},
+        'matrix': matrix,
+    }
+    with _lock:
+        _matrix.update(built)
+
+
+def _rebuild(generation):
+    try:
+        _build(generation)
+    finally:
+        with _lock:
+            _matrix['rebuilding'] = False
+        # The thread's own connection
+        connection.close()
+
+
+def _start_rebuild(generation):
+    threading.Thread(target=_rebuild, args=(generation,), daemon=True).start()
+
+
+def _recipe_matrix():
+    generation = recipes_generation()
+    with _lock:
+        if 'matrix' in _matrix:
+            stale = _matrix['generation'] != generation or time.monotonic() - _matrix['built_at'] > RECIPE_MATRIX_TTL
+            if stale and not _matrix.get('rebuilding'):
+                _matrix['rebuilding'] = True
+                _start_rebuild(generation)
+            return _matrix['recipe_ids'], _matrix['row_of'], _matrix['matrix']
+    with _build_lock:
+        # Unless the request this one waited for built it
+        if 'matrix' not in _matrix:
+            _build(generation)
+    with _lock:
+        return _matrix['recipe_ids'], _matrix['row_of'], _matrix['matrix']
+
+
+def suggest_week_plan(owner, days=None, times=None, exclude=(), max_repeats=1):
+    """
+    Returns a PlannedMeal for each of the slots of days x times (every day and time by default)
+    that the owner (Group or Individual) doesn't have a meal at, as long as there are recipes left to pick
+    """
+    meals = GroupMeal.objects.filter(group=owner) if isinstance(owner, Group) else IndividualMeal.objects.filter(individual=owner)
+    meals = list(meals.values_list('day', 'time', 'recipe_id'))
+    taken = {(day, time) for day, time, _ in meals}
+    slots = [
+        (day, time)
+        for day in DAYS if not days or day in days
+        for time in TIMES if not times or time in times
+        if (day, time) not in taken
+    ]
+    if not slots:
+        return []
+
+    recipe_ids, row_of, matrix = _recipe_matrix()
+    planned = [row_of[str(recipe_id)] for _, _, recipe_id in meals if str(recipe_id) in row_of]
+    allowed = np.ones(matrix.n_rows, dtype=bool)
+    allowed[[row_of[str(recipe_id)] for recipe_id in exclude if str(recipe_id) in row_of]] = False
+    picks = plan_rows(matrix, slots, planned, allowed, max_repeats, PLAN_BUDGET)
+
+    # Deleted since the matrix was built are left out
+    recipes = Recipe.objects.in_bulk([recipe_ids[row] for row in picks if row is not None])
+    return [
+        PlannedMeal(day, time, recipes[recipe_ids[row]])
+        for (day, time), row in zip(slots, picks)
+        if row is not None and recipe_ids[row] in recipes
+    ]
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+from graphql_jwt.settings import jwt_settings
+
+from .models import Recipe, Group, RateLimitCount
+
+SOFT_DELETE_MODELS = [Recipe, Group]
+
+
+def purge_soft_deleted(model, batch_size=500, grace=timedelta(0)):
+    """
+    Physically removes rows of a soft-deletable model whose deleted_at is older than the grace period.
+    Rows are removed in chunks of batch_size, each chunk in its own transaction, so the cascades
+    (ingredients, steps, meals, shopping items) and SET_NULLs (meals pointing at a recipe) stay bounded.
+    Returns the number of rows of the model itself that were purged.
+    """
+    cutoff = timezone.now() - grace
+    purged = 0
+    while True:
+        ids = list(
+            model.all_objects
+            .filter(deleted_at__lt=cutoff)
+            .order_by('deleted_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return purged
+        with transaction.atomic():
+            _, deleted = model.all_objects.filter(id__in=ids).delete()
+        purged += deleted.get(model._meta.label, 0)
+
+
+def _delete_in_batches(rows, order, batch_size):
+    """Deletes the rows of the queryset batch_size at a time, in the order of an index, returns how many"""
+    model = rows.model
+    purged = 0
+    while True:
+        ids = list(rows.order_by(order).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        with transaction.atomic():
+            _, deleted = model._default_manager.filter(pk__in=ids).delete()
+        purged += deleted.get(model._meta.label, 0)
+
+
+def purge_refresh_tokens(batch_size=500):
+    """
+    Removes the refresh tokens that can't be used anymore: the expired ones (created more than
+    JWT_REFRESH_EXPIRATION_DELTA ago) and the revoked ones. Every login and refresh creates one.
+    Returns (expired, revoked) counts
+    """
+    RefreshToken = get_refresh_token_model()
+    expires = timezone.now() - jwt_settings.JWT_REFRESH_EXPIRATION_DELTA
+    expired = _delete_in_batches(RefreshToken.objects.filter(created__lt=expires), 'created', batch_size)
+    revoked = _delete_in_batches(RefreshToken.objects.filter(revoked__isnull=False), 'revoked', batch_size)
+    return expired, revoked
+
+
+def purge_unverified_users(days, batch_size=500):
+    """
+    Removes the accounts (and everything that cascades from them) that were never verified, were created
+    more than days ago and haven't logged in since then (graphql_auth lets them log in unverified).
+    Staff accounts are kept. Returns the number of users purged
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    users = get_user_model().objects.filter(
+        Q(last_login__isnull=True) | Q(last_login__lt=cutoff),
+        status__verified=False,
+        date_joined__lt=cutoff,
+        is_staff=False,
+        is_superuser=False
+    )
+    return _delete_in_batches(users, 'status__user_id', batch_size)
+
+
+def purge_rate_limit_counts(batch_size=500):
+    """Removes the calls counted by the rate limits whose window is too old to matter, returns how many"""
+    return _delete_in_batches(RateLimitCount.objects.filter(expires_at__lt=timezone.now()), 'expires_at', batch_size)
@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+
+from utils.fingerprints import FingerprintSet
+
+# refreshToken looks the refresh token up with JWT_GET_REFRESH_TOKEN_HANDLER (get_refresh_token):
+# the row is needed for its user and its age, so a token that can still be used always costs a query,
+# a single one since the user is loaded with it. The tokens that were revoked are kept in memory
+# (c.f. utils/fingerprints.py, 8 bytes a token), so one that's sent again is refused without a query.
+# The set is built from the database on its first use and updated when this process revokes a token
+# (c.f. signals.py). Once it's older than its ttl, the request that notices only loads the tokens revoked since
+# the last load (give or take REVOKED_TOKENS_OVERLAP, for the clocks of the processes and the transactions
+# that commit late), with the partial index on revoked (c.f. 0015_purge_indexes), while the other requests
+# keep using the set. Purged tokens stay in the set, they can't be used anyway.
+# The query still only finds tokens that aren't revoked, so a token the set misses is refused all the same.
+REVOKED_TOKENS_TTL = 300
+REVOKED_TOKENS_OVERLAP = timedelta(minutes=5)
+
+
+class RevokedTokens:
+    def __init__(self, ttl=REVOKED_TOKENS_TTL):
+        self.ttl = ttl
+        self._tokens = None
+        self._loaded_at = 0
+        self._loaded_since = None
+        self._lock = threading.Lock()
+
+    def _load(self, since=None):
+        """The tokens revoked since the given time (all of them if None), must hold the lock"""
+        now = timezone.now()
+        revoked = get_refresh_token_model().objects.filter(revoked__isnull=False)
+        if since is not None:
+            revoked = revoked.filter(revoked__gte=since)
+        tokens = revoked.values_list('token', flat=True).iterator()
+        if self._tokens is None:
+            self._tokens = FingerprintSet(tokens)
+        else:
+            for token in tokens:
+                self._tokens.add(token)
+        self._loaded_since = now - REVOKED_TOKENS_OVERLAP
+        self._loaded_at = time.monotonic()
+
+    def _stale(self):
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def get(self):
+        if self._tokens is None:
+            with self._lock:
+                if self._tokens is None:
+                    self._load()
+        elif self._stale() and self._lock.acquire(blocking=False):
+            try:
+                # Unless another request just loaded them
+                if self._stale():
+                    self._load(self._loaded_since)
+            finally:
+                self._lock.release()
+        return self._tokens
+
+    def add(self, token):
+        """Adds a token that was revoked, if the set has been built"""
+        with self._lock:
+            if self._tokens is not None:
+                self._tokens.add(token)
+
+    def clear(self):
+        with self._lock:
+            self._tokens = None
+
+
+revoked_tokens = RevokedTokens()
+
+
+def get_refresh_token(refresh_token_model, token, context=None):
+    if token in revoked_tokens.get():
+        raise refresh_token_model.DoesNotExist
+    return refresh_token_model.objects.select_related('user').get(token=token, revoked__isnull=True)
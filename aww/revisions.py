@@ -0,0 +1,157 @@
+import difflib
+from collections import Counter
+
+from django.db.models import Max
+
+from utils.fractional_index import spread_keys
+
+from .models import RecipeIngredient, RecipeStep, RecipeRevision
+
+# Every edit of a recipe is stored as a delta between the recipe before and after the edit:
+# {
+#   "name": [old, new],                         (only if it changed, same for photo and servings)
+#   "ingredients": {"-": [...], "+": [...]},    (multiset of [name, quantity, unit])
+#   "steps": [[i1, j1, old_steps, new_steps]]   (difflib opcodes, i1/j1 index the old/new lists)
+# }
+# so the storage of a revision grows with the size of the change, not the size of the recipe.
+# Going back in history is done by applying the deltas in reverse from the current recipe.
+SCALAR_FIELDS = ['name', 'photo', 'servings']
+# The state before a recipe is created, so creating it is recorded as its first revision
+EMPTY_STATE = {'name': '', 'photo': '', 'servings': None, 'ingredients': [], 'steps': []}
+
+
+def snapshot(recipe):
+    return {
+        'name': recipe.name,
+        'photo': recipe.photo,
+        'servings': recipe.servings,
+        'ingredients': sorted(
+            [ing.name, ing.quantity, ing.unit] for ing in recipe.recipeingredient_set.all()
+        ),
+        'steps': [step.step for step in recipe.recipestep_set.all()],
+    }
+
+
+def diff(before, after):
+    delta = {}
+    for field in SCALAR_FIELDS:
+        # .get since servings was added after the first revisions were recorded
+        if before.get(field) != after.get(field):
+            delta[field] = [before.get(field), after.get(field)]
+
+    old_ingredients = Counter(tuple(ing) for ing in before['ingredients'])
+    new_ingredients = Counter(tuple(ing) for ing in after['ingredients'])
+    removed = sorted((old_ingredients - new_ingredients).elements())
+    added = sorted((new_ingredients - old_ingredients).elements())
+    if removed or added:
+        delta['ingredients'] = {
+            '-': [list(ing) for ing in removed],
+            '+': [list(ing) for ing in added],
+        }
+
+    matcher = difflib.SequenceMatcher(a=before['steps'], b=after['steps'], autojunk=False)
+    opcodes = [
+        [i1, j1, before['steps'][i1:i2], after['steps'][j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+    if opcodes:
+        delta['steps'] = opcodes
+    return delta
+
+
+def apply_delta(state, delta, reverse=False):
+    """Returns a new state with the delta applied, or undone if reverse is True"""
+    state = {
+        **{field: state.get(field) for field in SCALAR_FIELDS},
+        'ingredients': [list(ing) for ing in state['ingredients']],
+        'steps': list(state['steps']),
+    }
+    for field in SCALAR_FIELDS:
+        if field in delta:
+            old, new = delta[field]
+            state[field] = old if reverse else new
+
+    if 'ingredients' in delta:
+        removed, added = delta['ingredients']['-'], delta['ingredients']['+']
+        if reverse:
+            removed, added = added, removed
+        ingredients = Counter(tuple(ing) for ing in state['ingredients'])
+        ingredients.subtract(tuple(ing) for ing in removed)
+        ingredients.update(tuple(ing) for ing in added)
+        state['ingredients'] = sorted(list(ing) for ing in (+ingredients).elements())
+
+    # Opcodes are applied back to front so the earlier indices stay valid
+    for i1, j1, old_steps, new_steps in reversed(delta.get('steps', [])):
+        if reverse:
+            state['steps'][j1:j1 + len(new_steps)] = old_steps
+        else:
+            state['steps'][i1:i1 + len(old_steps)] = new_steps
+    return state
+
+
+def record_revision(recipe, before, author=None):
+    """
+    Stores the difference between the before snapshot and the recipe as it is now.
+    Nothing is stored (and None is returned) if nothing changed.
+    Should be called inside a transaction that holds a lock on the recipe row.
+    """
+    delta = diff(before, snapshot(recipe))
+    if not delta:
+        return None
+    last = RecipeRevision.objects.filter(recipe=recipe).aggregate(last=Max('revision'))['last']
+    return RecipeRevision.objects.create(
+        recipe=recipe,
+        revision=(last or 0) + 1,
+        author=author if author is not None and author.is_authenticated else None,
+        delta=delta
+    )
+
+
+def state_at(recipe, revision):
+    """Rebuilds the state of the recipe right after the given revision was made"""
+    try:
+        RecipeRevision.objects.get(recipe=recipe, revision=revision)
+    except RecipeRevision.DoesNotExist:
+        raise Exception(f"Recipe has no revision {revision}")
+    state = snapshot(recipe)
+    for later in RecipeRevision.objects.filter(recipe=recipe, revision__gt=revision).order_by('-revision'):
+        state = apply_delta(state, later.delta, reverse=True)
+    return state
+
+
+def write_ingredients(recipe, ingredients):
+    """
+    Makes the recipe's ingredients match the list of [name, quantity, unit]
+    Only the ingredients that were removed/added are deleted/created.
+    """
+    wanted = Counter(tuple(ing) for ing in ingredients)
+    stale = []
+    for ing in recipe.recipeingredient_set.all():
+        key = (ing.name, ing.quantity, ing.unit)
+        if wanted[key] > 0:
+            wanted[key] -= 1
+        else:
+            stale.append(ing.id)
+    if stale:
+        RecipeIngredient.objects.filter(id__in=stale).delete()
+    for name, quantity, unit in (+wanted).elements():
+        recipe.recipeingredient_set.create(name=name, quantity=quantity, unit=unit)
+
+
+def write_steps(recipe, steps):
+    """Makes the recipe's steps match the list of step texts, in that order"""
+    if [step.step for step in recipe.recipestep_set.all()] == steps:
+        return
+    recipe.recipestep_set.all().delete()
+    RecipeStep.objects.bulk_create([
+        RecipeStep(recipe=recipe, step=step, order=order, position=position)
+        for order, (step, position) in enumerate(zip(steps, spread_keys(len(steps))), start=1)
+    ])
+
+
+def write_state(recipe, state):
+    for field in SCALAR_FIELDS:
+        setattr(recipe, field, state[field])
+    recipe.save()
+    write_ingredients(recipe, state['ingredients'])
+    write_steps(recipe, state['steps'])
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from utils.quantities import format_amount
+from utils.units import AMOUNT_PLACES, METRIC_UNITS, sensible_unit
+
+from .models import RecipeIngredient
+
+# A recipe's ingredients scaled by a factor (i.e. servings / recipe.servings), the amounts that are numbers
+# multiplied and moved to a sensible unit (3 tsp -> 1 tbsp), the others ("a pinch") left as they are.
+# Scaled ingredients are cached under the recipe's version, which is bumped on every change of the recipe,
+# so they're only computed once per recipe, version and factor.
+# The scaling is a plain Python pass, not NumPy: a recipe has at most 150 ingredients (about 5 ms to scale),
+# the multiplication and the choice of unit are under a tenth of that while building the copies and
+# formatting their quantities (per string, as fractions) are the rest, which arrays wouldn't speed up.
+SCALED_INGREDIENTS_TIMEOUT = 60 * 60
+MAX_SCALE = 100
+
+
+def scale_factor(recipe, servings=None, scale=None):
+    """Returns the factor to scale the recipe's ingredients by, or None if they shouldn't be scaled"""
+    if servings is not None and scale is not None:
+        raise Exception("Both servings and scale cannot be provided")
+    if servings is not None:
+        if not recipe.servings:
+            raise Exception("The recipe has no servings to scale from")
+        if servings < 1:
+            raise Exception("Servings must be at least 1")
+        factor = Decimal(servings) / Decimal(recipe.servings)
+    elif scale is not None:
+        if scale <= 0 or scale > MAX_SCALE:
+            raise Exception(f"Scale must be greater than 0 and at most {MAX_SCALE}")
+        factor = Decimal(str(scale))
+    else:
+        return None
+    factor = factor.quantize(AMOUNT_PLACES)
+    return None if factor == 1 else factor
+
+
+def scale_ingredients(ingredients, factor):
+    """
+    Returns the ingredients scaled by factor, as unsaved copies. Every ingredient is done in one pass
+    over the amounts/units so there's no per-ingredient string parsing (c.f. BaseIngredient.amount)
+    """
+    scaled = []
+    for ingredient in ingredients:
+        copy = RecipeIngredient(
+            id=ingredient.id,
+            recipe_id=ingredient.recipe_id,
+            name=ingredient.name,
+            quantity=ingredient.quantity,
+            unit=ingredient.unit,
+            amount=ingredient.amount,
+            canonical_unit=ingredient.canonical_unit,
+            ingredient_id=ingredient.ingredient_id
+        )
+        if ingredient.amount is not None:
+            amount, unit = sensible_unit(ingredient.amount * factor, ingredient.canonical_unit)
+            copy.amount = amount.quantize(AMOUNT_PLACES)
+            copy.quantity = format_amount(copy.amount, fractions=unit not in METRIC_UNITS)
+            # The unit is only rewritten if it changed, so the way it was written is kept
+            if unit != ingredient.canonical_unit:
+                copy.unit = copy.canonical_unit = unit
+        scaled.append(copy)
+    return scaled
+
+
+def scaled_ingredients(recipe, factor, loader):
+    """
+    Returns the recipe's ingredients scaled by factor, from the cache if they've already been scaled,
+    or a promise of them loaded by loader (c.f. schema/loaders.py) if they haven't
+    """
+    key = f'scaled-ingredients:{recipe.pk}:{recipe.version}:{factor}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    def scale(loaded):
+        result = scale_ingredients(loaded, factor)
+        cache.set(key, result, SCALED_INGREDIENTS_TIMEOUT)
+        return result
+    return loader.load(recipe.pk).then(scale)
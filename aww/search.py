@@ -0,0 +1,144 @@
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, TextField
+
+from .models import Recipe, RecipeIngredient, RecipeStep
+
+# Recipes are searched by their name, the names of their ingredients and their steps, in that order of importance.
+# On Postgres, every recipe stores a tsvector of those (Recipe.search_vector, GIN indexed c.f. 0006_recipe_search)
+# On SQLite (local development/tests), they're stored in the aww_recipe_fts FTS5 table instead
+# Either way, they're rewritten whenever a recipe is changed, c.f. the recipes_changed signal in signals.py
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'aww_recipe_fts'
+# bm25 weights of the recipe_id, name, ingredients and steps columns of the FTS table, in the same ratios
+# as the A, B and C weights of ts_rank (1.0, 0.4, 0.2). bm25 also favours the shorter recipes, which ts_rank
+# doesn't, so the two backends only agree on the order of recipes matched in different columns
+FTS_WEIGHTS = '0, 1.0, 0.4, 0.2'
+# The terms of a websearch query: an optional - then a "quoted phrase" (that may be left open) or a word
+QUERY_TERM = re.compile(r'(-?)(?:"([^"]*)"?|([^\s"]+))')
+
+
+def update_search_vectors(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        _update_postgres(recipe_ids)
+    elif connection.vendor == 'sqlite':
+        _update_sqlite(recipe_ids)
+
+
+def _text_of(model):
+    # All the texts of the recipe joined into one string
+    field = 'name' if model is RecipeIngredient else 'step'
+    texts = (
+        model.objects
+        .filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(text=StringAgg(field, ' ', output_field=TextField()))
+        .values('text')
+    )
+    return Subquery(texts, output_field=TextField())
+
+
+def _update_postgres(recipe_ids):
+    # A single UPDATE, the texts are aggregated by the database
+    Recipe.all_objects.filter(id__in=recipe_ids).update(search_vector=(
+        SearchVector(F('name'), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_text_of(RecipeIngredient), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_text_of(RecipeStep), weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def _update_sqlite(recipe_ids):
+    recipes = Recipe.all_objects.filter(id__in=recipe_ids).prefetch_related('recipeingredient_set', 'recipestep_set')
+    rows = [
+        (
+            recipe.id.hex,
+            recipe.name,
+            ' '.join(ing.name for ing in recipe.recipeingredient_set.all()),
+            ' '.join(step.step for step in recipe.recipestep_set.all()),
+        )
+        for recipe in recipes
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE recipe_id = %s", [(id.hex,) for id in recipe_ids])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (recipe_id, name, ingredients, steps) VALUES (%s, %s, %s, %s)", rows)
+
+
+def search_recipes(query, limit, offset=0):
+    """Returns the recipes (that aren't deleted) matching the query, best match first"""
+    if not query.strip():
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(query, limit, offset)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(query, limit, offset)
+    raise Exception(f"Searching recipes isn't supported on {connection.vendor}")
+
+
+def _search_postgres(query, limit, offset):
+    # websearch allows "quoted phrases", or and -excluded words without ever being a syntax error
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    recipes = (
+        Recipe.objects
+        .filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', 'name')
+    )
+    return list(recipes[offset:offset + limit])
+
+
+def fts_match(query):
+    """
+    Translates a websearch query (c.f. _search_postgres) to an FTS5 MATCH expression, or None if it can't match:
+    words and "quoted phrases" are all required, or between two of them requires either one
+    and -word/-"phrase" excludes the recipes that have it.
+    Every term is quoted so the expression can't be an FTS5 syntax error. Unlike Postgres,
+    a query that only excludes terms matches nothing since FTS5 has no standalone NOT.
+    """
+    required, excluded = [], []
+    either = False
+    for minus, phrase, word in QUERY_TERM.findall(query):
+        text = phrase or word
+        if not minus and not phrase and word.lower() == 'or':
+            either = bool(required)
+            continue
+        if not re.search(r'\w', text):
+            continue
+        term = '"{}"'.format(text.replace('"', '""'))
+        if minus:
+            excluded.append(term)
+            continue
+        if required:
+            # AND binds tighter than OR in FTS5 like in tsquery, "a or b c" is a OR (b AND c) in both
+            required.append('OR' if either else 'AND')
+        required.append(term)
+        either = False
+    if not required:
+        return None
+    match = ' '.join(required)
+    if excluded:
+        match = f"({match}) NOT ({' OR '.join(excluded)})"
+    return match
+
+
+def _search_sqlite(query, limit, offset):
+    match = fts_match(query)
+    if match is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {FTS_TABLE}.recipe_id FROM {FTS_TABLE} "
+            f"JOIN aww_recipe ON aww_recipe.id = {FTS_TABLE}.recipe_id "
+            f"WHERE aww_recipe.deleted_at IS NULL AND {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {FTS_WEIGHTS}), aww_recipe.name LIMIT %s OFFSET %s",
+            [match, limit, offset]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    recipes = {recipe.id.hex: recipe for recipe in Recipe.objects.filter(id__in=ids)}
+    return [recipes[id] for id in ids if id in recipes]
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db.models import F, Sum, Window
+
+from utils.ingredients import ingredient_key
+from utils.quantities import format_amount
+from utils.units import METRIC_UNITS, from_base_unit
+
+from .models import Group, GroupMeal, IndividualMeal
+from .units import base_amount, base_unit
+
+# The shopping list of an individual/group generated from the recipes of its meals.
+# It's cached under the owner's version (bumped whenever its meals are updated, c.f. versioning.py)
+# and the recipes' generation (bumped whenever any recipe is changed or deleted, c.f. signals.py),
+# so it's computed again as soon as either changes. Since the cache may be local to a process,
+# entries also expire after SHOPPING_LIST_TIMEOUT to bound how long another process can see an old list.
+RECIPES_GENERATION_KEY = 'recipes-generation'
+SHOPPING_LIST_TIMEOUT = 60 * 10
+
+
+class ShoppingItem:
+    def __init__(self, name, quantity, unit):
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit
+
+
+def recipes_generation():
+    return cache.get_or_set(RECIPES_GENERATION_KEY, 1, None)
+
+
+def bump_recipes_generation():
+    # add is a no-op if the key exists. incr is atomic with memcached, with the database cache two bumps at the same
+    # time may only count once, which still changes the generation
+    cache.add(RECIPES_GENERATION_KEY, 1, None)
+    cache.incr(RECIPES_GENERATION_KEY)
+
+
+def _ingredients_of_meals(owner, days):
+    # One joined query: a row per ingredient per meal, so a recipe planned twice is counted twice.
+    # The database converts the amounts to their base unit (c.f. units.py) and sums them by catalogue entry
+    # and base unit, each row getting the total of its entry in its base unit
+    if isinstance(owner, Group):
+        meals = GroupMeal.objects.filter(group=owner)
+    else:
+        meals = IndividualMeal.objects.filter(individual=owner)
+    if days:
+        meals = meals.filter(day__in=days)
+    prefix = 'recipe__recipeingredient__'
+    return meals.filter(
+        recipe__deleted_at__isnull=True,
+        recipe__recipeingredient__isnull=False
+    ).annotate(
+        base=base_unit(prefix),
+        in_base=base_amount(prefix),
+        total=Window(Sum(base_amount(prefix)), partition_by=[F(f'{prefix}ingredient'), base_unit(prefix)])
+    ).order_by('day', 'time').values_list(
+        f'{prefix}ingredient',
+        f'{prefix}name',
+        f'{prefix}quantity',
+        f'{prefix}unit',
+        f'{prefix}canonical_unit',
+        'base',
+        'in_base',
+        'total'
+    )
+
+
+def build_shopping_list(rows):
+    """
+    Merges the (catalogue id, name, quantity, unit, canonical unit, base unit, amount in the base unit,
+    total of the catalogue entry in the base unit) rows of the same catalogue entry
+    (c.f. catalogue.py, or the same normalized name for the rows that have none, whose amounts are summed here)
+    whose units can be added up (the same unit, or units of the same dimension like cups and ml).
+    The items keep the name/unit they first appeared with, in that order, and the amounts
+    are written in that unit. The quantities that aren't numbers are kept as they are after the sum:
+    "1 1/2 + a pinch"
+    """
+    items = {}
+    for ingredient_id, name, quantity, unit, canonical, base, amount_in_base, total in rows:
+        key = (ingredient_id if ingredient_id is not None else ingredient_key(name), base)
+        if key not in items:
+            items[key] = {
+                'name': name, 'unit': unit, 'canonical': canonical,
+                'total': total if ingredient_id is not None else None, 'others': []
+            }
+        item = items[key]
+        if amount_in_base is None:
+            if quantity.strip() and quantity.strip() not in item['others']:
+                item['others'].append(quantity.strip())
+        elif ingredient_id is None:
+            item['total'] = amount_in_base if item['total'] is None else item['total'] + amount_in_base
+    shopping_list = []
+    for item in items.values():
+        parts = item['others']
+        if item['total'] is not None:
+            amount = from_base_unit(item['total'], item['canonical'])
+            parts = [format_amount(amount, fractions=item['canonical'] not in METRIC_UNITS)] + parts
+        shopping_list.append(ShoppingItem(item['name'], ' + '.join(parts), item['unit']))
+    return shopping_list
+
+
+def generated_shopping_list(owner, days=None):
+    days = sorted(set(days)) if days else []
+    key = 'shopping-list:{}:{}:{}:{}:{}'.format(
+        owner.__class__.__name__, owner.pk, owner.version, recipes_generation(), ','.join(days)
+    )
+    items = cache.get(key)
+    if items is None:
+        items = build_shopping_list(_ingredients_of_meals(owner, days))
+        cache.set(key, items, SHOPPING_LIST_TIMEOUT)
+    return items
@@ -1,16 +1,32 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import transaction
 from django.db.utils import IntegrityError
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
+from graphql_auth.models import UserStatus
+from graphql_jwt.refresh_token.signals import refresh_token_revoked
 
 from .models import (
+    Ingredient,
     Recipe,
+    RecipeIngredient,
+    GroupShoppingItem,
+    IndividualShoppingItem,
     RecipeStep,
     Individual,
     Group,
     GroupMeal,
     IndividualMeal
 )
+from .auth import forget_user
+from .catalogue import clear_cache, intern_ingredient
+from .indexes import recipe_names, group_names, PREFIX_INDEXES
+from .ingredient_index import index_ingredients
+from .refresh_tokens import revoked_tokens
+from .search import update_search_vectors
+from .shopping import bump_recipes_generation
+from .similarity import mark_stale
+from .step_positions import position_for
 
 # Thanks to the wonderful blog post found here:
 # https://lewiskori.com/blog/user-registration-and-authorization-on-a-django-api-with-djoser-and-json-web-tokens/
@@ -45,6 +61,27 @@ def url_cannot_be_changed_on_update(sender, instance, **kwargs):
     if old_recipe.url != instance.url:
         raise IntegrityError("Recipe URL cannot be changed after creation")
 
+# Keeps this process's name indexes (c.f. indexes.py) up to date
+@receiver(post_save, sender=Recipe)
+def recipe_name_index_update(sender, instance, **kwargs):
+    recipe_names.update(instance)
+
+@receiver(post_save, sender=Group)
+def group_name_index_update(sender, instance, **kwargs):
+    group_names.update(instance)
+
+# Autocomplete answers from the prefix indexes without checking the database,
+# so they're only updated once the change has been committed
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+def name_prefix_index_update(sender, instance, **kwargs):
+    transaction.on_commit(lambda: PREFIX_INDEXES[sender].update(instance))
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Ingredient)
+def name_prefix_index_removal(sender, instance, **kwargs):
+    transaction.on_commit(lambda: PREFIX_INDEXES[sender].remove([instance.pk]))
+
 # The order of the steps will be assigned by the database
 # If the order has not been set already
 @receiver(pre_save, sender=RecipeStep)
@@ -76,9 +113,98 @@ def step_order_assignment(sender, instance, **kwargs):
 def step_order_unique(sender, instance, **kwargs):
     if instance.order < 1 or instance.order % 1 != 0:
         raise IntegrityError("Step order must be an integer greater than or equal to 1")
-    if instance.order in [step.order for step in sender.objects.filter(recipe=instance.recipe)]:
+    if instance.order in [step.order for step in sender.objects.filter(recipe=instance.recipe).exclude(pk=instance.pk)]:
         raise IntegrityError(f"Duplicate Key: {sender.recipe} already has step in order {instance.order}")
 
+# Steps are sorted by their position, so a step saved without one
+# is put between the steps that come right before and after it by order
+@receiver(pre_save, sender=RecipeStep)
+def step_position_assignment(sender, instance, **kwargs):
+    if instance.position:
+        return
+    siblings = sender.objects.filter(recipe=instance.recipe).exclude(pk=instance.pk)
+    previous = siblings.filter(order__lt=instance.order).order_by('-order').first()
+    following = siblings.filter(order__gt=instance.order).order_by('order').first()
+    # If steps have been moved around, the step just goes at the end
+    if previous and following and previous.position >= following.position:
+        following = None
+        previous = siblings.order_by('-position').first()
+    instance.position = position_for(
+        instance.recipe,
+        after=previous,
+        before=following if previous is None else None,
+        exclude=instance if instance.pk else None
+    )
+
+# Sent with recipe_ids once the name, ingredients and/or steps of recipes have been written or the recipes
+# have been deleted (by the recipe mutations and the admin panel), so what's built from the content of a recipe
+# is rebuilt once per write instead of once per saved row
+recipes_changed = Signal()
+
+@receiver(recipes_changed)
+def recipe_search_update(sender, recipe_ids, **kwargs):
+    update_search_vectors(recipe_ids)
+
+@receiver(recipes_changed)
+def recipe_ingredient_index_update(sender, recipe_ids, **kwargs):
+    index_ingredients(recipe_ids)
+
+# Their similar recipes are recomputed by the next refresh_similar_recipes (c.f. similarity.py)
+@receiver(recipes_changed)
+def similar_recipes_invalidation(sender, recipe_ids, **kwargs):
+    mark_stale(recipe_ids)
+
+# Recipes are soft deleted by an update, which doesn't send post_save
+@receiver(recipes_changed)
+def recipe_prefix_index_refresh(sender, recipe_ids, **kwargs):
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: PREFIX_INDEXES[Recipe].refresh(recipe_ids))
+
+# The generated shopping lists (c.f. shopping.py) are built from the recipes' ingredients
+@receiver(recipes_changed)
+def shopping_list_invalidation(sender, recipe_ids, **kwargs):
+    bump_recipes_generation()
+
+# The amount and canonical unit are always the ones of the quantity and unit that are saved
+# (bulk_create doesn't send signals, so whatever bulk creates ingredients calls parse_amount
+# and intern_ingredient itself)
+@receiver(pre_save, sender=RecipeIngredient)
+@receiver(pre_save, sender=GroupShoppingItem)
+@receiver(pre_save, sender=IndividualShoppingItem)
+def ingredient_amount_assignment(sender, instance, **kwargs):
+    instance.parse_amount()
+
+# Same for the catalogue entry of the name
+@receiver(pre_save, sender=RecipeIngredient)
+@receiver(pre_save, sender=GroupShoppingItem)
+@receiver(pre_save, sender=IndividualShoppingItem)
+def ingredient_catalogue_assignment(sender, instance, **kwargs):
+    instance.ingredient_id = intern_ingredient(instance.name)
+
+# The spellings cached by this process may point at the deleted entry
+@receiver(post_delete, sender=Ingredient)
+def ingredient_catalogue_invalidation(sender, instance, **kwargs):
+    clear_cache()
+
+# The user may be cached by the authentication backend (c.f. auth.py)
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_cache_invalidation(sender, instance, **kwargs):
+    forget_user(instance.pk, instance.get_username())
+
+
+@receiver(post_save, sender=UserStatus)
+@receiver(post_delete, sender=UserStatus)
+def user_status_cache_invalidation(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+# Once the revocation is committed, so a token whose revocation is rolled back can still be used
+@receiver(refresh_token_revoked)
+def revoked_token_filter(sender, refresh_token, **kwargs):
+    token = refresh_token.token
+    transaction.on_commit(lambda: revoked_tokens.add(token))
+
 # Meals should be unique for that individual/group at that time & day
 @receiver(pre_save, sender=GroupMeal)
 def meal_time_day_unique_for_group(sender, instance, **kwargs):
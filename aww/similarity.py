@@ -0,0 +1,94 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from utils.similarity import IncidenceMatrix
+
+from .models import Recipe, RecipeIngredient, RecipeSimilarity
+
+# "Recipes similar to this one": the recipes that share the most ingredients (catalogue entries, c.f. catalogue.py)
+# with a recipe, by cosine similarity over the recipes x ingredients matrix (c.f. utils/similarity.py).
+# They're computed off the request path by the refresh_similar_recipes command and stored, so RecipeType.similar
+# is a single indexed query. Recipes are marked stale whenever they change (c.f. signals.py) and a refresh only
+# recomputes the stale recipes and the recipes they were or now are among the most similar of.
+SIMILAR_RECIPES = 10
+BATCH_SIZE = 500
+
+
+def mark_stale(recipe_ids):
+    Recipe.all_objects.filter(id__in=recipe_ids).update(similar_stale=True)
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def recipe_matrix():
+    """Returns the ids of the recipes that aren't deleted and the matrix of the ingredients they use, a row per recipe"""
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    row_of = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+    pairs = [
+        (row_of[recipe_id], ingredient_id)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe__deleted_at__isnull=True, ingredient__isnull=False
+        ).values_list('recipe_id', 'ingredient_id').distinct().iterator()
+        # Created after the recipes were read
+        if recipe_id in row_of
+    ]
+    rows = np.array([row for row, _ in pairs], dtype=np.int64)
+    ingredient_ids, columns = np.unique(np.array([column for _, column in pairs], dtype=np.int64), return_inverse=True)
+    return recipe_ids, IncidenceMatrix(rows, columns, len(recipe_ids), len(ingredient_ids))
+
+
+def _floors(recipe_ids):
+    """The score a recipe has to beat to be among the stored most similar recipes of each recipe"""
+    floors = np.zeros(len(recipe_ids))
+    row_of = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+    for recipe_id, count, lowest in RecipeSimilarity.objects.values('recipe_id').annotate(
+        count=Count('id'), lowest=Min('score')
+    ).values_list('recipe_id', 'count', 'lowest').iterator():
+        if recipe_id in row_of and count >= SIMILAR_RECIPES:
+            floors[row_of[recipe_id]] = lowest
+    return floors
+
+
+def refresh_similar_recipes(full=False):
+    """Recomputes the similar recipes of the stale recipes (of every recipe if full), returns how many were recomputed"""
+    stale = Recipe.all_objects.all() if full else Recipe.all_objects.filter(similar_stale=True)
+    stale_ids = set(stale.values_list('id', flat=True))
+    if not stale_ids:
+        return 0
+    # Cleared before the recipes are read, so the ones that change in the meantime are stale for the next refresh
+    for chunk in _chunks(stale_ids):
+        Recipe.all_objects.filter(id__in=chunk).update(similar_stale=False)
+
+    recipe_ids, matrix = recipe_matrix()
+    row_of = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+    neighbours, reached = matrix.top_k(
+        [row_of[recipe_id] for recipe_id in stale_ids if recipe_id in row_of],
+        SIMILAR_RECIPES,
+        floor=None if full else _floors(recipe_ids)
+    )
+    if not full:
+        # The recipes that had a stale (changed or deleted) recipe among their most similar,
+        # and the ones a stale recipe is now more similar to than their least similar
+        affected = set()
+        for chunk in _chunks(stale_ids):
+            affected.update(RecipeSimilarity.objects.filter(similar_id__in=chunk).values_list('recipe_id', flat=True))
+        affected.update(recipe_ids[row] for row in np.nonzero(reached)[0])
+        affected -= stale_ids
+        more, _ = matrix.top_k([row_of[recipe_id] for recipe_id in affected if recipe_id in row_of], SIMILAR_RECIPES)
+        neighbours.update(more)
+        stale_ids |= affected
+
+    with transaction.atomic():
+        for chunk in _chunks(stale_ids):
+            RecipeSimilarity.objects.filter(recipe_id__in=chunk).delete()
+        RecipeSimilarity.objects.bulk_create([
+            RecipeSimilarity(recipe_id=recipe_ids[row], similar_id=recipe_ids[other], score=score)
+            for row, similar in neighbours.items()
+            for other, score in similar
+        ], batch_size=BATCH_SIZE)
+    return len(stale_ids)
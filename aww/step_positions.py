@@ -0,0 +1,102 @@
+from utils.fractional_index import MAX_KEY_LENGTH, key_between, keys_between, spread_keys
+
+from .models import RecipeStep
+
+# The steps of a recipe are sorted by their position (c.f. utils/fractional_index.py)
+# so inserting or moving a step only writes that step. Once the keys get too long,
+# every step of the recipe gets a new, short key in a single bulk_update.
+
+
+def rebalance(recipe, steps=None):
+    """Spreads the positions of the steps (by default the recipe's steps, in their current order)"""
+    steps = list(recipe.recipestep_set.all()) if steps is None else steps
+    for step, position in zip(steps, spread_keys(len(steps))):
+        step.position = position
+    RecipeStep.objects.bulk_update(steps, ['position'])
+    return steps
+
+
+def _neighbours(recipe, after=None, before=None, exclude=None):
+    steps = RecipeStep.objects.filter(recipe=recipe)
+    if exclude is not None:
+        steps = steps.exclude(pk=exclude.pk)
+    if after is not None:
+        following = steps.filter(position__gt=after.position).order_by('position').first()
+        return after.position, following.position if following else None
+    if before is not None:
+        previous = steps.filter(position__lt=before.position).order_by('-position').first()
+        return previous.position if previous else None, before.position
+    # Neither: at the end of the list
+    last = steps.order_by('-position').first()
+    return last.position if last else None, None
+
+
+def position_for(recipe, after=None, before=None, exclude=None):
+    """
+    Returns a position right after the step after, right before the step before
+    or at the end of the recipe if neither are given.
+    exclude is the step that's being moved, so it isn't counted as a neighbour.
+    """
+    if after is not None and before is not None:
+        raise Exception("Only one of after and before can be provided")
+    lower, upper = _neighbours(recipe, after, before, exclude)
+    position = key_between(lower, upper)
+    if len(position) > MAX_KEY_LENGTH:
+        rebalance(recipe)
+        for step in (after, before, exclude):
+            if step is not None:
+                step.refresh_from_db(fields=['position'])
+        position = key_between(*_neighbours(recipe, after, before, exclude))
+    return position
+
+
+def _longest_increasing_run(positions):
+    """Indices of a longest strictly increasing subsequence of positions"""
+    tails, tail_indices, parents = [], [], [None] * len(positions)
+    for i, position in enumerate(positions):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if tails[middle] < position:
+                low = middle + 1
+            else:
+                high = middle
+        if low > 0:
+            parents[i] = tail_indices[low - 1]
+        if low == len(tails):
+            tails.append(position)
+            tail_indices.append(i)
+        else:
+            tails[low] = position
+            tail_indices[low] = i
+    indices = []
+    i = tail_indices[-1] if tail_indices else None
+    while i is not None:
+        indices.append(i)
+        i = parents[i]
+    return set(indices)
+
+
+def reorder(recipe, steps):
+    """
+    Puts the steps (all the steps of the recipe) in the given order.
+    The steps that are already in the right order relative to each other keep their positions,
+    only the others get a new position between their new neighbours.
+    Returns the steps that were written.
+    """
+    kept = _longest_increasing_run([step.position for step in steps])
+    changed = []
+    lower, run = None, []
+    for i, step in enumerate(steps + [None]):
+        if step is not None and i not in kept:
+            run.append(step)
+            continue
+        upper = step.position if step is not None else None
+        for moved, position in zip(run, keys_between(lower, upper, len(run))):
+            moved.position = position
+            changed.append(moved)
+        lower, run = upper, []
+    if any(len(step.position) > MAX_KEY_LENGTH for step in changed):
+        return rebalance(recipe, steps)
+    RecipeStep.objects.bulk_update(changed, ['position'])
+    return changed
@@ -0,0 +1,60 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+
+from utils.trigrams import THRESHOLD
+
+from .indexes import recipe_names, group_names, PREFIX_INDEXES
+from .models import Recipe, Group
+
+# Names similar to a (possibly misspelled) name, using pg_trgm and its trigram indexes
+# (c.f. 0007_name_trigram_index) when the extension is installed, or else the in-process
+# trigram indexes of indexes.py, which give the same similarities
+NAME_INDEXES = {Recipe: recipe_names, Group: group_names}
+
+
+def has_trigram_extension():
+    if connection.vendor != 'postgresql':
+        return False
+    # Only looked up once per connection
+    if not hasattr(connection, 'has_pg_trgm'):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            connection.has_pg_trgm = cursor.fetchone() is not None
+    return connection.has_pg_trgm
+
+
+def suggest(model, name, limit=5):
+    """Returns up to limit rows of the model (Recipe or Group) whose name is the most similar to name"""
+    if not name.strip():
+        return []
+    if has_trigram_extension():
+        # The % operator (trigram_similar) is what can use the trigram index
+        return list(
+            model.objects
+            .filter(name__trigram_similar=name)
+            .annotate(similarity=TrigramSimilarity('name', name))
+            .order_by('-similarity', 'name')[:limit]
+        )
+    names = NAME_INDEXES[model]
+    while True:
+        matches = names.get().search(name, limit=limit, threshold=THRESHOLD)
+        rows = model.objects.in_bulk([key for key, _ in matches])
+        stale = [key for key, _ in matches if key not in rows]
+        if not stale:
+            return [rows[key] for key, _ in matches]
+        # Deleted since the index was built, so they're taken out of it and the search is done again
+        names.remove(stale)
+
+
+class Completion:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+def autocomplete(model, prefix, limit=10):
+    """
+    Returns up to limit Completion for the names of the model (Recipe or Ingredient) that start with prefix,
+    answered from this process's prefix index (c.f. indexes.py) so a keystroke doesn't query the database
+    """
+    return [Completion(key, name) for key, name in PREFIX_INDEXES[model].get().search(prefix, limit)]
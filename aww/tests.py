@@ -1,14 +1,65 @@
+import re
+import sqlite3
+from datetime import timedelta
+from decimal import Decimal
+from fractions import Fraction
+from unittest import mock
+
+from django.db.models import Sum
 from django.test import TestCase
 from django.db.utils import IntegrityError
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.template.loader import render_to_string
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.html import strip_tags
+from graphql_auth.constants import TokenAction
+from graphql_auth.models import UserStatus
+from graphql_auth.settings import graphql_auth_settings as auth_settings
+from graphql_auth.utils import get_token_paylod
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
 
 from .models import (
+    RecipeIngredient,
     RecipeStep,
     Recipe,
     IndividualMeal,
     Group,
-    GroupMeal
+    GroupMeal,
+    Ingredient,
+    Individual,
+    OutgoingEmail,
+    RateLimitCount,
+    RecipeRevision
 )
+from .purge import purge_rate_limit_counts, purge_refresh_tokens, purge_soft_deleted, purge_unverified_users
+from .revisions import diff, apply_delta
+from .step_positions import position_for, reorder
+from .catalogue import clear_cache, intern_ingredient
+from .importer import import_recipes, read_csv, read_ndjson
+from .emails import compiled, render_emails, send_activation_emails, unverified_users
+from .outbox import MAX_ATTEMPTS, deliver_outbox
+from .indexes import ingredient_prefixes, recipe_names, recipe_prefixes
+from .suggestions import autocomplete, suggest
+from .units import base_amount, base_unit
+from .scaling import scale_factor, scale_ingredients
+from .search import FTS_TABLE, FTS_WEIGHTS, fts_match
+from .signals import recipes_changed
+from .similarity import refresh_similar_recipes
+from .shopping import build_shopping_list, generated_shopping_list, recipes_generation
+from . import planner
+from utils.fingerprints import MERGE_SIZE, FingerprintSet
+from utils.fractional_index import MAX_KEY_LENGTH
+from utils.ingredient_lines import parse_line
+from utils.planning import plan_rows
+from utils.prefixes import PrefixIndex
+from utils.similarity import IncidenceMatrix
+from utils.trigrams import TrigramIndex, similarity
+from utils.ingredients import ingredient_tokens
+from utils.quantities import parse_quantity, sum_quantities
+from utils.units import parse_amount, sensible_unit
 
 # Only recipe is tested because otherwise everything is just
 # a Django model with default setup
@@ -251,4 +302,816 @@ class UserTest(TestCase):
         test_user = get_user_model().objects.get(email="test@test.com")
         meals = test_user.individual.individualmeal_set.all()
         self.assertEqual(len(meals), 0)
-        
\ No newline at end of file
+        
+
+class SoftDeleteTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(name="Soft Deleted Recipe")
+        RecipeIngredient.objects.create(name="Flour", quantity="1", unit="cup", recipe=self.recipe)
+        self.group = Group.objects.create(name="Soft Deleted Group")
+        GroupMeal.objects.create(time="B", day="MON", recipe=self.recipe, group=self.group)
+
+    def test_soft_deleted_rows_hidden_by_default_manager(self):
+        """
+        Tests that soft deleted recipes and groups are hidden but still in the database
+        """
+        Recipe.objects.filter(id=self.recipe.id).soft_delete()
+        Group.objects.filter(id=self.group.id).soft_delete()
+        with self.assertRaises(Recipe.DoesNotExist):
+            Recipe.objects.get(id=self.recipe.id)
+        with self.assertRaises(Group.DoesNotExist):
+            Group.objects.get(id=self.group.id)
+        self.assertIsNotNone(Recipe.all_objects.get(id=self.recipe.id).deleted_at)
+        self.assertIsNotNone(Group.all_objects.get(id=self.group.id).deleted_at)
+        self.assertEqual(RecipeIngredient.objects.filter(recipe=self.recipe).count(), 1)
+
+    def test_name_reusable_after_soft_delete(self):
+        """
+        Tests that the name of a soft deleted recipe can be used by a new recipe
+        """
+        Recipe.objects.filter(id=self.recipe.id).soft_delete()
+        Recipe.objects.create(name="Soft Deleted Recipe")
+        with self.assertRaises(IntegrityError):
+            Recipe.objects.create(name="Soft Deleted Recipe")
+
+    def test_purge_removes_rows_in_batches(self):
+        """
+        Tests that purging physically removes soft deleted rows and their cascades
+        while leaving rows that haven't been deleted alone
+        """
+        kept = Recipe.objects.create(name="Kept Recipe")
+        extra = Recipe.objects.create(name="Another Soft Deleted Recipe")
+        Recipe.objects.filter(id__in=[self.recipe.id, extra.id]).soft_delete()
+
+        purged = purge_soft_deleted(Recipe, batch_size=1, grace=timedelta(hours=-1))
+        self.assertEqual(purged, 2)
+        self.assertFalse(Recipe.all_objects.filter(id__in=[self.recipe.id, extra.id]).exists())
+        self.assertEqual(RecipeIngredient.objects.filter(recipe_id=self.recipe.id).count(), 0)
+        self.assertIsNone(GroupMeal.objects.get(group=self.group).recipe)
+        self.assertTrue(Recipe.objects.filter(id=kept.id).exists())
+
+    def test_purge_respects_grace_period(self):
+        """
+        Tests that rows deleted more recently than the grace period are kept
+        """
+        Group.objects.filter(id=self.group.id).soft_delete()
+        self.assertEqual(purge_soft_deleted(Group, grace=timedelta(hours=1)), 0)
+        self.assertTrue(Group.all_objects.filter(id=self.group.id).exists())
+
+class RevisionDeltaTest(TestCase):
+    def test_delta_round_trip(self):
+        """
+        Tests that applying a delta gives the new state and undoing it gives back the old one
+        """
+        before = {
+            'name': 'Pancakes',
+            'photo': '',
+            'servings': None,
+            'ingredients': [['Egg', '2', ''], ['Flour', '1', 'cup'], ['Milk', '1', 'cup']],
+            'steps': ['Mix', 'Rest', 'Fry', 'Serve'],
+        }
+        after = {
+            'name': 'Pancakes',
+            'photo': 'https://www.google.com',
+            'servings': 4,
+            'ingredients': [['Egg', '2', ''], ['Egg', '2', ''], ['Flour', '1', 'cup']],
+            'steps': ['Whisk', 'Mix', 'Fry', 'Flip', 'Serve'],
+        }
+        delta = diff(before, after)
+        self.assertNotIn('name', delta)
+        self.assertEqual(delta['servings'], [None, 4])
+        self.assertEqual(delta['ingredients'], {'-': [['Milk', '1', 'cup']], '+': [['Egg', '2', '']]})
+        self.assertEqual(apply_delta(before, delta), after)
+        self.assertEqual(apply_delta(after, delta, reverse=True), before)
+
+    def test_no_delta_without_changes(self):
+        """
+        Tests that nothing is recorded when the state didn't change
+        """
+        state = {'name': 'Soup', 'photo': '', 'servings': 2, 'ingredients': [], 'steps': ['Boil']}
+        self.assertEqual(diff(state, state), {})
+
+class StepPositionTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(name="Positioned Recipe")
+        for i in range(1, 6):
+            RecipeStep.objects.create(step=f"Step {i}", order=i, recipe=self.recipe)
+
+    def steps(self):
+        return [step.step for step in self.recipe.recipestep_set.all()]
+
+    def test_reorder_only_writes_moved_steps(self):
+        """
+        Tests that moving one step to the front of the list only gives that step a new position
+        """
+        steps = list(self.recipe.recipestep_set.all())
+        changed = reorder(self.recipe, [steps[4]] + steps[:4])
+        self.assertEqual([step.step for step in changed], ["Step 5"])
+        self.assertEqual(self.steps(), ["Step 5", "Step 1", "Step 2", "Step 3", "Step 4"])
+
+    def test_reorder_reverse(self):
+        """
+        Tests that reversing the list keeps one step and moves all the others
+        """
+        steps = list(self.recipe.recipestep_set.all())
+        changed = reorder(self.recipe, list(reversed(steps)))
+        self.assertEqual(len(changed), 4)
+        self.assertEqual(self.steps(), ["Step 5", "Step 4", "Step 3", "Step 2", "Step 1"])
+
+    def test_rebalance_when_positions_get_long(self):
+        """
+        Tests that inserting again and again at the same spot keeps the positions short
+        """
+        first = self.recipe.recipestep_set.first()
+        for i in range(100):
+            RecipeStep.objects.create(
+                step=f"Inserted {i}", order=10 + i, recipe=self.recipe,
+                position=position_for(self.recipe, after=first)
+            )
+        positions = list(self.recipe.recipestep_set.values_list('position', flat=True))
+        self.assertTrue(all(len(position) <= MAX_KEY_LENGTH for position in positions))
+        self.assertEqual(len(set(positions)), 105)
+        self.assertEqual(self.steps()[0], "Step 1")
+        self.assertEqual(self.steps()[1], "Inserted 99")
+        self.assertEqual(self.steps()[-1], "Step 5")
+
+
+class NameSuggestionTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        recipe_names.invalidate()
+        for name in ["Lasagna", "Vegetable Lasagna", "Tomato Soup", "Pancakes"]:
+            Recipe.objects.create(name=name)
+
+    def test_similarity_matches_pg_trgm(self):
+        """
+        Tests that the trigrams give the similarities pg_trgm gives
+        """
+        self.assertEqual(similarity("lasagna", "lasagna"), 1.0)
+        self.assertAlmostEqual(similarity("lasagne", "lasagna"), 0.6)
+        self.assertEqual(similarity("lasagna", "pancakes"), 0.0)
+
+    def test_index_add_and_remove(self):
+        """
+        Tests that the trigram index finds a key once it's added and not after it's removed
+        """
+        index = TrigramIndex([(1, "Lasagna"), (2, "Pancakes")])
+        self.assertEqual([key for key, _ in index.search("lasagne")], [1])
+        index.add(1, "Waffles")
+        self.assertEqual(index.search("lasagne"), [])
+        self.assertEqual([key for key, _ in index.search("waffle")], [1])
+        index.remove(1)
+        self.assertEqual(index.search("waffle"), [])
+
+    def test_suggest_misspelled_recipe(self):
+        """
+        Tests that a misspelled name suggests the closest recipes first and ignores deleted recipes
+        """
+        self.assertEqual([recipe.name for recipe in suggest(Recipe, "lasagne")], ["Lasagna", "Vegetable Lasagna"])
+        # Saved after the index was built
+        Recipe.objects.create(name="Lasagne")
+        self.assertEqual(suggest(Recipe, "lasagne")[0].name, "Lasagne")
+        Recipe.objects.filter(name="Lasagna").soft_delete()
+        self.assertEqual([recipe.name for recipe in suggest(Recipe, "lasagne")], ["Lasagne", "Vegetable Lasagna"])
+        self.assertEqual(suggest(Recipe, "xyz"), [])
+
+
+class IngredientTokenTest(TestCase):
+    def test_ingredient_tokens(self):
+        """
+        Tests that ingredient names are reduced to the singular words that say what the ingredient is
+        """
+        self.assertEqual(ingredient_tokens("2 large Tomatoes, diced"), ["tomato"])
+        self.assertEqual(ingredient_tokens("Boneless chicken breasts"), ["breast", "chicken"])
+        self.assertEqual(ingredient_tokens("Fresh berries"), ["berry"])
+        self.assertEqual(ingredient_tokens("Salt, to taste"), ["salt"])
+        self.assertEqual(ingredient_tokens("Couscous"), ["couscous"])
+
+
+class SqliteSearchTest(TestCase):
+    def setUp(self):
+        # The FTS5 table of the SQLite fallback as created by 0006_recipe_search
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(recipe_id UNINDEXED, name, ingredients, steps, tokenize='porter unicode61')")
+        self.db.executemany(f"INSERT INTO {FTS_TABLE} VALUES (?, ?, ?, ?)", [
+            ('1', 'Tomato soup', 'Tomatoes', 'Simmer the tomatoes'),
+            ('2', 'Pancakes', 'Flour', 'Serve with stewed tomatoes'),
+            ('3', 'Bruschetta', 'Bread', 'Top the bread with chopped tomato'),
+        ])
+
+    def tearDown(self):
+        self.db.close()
+
+    def search(self, query):
+        match = fts_match(query)
+        if match is None:
+            return []
+        rows = self.db.execute(
+            f"SELECT name FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? ORDER BY bm25({FTS_TABLE}, {FTS_WEIGHTS}), name", [match])
+        return [name for name, in rows]
+
+    def test_websearch_syntax(self):
+        """
+        Tests that the SQLite fallback understands the websearch syntax searchRecipes takes on Postgres
+        """
+        # A match in the name/ingredients ranks above a match in the steps only
+        found = self.search("tomato")
+        self.assertEqual(found[0], 'Tomato soup')
+        self.assertCountEqual(found[1:], ['Bruschetta', 'Pancakes'])
+        self.assertCountEqual(self.search("tomatoes -bread"), ['Tomato soup', 'Pancakes'])
+        self.assertEqual(self.search('-"chopped tomato" tomatoes -flour'), ['Tomato soup'])
+        self.assertCountEqual(self.search("pancakes or bread"), ['Pancakes', 'Bruschetta'])
+        self.assertEqual(self.search("soup or bread chopped -top"), ['Tomato soup'])
+        self.assertEqual(self.search('"stewed tomatoes" -'), ['Pancakes'])
+        self.assertEqual(self.search('tomato "simmer the'), ['Tomato soup'])
+        # Nothing FTS5 could take as syntax
+        self.assertEqual(self.search('or NEAR(tomato) AND "" * ^ -'), [])
+        self.assertEqual(fts_match('bread AND -soup*'), '("bread" AND "AND") NOT ("soup*")')
+        # FTS5 has no standalone NOT
+        self.assertIsNone(fts_match("-bread"))
+
+
+class QuantityTest(TestCase):
+    def test_parse_quantity(self):
+        """
+        Tests that numbers, fractions, mixed numbers and ranges are read and anything else isn't
+        """
+        self.assertEqual(parse_quantity("2"), 2)
+        self.assertEqual(parse_quantity("1.5"), Fraction(3, 2))
+        self.assertEqual(parse_quantity("1 1/2"), Fraction(3, 2))
+        self.assertEqual(parse_quantity("1½"), Fraction(3, 2))
+        self.assertEqual(parse_quantity("2-3"), 3)
+        self.assertIsNone(parse_quantity("a pinch"))
+        self.assertIsNone(parse_quantity("1/0"))
+
+    def test_sum_quantities(self):
+        """
+        Tests that the numbers are summed exactly and the rest is kept once
+        """
+        self.assertEqual(sum_quantities(["1/3", "1/3", "1/3"]), "1")
+        self.assertEqual(sum_quantities(["1", "1/2", "a pinch", "a pinch"]), "1 1/2 + a pinch")
+        self.assertEqual(sum_quantities(["0.1", "0.05"]), "0.15")
+
+
+class IngredientLineTest(TestCase):
+    def test_parse_line(self):
+        """
+        Tests that lines are split into name, quantity and unit, the quantity and unit as written
+        """
+        self.assertEqual(parse_line("2 1/2 cups all-purpose flour, sifted"), ("all-purpose flour, sifted", "2 1/2", "cups"))
+        self.assertEqual(parse_line("1½ tsp  salt"), ("salt", "1½", "tsp"))
+        self.assertEqual(parse_line("200g butter"), ("butter", "200", "g"))
+        self.assertEqual(parse_line("2-3 cloves garlic, minced"), ("garlic, minced", "2-3", "cloves"))
+        self.assertEqual(parse_line("3 fl oz cream"), ("cream", "3", "fl oz"))
+        self.assertEqual(parse_line("1 (14 oz) can diced tomatoes"), ("diced tomatoes (14 oz)", "1", "can"))
+        self.assertEqual(parse_line("a pinch of salt"), ("salt", "1", "pinch"))
+        self.assertEqual(parse_line("2 large eggs"), ("large eggs", "2", ""))
+
+    def test_unreadable_lines_are_names(self):
+        """
+        Tests that a line without a quantity or with nothing after it is all name
+        """
+        self.assertEqual(parse_line("salt and pepper to taste"), ("salt and pepper to taste", "", ""))
+        self.assertEqual(parse_line("a few eggs"), ("a few eggs", "", ""))
+        self.assertEqual(parse_line("2 cups"), ("2 cups", "", ""))
+
+    def test_parsed_amounts(self):
+        """
+        Tests that the quantity and unit of a line are read by parse_amount like typed in ones
+        """
+        name, quantity, unit = parse_line("2 to 3 tbsp. olive oil")
+        self.assertEqual(parse_amount(quantity, unit), (Decimal("3.0000"), "tbsp"))
+
+
+class IngredientAmountTest(TestCase):
+    def test_parse_amount(self):
+        """
+        Tests that quantities are read as decimals and every spelling of a unit gives the same unit
+        """
+        self.assertEqual(parse_amount("1 1/2", "Tablespoons"), (Decimal("1.5"), "tbsp"))
+        self.assertEqual(parse_amount("2", "tbsp."), (Decimal("2"), "tbsp"))
+        self.assertEqual(parse_amount("200g", ""), (Decimal("200"), "g"))
+        self.assertEqual(parse_amount("3", "Cloves"), (Decimal("3"), "clove"))
+        self.assertEqual(parse_amount("a pinch", ""), (None, ""))
+        # Too much for the amount column, whatever the number of digits
+        self.assertEqual(parse_amount("99999999.99995", "g"), (None, "g"))
+        self.assertEqual(parse_amount("1" * 30, "g"), (None, "g"))
+        self.assertEqual(parse_amount("1" * 30 + " cups", ""), (None, "cup"))
+
+    def test_amount_saved_and_summed_in_sql(self):
+        """
+        Tests that saving an ingredient fills its amount and canonical unit
+        and that the amounts can be summed in base units by the database
+        """
+        recipe = Recipe.objects.create(name="Amount Recipe")
+        recipe.recipeingredient_set.create(name="Milk", quantity="1", unit="cup")
+        recipe.recipeingredient_set.create(name="Cream", quantity="100", unit="Milliliters")
+        recipe.recipeingredient_set.create(name="Flour", quantity="1/2", unit="lb")
+        recipe.recipeingredient_set.create(name="Salt", quantity="a pinch", unit="")
+        milk = recipe.recipeingredient_set.get(name="Milk")
+        self.assertEqual((milk.amount, milk.canonical_unit), (Decimal("1"), "cup"))
+        milk.quantity = "2"
+        milk.save()
+        milk.refresh_from_db()
+        self.assertEqual(milk.amount, Decimal("2"))
+
+        totals = {
+            row['base']: row['total']
+            for row in recipe.recipeingredient_set.filter(amount__isnull=False)
+            .values(base=base_unit()).annotate(total=Sum(base_amount()))
+        }
+        self.assertAlmostEqual(totals['ml'], Decimal("573.17648"))
+        self.assertAlmostEqual(totals['g'], Decimal("226.796185"))
+
+    def test_shopping_list_merges_units_of_the_same_dimension(self):
+        """
+        Tests that the generated shopping list adds cups to milliliters (summed by the database) in the first unit it saw
+        """
+        monday = Recipe.objects.create(name="Monday Recipe")
+        monday.recipeingredient_set.create(name="Milk", quantity="1", unit="cup")
+        tuesday = Recipe.objects.create(name="Tuesday Recipe")
+        for name, quantity, unit in [("milk", "118.29412", "ml"), ("Milk", "200", "g"), ("Salt", "a pinch", "")]:
+            tuesday.recipeingredient_set.create(name=name, quantity=quantity, unit=unit)
+        group = Group.objects.create(name="Shopping Group")
+        group.groupmeal_set.create(recipe=tuesday, day="TUE", time="D")
+        group.groupmeal_set.create(recipe=monday, day="MON", time="D")
+        items = generated_shopping_list(group)
+        self.assertCountEqual(
+            [(item.name, item.quantity, item.unit) for item in items],
+            [("Milk", "1 1/2", "cup"), ("Milk", "200", "g"), ("Salt", "a pinch", "")]
+        )
+
+    def test_shopping_list_of_names_without_catalogue_entry(self):
+        """
+        Tests that the rows without a catalogue entry are merged by their normalized name
+        """
+        rows = [
+            (None, "Milk", "1", "cup", "cup", "ml", Decimal("236.58824"), None),
+            (None, "milk", "118.29412", "ml", "ml", "ml", Decimal("118.29412"), None),
+        ]
+        [milk] = build_shopping_list(rows)
+        self.assertEqual((milk.name, milk.quantity, milk.unit), ("Milk", "1 1/2", "cup"))
+
+
+class ScalingTest(TestCase):
+    def test_sensible_unit(self):
+        """
+        Tests that scaled amounts move up and down their unit's ladder but stay in their system
+        """
+        self.assertEqual(sensible_unit(Decimal("48"), "tsp")[1], "cup")
+        self.assertAlmostEqual(sensible_unit(Decimal("48"), "tsp")[0], Decimal("1"), places=3)
+        self.assertEqual(sensible_unit(Decimal("0.0625"), "cup")[1], "tbsp")
+        self.assertEqual(sensible_unit(Decimal("1500"), "g"), (Decimal("1.5"), "kg"))
+        self.assertEqual(sensible_unit(Decimal("3"), "clove"), (Decimal("3"), "clove"))
+
+    def test_scale_ingredients(self):
+        """
+        Tests that the numbers are scaled in a sensible unit and the rest is left as it is
+        """
+        recipe = Recipe.objects.create(name="Scaled Recipe", servings=4)
+        recipe.recipeingredient_set.create(name="Sugar", quantity="2", unit="Tablespoons")
+        recipe.recipeingredient_set.create(name="Flour", quantity="750", unit="g")
+        recipe.recipeingredient_set.create(name="Garlic", quantity="1", unit="clove")
+        recipe.recipeingredient_set.create(name="Salt", quantity="a pinch", unit="")
+        ingredients = list(recipe.recipeingredient_set.order_by('name'))
+
+        factor = scale_factor(recipe, servings=8)
+        self.assertEqual(factor, Decimal("2"))
+        scaled = scale_ingredients(ingredients, factor)
+        self.assertEqual(
+            [(ing.quantity, ing.unit) for ing in scaled],
+            [("1.5", "kg"), ("2", "clove"), ("a pinch", ""), ("1/4", "cup")]
+        )
+        # The ingredients themselves aren't changed
+        self.assertEqual(ingredients[3].quantity, "2")
+        self.assertIsNone(scale_factor(recipe, servings=4))
+        with self.assertRaises(Exception):
+            scale_factor(recipe, servings=8, scale=2)
+        with self.assertRaises(Exception):
+            scale_factor(Recipe(name="No servings"), servings=2)
+
+
+class IngredientCatalogueTest(TestCase):
+    def tearDown(self):
+        clear_cache()
+        super().tearDown()
+
+    def test_same_entry_across_tables(self):
+        """
+        Tests that the spellings of an ingredient in recipes and shopping lists reference one catalogue entry
+        """
+        recipe = Recipe.objects.create(name="Catalogued Recipe")
+        group = Group.objects.create(name="Catalogued Group")
+        diced = recipe.recipeingredient_set.create(name="Tomatoes, diced", quantity="2", unit="")
+        item = group.groupshoppingitem_set.create(name="tomato", quantity="1", unit="")
+        other = recipe.recipeingredient_set.create(name="Basil", quantity="1", unit="bunch")
+
+        self.assertEqual(diced.ingredient_id, item.ingredient_id)
+        self.assertNotEqual(diced.ingredient_id, other.ingredient_id)
+        tomato = Ingredient.objects.get(pk=diced.ingredient_id)
+        self.assertEqual(tomato.name, "tomato")
+        self.assertEqual(tomato.aliases, ["tomatoes, diced", "tomato"])
+
+        item.name = "Basil leaves"
+        item.save()
+        self.assertNotEqual(item.ingredient_id, diced.ingredient_id)
+
+    def test_spellings_cached_once_committed(self):
+        """
+        Tests that an interned spelling doesn't query the catalogue again once its transaction has committed
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient_id = intern_ingredient("Garlic  Cloves")
+        with self.assertNumQueries(0):
+            self.assertEqual(intern_ingredient("garlic cloves"), ingredient_id)
+
+
+class RecipeImportTest(TestCase):
+    def tearDown(self):
+        clear_cache()
+        super().tearDown()
+
+    def test_import_ndjson(self):
+        """
+        Tests that imported recipes get what the signals would give them, and that taken names and URLs are skipped
+        """
+        Recipe.objects.create(name="Existing", url="https://example.com/existing")
+        lines = [
+            '{"name": "Pancakes", "servings": 2, "ingredients": [{"name": "Flour", "quantity": "1", "unit": "cup"}], "steps": ["Mix", "Fry"]}',
+            '',
+            '{"name": "Existing"}',
+            '{"name": "Elsewhere", "url": "https://example.com/existing"}',
+            '{"name": "Pancakes"}',
+            'not json',
+            '{"name": "", "steps": ["Nothing"]}',
+            '{"name": "Toast", "servings": 0}',
+            '{"name": "Crepes", "ingredients": [{"name": "flour", "quantity": "200", "unit": "g"}], "steps": ["Mix", "Fry", "Fold"]}',
+            '{"name": "Feast", "servings": 100000000000000000000}',
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_recipes(read_ndjson(lines), chunk_size=4)
+
+        self.assertEqual((result.created, result.skipped), (2, 3))
+        self.assertEqual(result.errors, [
+            "Line 6: Invalid JSON",
+            "Line 7: A recipe must have a name",
+            "Line 8: A recipe must serve at least 1 person",
+            "Line 10: A recipe can serve at most 1000 people",
+        ])
+        pancakes = Recipe.objects.get(name="Pancakes")
+        crepes = Recipe.objects.get(name="Crepes")
+        self.assertEqual(pancakes.servings, 2)
+        flour = pancakes.recipeingredient_set.get()
+        self.assertEqual((flour.amount, flour.canonical_unit), (Decimal("1"), "cup"))
+        self.assertEqual(flour.ingredient_id, crepes.recipeingredient_set.get().ingredient_id)
+        self.assertEqual([step.step for step in crepes.recipestep_set.all()], ["Mix", "Fry", "Fold"])
+        self.assertEqual([step.order for step in crepes.recipestep_set.all()], [1, 2, 3])
+        self.assertEqual(RecipeRevision.objects.get(recipe=crepes).delta['steps'], [[0, 0, [], ["Mix", "Fry", "Fold"]]])
+        self.assertTrue(pancakes.similar_stale)
+        # Steps can still be added the usual way
+        RecipeStep.objects.create(step="Serve", recipe=crepes)
+        self.assertEqual(crepes.recipestep_set.last().step, "Serve")
+
+    def test_import_csv(self):
+        """
+        Tests that the ingredients and steps of a CSV are read a line per ingredient/step
+        """
+        lines = [
+            'name,photo,url,servings,ingredients,steps\n',
+            'Soup,,https://example.com/soup,4,"1 | l | Stock\n2 | | Carrots","Boil\nServe"\n',
+        ]
+        result = import_recipes(read_csv(lines))
+        self.assertEqual(result.created, 1)
+        soup = Recipe.objects.get(name="Soup")
+        self.assertEqual((soup.url, soup.servings), ("https://example.com/soup", 4))
+        self.assertCountEqual(
+            soup.recipeingredient_set.values_list('name', 'quantity', 'unit'),
+            [("Stock", "1", "l"), ("Carrots", "2", "")]
+        )
+        self.assertEqual([step.step for step in soup.recipestep_set.all()], ["Boil", "Serve"])
+
+    def test_import_ingredient_lines(self):
+        """
+        Tests that ingredients given as free text lines are split into name, quantity and unit
+        """
+        lines = ['{"name": "Omelette", "ingredients": ["3 large eggs", {"name": "Salt", "quantity": "a pinch", "unit": ""}]}']
+        self.assertEqual(import_recipes(read_ndjson(lines)).created, 1)
+        self.assertCountEqual(
+            Recipe.objects.get(name="Omelette").recipeingredient_set.values_list('name', 'quantity', 'unit'),
+            [("large eggs", "3", ""), ("Salt", "a pinch", "")]
+        )
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        recipe_prefixes.invalidate()
+        for name in ["Tomato Soup", "Cherry Tomato Salad", "Tomatillo Salsa", "Pancakes"]:
+            Recipe.objects.create(name=name)
+
+    def test_prefix_index(self):
+        """
+        Tests that names starting with the prefix come first, then names with a later word that does
+        """
+        index = PrefixIndex([(1, "Tomato Soup"), (2, "Cherry Tomato Salad"), (3, "Jalapeño Poppers")])
+        self.assertEqual([key for key, _ in index.search("tom")], [1, 2])
+        self.assertEqual(index.search("  JALAPENO "), [(3, "Jalapeño Poppers")])
+        self.assertEqual(index.search("tom", limit=1), [(1, "Tomato Soup")])
+        self.assertEqual(index.search(""), [])
+        index.add(1, "Onion Soup")
+        self.assertEqual([key for key, _ in index.search("tom")], [2])
+        self.assertEqual([key for key, _ in index.search("soup")], [1])
+        index.remove(2)
+        self.assertEqual(index.search("tom"), [])
+
+    def test_prefix_index_spellings(self):
+        """
+        Tests that an item can be found by other spellings than the text it shows, each item once
+        """
+        index = PrefixIndex([(1, "tomatoes", ["tomatoes", "diced tomatoes"]), (2, "Tomato Soup")])
+        self.assertEqual(index.search("tom"), [(2, "Tomato Soup"), (1, "tomatoes")])
+        self.assertEqual(index.search("dic"), [(1, "tomatoes")])
+        index.add(1, "tinned tomatoes", ["tinned tomatoes"])
+        self.assertEqual(index.search("dic"), [])
+        index.remove(1)
+        self.assertEqual(index.search("tom"), [(2, "Tomato Soup")])
+        self.assertEqual((index.starts, index.words), ([("tomato soup", 2)], [("soup", 2)]))
+
+    def test_ingredient_autocomplete(self):
+        """
+        Tests that catalogue entries are shown as they were written rather than by their key,
+        including the ones created by an import
+        """
+        ingredient_prefixes.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(name="Chicken Recipe")
+            recipe.recipeingredient_set.create(name="Chicken Breasts", quantity="2", unit="")
+        self.assertEqual([completion.name for completion in autocomplete(Ingredient, "chick")], ["chicken breasts"])
+        self.assertEqual([completion.name for completion in autocomplete(Ingredient, "brea")], ["chicken breasts"])
+        with self.captureOnCommitCallbacks(execute=True):
+            import_recipes(read_ndjson(['{"name": "Rice Recipe", "ingredients": ["1 cup basmati rice"]}']))
+        self.assertEqual([completion.name for completion in autocomplete(Ingredient, "basm")], ["basmati rice"])
+
+    def test_autocomplete_follows_committed_changes(self):
+        """
+        Tests that the index is built from the database and kept up to date with what's committed
+        """
+        self.assertEqual([completion.name for completion in autocomplete(Recipe, "toma")], [
+            "Tomatillo Salsa", "Tomato Soup", "Cherry Tomato Salad"
+        ])
+        # Rolled back, so never added
+        Recipe.objects.create(name="Tomato Tart")
+        with self.captureOnCommitCallbacks(execute=True):
+            pie = Recipe.objects.create(name="Tomato Pie")
+        self.assertEqual([completion.name for completion in autocomplete(Recipe, "tomato")], [
+            "Tomato Pie", "Tomato Soup", "Cherry Tomato Salad"
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(id=pie.id).soft_delete()
+            recipes_changed.send(sender=Recipe, recipe_ids=[pie.id])
+        with self.assertNumQueries(0):
+            self.assertEqual([completion.name for completion in autocomplete(Recipe, "tomato")], [
+                "Tomato Soup", "Cherry Tomato Salad"
+            ])
+
+
+class RecipeSimilarityTest(TestCase):
+    def create(self, name, ingredients):
+        recipe = Recipe.objects.create(name=name)
+        for ingredient in ingredients:
+            recipe.recipeingredient_set.create(name=ingredient, quantity="1", unit="")
+        return recipe
+
+    def similar(self, recipe):
+        return [similarity.similar.name for similarity in recipe.similarities.select_related('similar')]
+
+    def test_top_k(self):
+        """
+        Tests that rows are ranked by cosine similarity and the rows whose floor is beaten are reached
+        """
+        # Rows 0 to 3 use the columns {0, 1, 2}, {0, 1, 2, 3}, {1, 3, 4} and {5}
+        matrix = IncidenceMatrix([0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 3], [0, 1, 2, 0, 1, 2, 3, 1, 3, 4, 5], 4, 6)
+        neighbours, reached = matrix.top_k([0, 3], 2, floor=[0.0, 0.9, 0.1, 0.0])
+        self.assertEqual([row for row, _ in neighbours[0]], [1, 2])
+        self.assertAlmostEqual(neighbours[0][0][1], 3 / 12 ** 0.5)
+        self.assertEqual(neighbours[3], [])
+        self.assertEqual(list(reached), [False, False, True, False])
+
+    def test_incremental_refresh(self):
+        """
+        Tests that a refresh only recomputes what changed and keeps the most similar recipes right
+        """
+        pancakes = self.create("Pancakes", ["Flour", "Eggs", "Milk"])
+        crepes = self.create("Crepes", ["Flour", "Egg", "Milk", "Butter"])
+        omelette = self.create("Omelette", ["Eggs", "Butter", "Cheese"])
+        salad = self.create("Salad", ["Lettuce"])
+        self.assertEqual(refresh_similar_recipes(), 4)
+        self.assertEqual(self.similar(pancakes), ["Crepes", "Omelette"])
+        self.assertEqual(self.similar(omelette), ["Crepes", "Pancakes"])
+        self.assertEqual(self.similar(salad), [])
+        self.assertEqual(refresh_similar_recipes(), 0)
+
+        omelette.recipeingredient_set.create(name="Lettuce", quantity="1", unit="leaf")
+        recipes_changed.send(sender=Recipe, recipe_ids=[omelette.id])
+        refresh_similar_recipes()
+        self.assertEqual(self.similar(salad), ["Omelette"])
+
+        Recipe.objects.filter(id=crepes.id).soft_delete()
+        recipes_changed.send(sender=Recipe, recipe_ids=[crepes.id])
+        refresh_similar_recipes()
+        self.assertEqual(self.similar(pancakes), ["Omelette"])
+        self.assertEqual(self.similar(crepes), [])
+
+
+class WeekPlanTest(TestCase):
+    def test_plan_rows(self):
+        """
+        Tests that the slots get the rows that add the fewest columns to the planned ones, each row once
+        """
+        # Rows 0 to 4 use the columns {0, 1}, {0, 1, 2}, {3, 4}, {0} and nothing
+        matrix = IncidenceMatrix([0, 0, 1, 1, 1, 2, 2, 3], [0, 1, 0, 1, 2, 3, 4, 0], 5, 5)
+        self.assertEqual(plan_rows(matrix, range(2), planned=[0]), [3, 1])
+        self.assertEqual(plan_rows(matrix, range(4), planned=[0]), [3, 1, 2, None])
+        self.assertEqual(plan_rows(matrix, range(2), planned=[0], max_repeats=2), [0, 3])
+        self.assertEqual(plan_rows(matrix, range(1), allowed=[True, False, True, False, True]), [0])
+
+    def test_local_search_shortens_the_greedy_plan(self):
+        """
+        Tests that a greedy pick that makes the list longer is replaced
+        """
+        # Row 0 ({0}) is picked first since it adds a single column, then row 1 ({1, 2}) for 3 columns in all,
+        # while rows 1 and 2 (both {1, 2}) only need 2
+        matrix = IncidenceMatrix([0, 1, 1, 2, 2], [0, 1, 2, 1, 2], 3, 3)
+        self.assertEqual(plan_rows(matrix, range(2), budget=0), [0, 1])
+        self.assertEqual(plan_rows(matrix, range(2)), [2, 1])
+
+    def test_recipe_matrix_expires(self):
+        """
+        Tests that the recipe matrix is rebuilt in the background once it's older than its ttl, even if the recipes'
+        generation is the same, the previous one being used until the new one is ready
+        """
+        planner._matrix.clear()
+        with mock.patch('aww.planner.recipe_matrix', wraps=planner.recipe_matrix) as recipe_matrix, \
+                mock.patch('aww.planner._start_rebuild') as start_rebuild, \
+                mock.patch('aww.planner.time.monotonic', return_value=1000):
+            _, _, matrix = planner._recipe_matrix()
+            planner._recipe_matrix()
+            self.assertEqual(recipe_matrix.call_count, 1)
+            self.assertEqual(start_rebuild.call_count, 0)
+        with mock.patch('aww.planner.recipe_matrix', wraps=planner.recipe_matrix) as recipe_matrix, \
+                mock.patch('aww.planner._start_rebuild') as start_rebuild, \
+                mock.patch('aww.planner.time.monotonic', return_value=1001 + planner.RECIPE_MATRIX_TTL):
+            self.assertIs(planner._recipe_matrix()[2], matrix)
+            self.assertIs(planner._recipe_matrix()[2], matrix)
+            self.assertEqual(recipe_matrix.call_count, 0)
+            # A single rebuild at a time
+            start_rebuild.assert_called_once_with(recipes_generation())
+            with mock.patch('aww.planner.connection'):
+                planner._rebuild(recipes_generation())
+            self.assertEqual(recipe_matrix.call_count, 1)
+            self.assertIsNot(planner._recipe_matrix()[2], matrix)
+            self.assertEqual(start_rebuild.call_count, 1)
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("The provider is down")
+
+
+@override_settings(
+    EMAIL_BACKEND='aww.outbox.OutboxBackend',
+    OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class OutboxTest(TestCase):
+    def test_outbox_keeps_the_html(self):
+        """
+        Tests that an email with an html version is sent as it was given
+        """
+        mail.send_mail("Activate", "Plain", "from@test.com", ["to@test.com"], html_message="<p>Html</p>")
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(deliver_outbox(batch_size=1), (1, 0))
+        email = mail.outbox[0]
+        self.assertEqual((email.subject, email.body, email.to), ("Activate", "Plain", ["to@test.com"]))
+        self.assertEqual(email.alternatives, [("<p>Html</p>", "text/html")])
+        # Nothing's due anymore
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+    def test_failed_emails_are_tried_again_later(self):
+        """
+        Tests that a failed email is pushed back further after each attempt, and left alone after the last one
+        """
+        mail.send_mail("Hello", "Body", "from@test.com", ["to@test.com"])
+        delays = []
+        with override_settings(OUTBOX_DELIVERY_BACKEND='aww.tests.FailingBackend'):
+            for _ in range(MAX_ATTEMPTS):
+                self.assertEqual(deliver_outbox(), (0, 1))
+                email = OutgoingEmail.objects.get()
+                delays.append(email.send_after - timezone.now())
+                self.assertEqual(deliver_outbox(), (0, 0))
+                OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(email.last_error, "The provider is down")
+        self.assertTrue(all(earlier < later for earlier, later in zip(delays[:4], delays[1:5])))
+        self.assertIsNotNone(email.failed_at)
+        self.assertEqual(deliver_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(
+    EMAIL_BACKEND='aww.outbox.OutboxBackend',
+    OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class AccountEmailTest(TestCase):
+    def test_compiled_emails_render_like_graphql_auth(self):
+        """
+        Tests that the compiled emails (the text one being compiled from the stripped template) are the ones graphql_auth renders
+        """
+        context = {"token": "a&b<c>", "FRONTEND_DOMAIN": "https://frontend.test", "path": "activate"}
+        for kind in ('ACTIVATION', 'PASSWORD_SET', 'PASSWORD_RESET'):
+            subject, template = getattr(auth_settings, f'EMAIL_SUBJECT_{kind}'), getattr(auth_settings, f'EMAIL_TEMPLATE_{kind}')
+            html = render_to_string(template, context)
+            [rendered] = render_emails(compiled(subject, template), {"path": "activate"}, [context])
+            self.assertIsNotNone(compiled(subject, template).text)
+            self.assertEqual(rendered, (render_to_string(subject, context).replace("\n", " ").strip(), strip_tags(html), html))
+
+    def test_resend_activation_emails(self):
+        """
+        Tests that every unverified user is sent an activation email with their own token, through the outbox
+        """
+        for number in range(3):
+            get_user_model().objects.create_user(username=f"user{number}", email=f"user{number}@test.com", password="testpassword")
+        get_user_model().objects.filter(username="user1").update(email='')
+        UserStatus.objects.filter(user__username="user2").update(verified=True)
+        get_user_model().objects.create_user(username="user3", email="user3@test.com", password="testpassword")
+
+        self.assertEqual(send_activation_emails(unverified_users(), batch_size=1), 2)
+        self.assertEqual(OutgoingEmail.objects.count(), 2)
+        self.assertEqual(deliver_outbox(), (2, 0))
+        for email, username in zip(sorted(mail.outbox, key=lambda email: email.to), ["user0", "user3"]):
+            self.assertEqual(email.to, [f"{username}@test.com"])
+            token = re.search(r"entered on A Week's Worth: (\S+)", email.body).group(1)
+            self.assertEqual(get_token_paylod(token, TokenAction.ACTIVATION), {"username": username})
+            self.assertIn(f"verifyAccount={token}", email.alternatives[0][0])
+
+
+class AccountPurgeTest(TestCase):
+    def user(self, username, days=0, verified=False, **fields):
+        user = get_user_model().objects.create_user(username=username, email=f"{username}@test.com", password="testpassword", **fields)
+        get_user_model().objects.filter(pk=user.pk).update(date_joined=timezone.now() - timedelta(days=days))
+        UserStatus.objects.filter(user=user).update(verified=verified)
+        return user
+
+    def test_purge_refresh_tokens(self):
+        """
+        Tests that the expired and revoked refresh tokens are removed and the ones that can still be used are kept
+        """
+        user = self.user("tokens")
+        RefreshToken = get_refresh_token_model()
+        kept, expired, revoked = [RefreshToken.objects.create(user=user) for _ in range(3)]
+        RefreshToken.objects.filter(pk=expired.pk).update(created=timezone.now() - timedelta(days=15))
+        revoked.revoke()
+        self.assertEqual(purge_refresh_tokens(batch_size=1), (1, 1))
+        self.assertEqual(list(RefreshToken.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_purge_unverified_users(self):
+        """
+        Tests that only the old accounts that were never verified nor used recently are removed, with their individual
+        """
+        stale = self.user("stale", days=31)
+        self.user("recent", days=5)
+        self.user("verified", days=31, verified=True)
+        self.user("staff", days=31, is_staff=True)
+        self.user("logged in", days=31, last_login=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_unverified_users(30, batch_size=1), 1)
+        self.assertCountEqual(
+            get_user_model().objects.values_list('username', flat=True), ["recent", "verified", "staff", "logged in"]
+        )
+        self.assertFalse(Individual.objects.filter(user_id=stale.pk).exists())
+
+    def test_purge_rate_limit_counts(self):
+        """
+        Tests that only the rate limit counts whose window has expired are removed
+        """
+        RateLimitCount.objects.create(key="expired", calls=3, expires_at=timezone.now() - timedelta(seconds=1))
+        RateLimitCount.objects.create(key="current", calls=2, expires_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(purge_rate_limit_counts(batch_size=1), 1)
+        self.assertEqual(list(RateLimitCount.objects.values_list('key', flat=True)), ["current"])
+
+
+class FingerprintSetTest(TestCase):
+    def test_fingerprint_set(self):
+        """
+        Tests that every string that was added is found, before and after the recent ones are merged, and no other is
+        """
+        added = [f"token {number}" for number in range(MERGE_SIZE + 10)]
+        fingerprints = FingerprintSet(added[:5])
+        for text in added[5:]:
+            fingerprints.add(text)
+        fingerprints.add(added[0])
+        self.assertEqual(len(fingerprints), len(added))
+        self.assertTrue(all(text in fingerprints for text in added))
+        self.assertFalse(any(f"other {number}" in fingerprints for number in range(1000)))
+        self.assertLess(fingerprints.nbytes, 10 * len(added) + 1000)
+        self.assertAlmostEqual(fingerprints.false_positive_rate, len(added) / 2 ** 64)
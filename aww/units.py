@@ -0,0 +1,34 @@
+from django.db.models import Case, CharField, DecimalField, F, Value, When
+
+from utils.units import BASE_UNITS, CONVERSIONS
+
+# The unit conversion table of utils/units.py as SQL expressions, so ingredients can be summed,
+# scaled and compared by the database, i.e.
+# RecipeIngredient.objects.values(base=base_unit()).annotate(total=Sum(base_amount()))
+# The generated shopping lists are summed this way (c.f. shopping.py)
+# prefix is the path to the ingredient from the queried model, i.e. 'recipe__recipeingredient__'
+BASE_AMOUNT_FIELD = DecimalField(max_digits=24, decimal_places=8)
+
+
+def base_amount(prefix=''):
+    """The amount in the base unit of its dimension (ml, g), or as it is if its unit can't be converted"""
+    return Case(
+        *[
+            When(**{f'{prefix}canonical_unit': unit}, then=F(f'{prefix}amount') * Value(factor))
+            for unit, (_, factor) in CONVERSIONS.items()
+        ],
+        default=F(f'{prefix}amount'),
+        output_field=BASE_AMOUNT_FIELD
+    )
+
+
+def base_unit(prefix=''):
+    """The base unit base_amount is in"""
+    return Case(
+        *[
+            When(**{f'{prefix}canonical_unit': unit}, then=Value(BASE_UNITS[dimension]))
+            for unit, (dimension, _) in CONVERSIONS.items()
+        ],
+        default=F(f'{prefix}canonical_unit'),
+        output_field=CharField()
+    )
@@ -0,0 +1,29 @@
+from django.db.models import F
+
+# Groups, individuals and recipes are versioned so that two people editing the same
+# shopping list/meals/recipe don't silently overwrite each other. Instead of holding
+# a lock between reading and writing, the client sends back the version it read
+# and the update only goes through if it's still the current one.
+
+
+def bump_version(instance, expected_version=None):
+    """
+    Increments the version of the instance with a single conditional UPDATE
+    (... SET version = version + 1 WHERE id = ? AND version = ?).
+    Returns False without changing anything if expected_version is no longer the current version.
+    The row stays locked until the surrounding transaction ends, so the rest of the update
+    can't interleave with another one. The instance is reloaded once the row is locked:
+    it was read before, so it may predate an update that committed in between.
+    """
+    rows = instance.__class__.objects.filter(pk=instance.pk)
+    if expected_version is not None:
+        rows = rows.filter(version=expected_version)
+    if rows.update(version=F('version') + 1) != 1:
+        return False
+    instance.refresh_from_db()
+    return True
+
+
+def current_version(instance):
+    instance.refresh_from_db(fields=['version'])
+    return instance.version
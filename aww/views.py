@@ -0,0 +1,45 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from graphql_jwt.utils import get_credentials
+
+from .auth import user_for_token
+from .export import export_recipes, export_user, ndjson
+
+# Streamed NDJSON exports (c.f. export.py) for the users that are logged in,
+# authenticated like the GraphQL requests with an "Authorization: JWT <token>" header
+
+
+def _user(request):
+    token = get_credentials(request)
+    if not token:
+        return None
+    return user_for_token(token, request)
+
+
+def _export(request, objects, filename):
+    response = StreamingHttpResponse(ndjson(objects), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _login_required(view):
+    def wrapper(request):
+        user = _user(request)
+        if user is None:
+            return JsonResponse({"errors": [{"message": "You do not have permission to perform this action"}]}, status=401)
+        return view(request, user)
+    return wrapper
+
+
+@require_GET
+@_login_required
+def recipes_export(request, user):
+    """Every recipe with its ingredients and steps"""
+    return _export(request, export_recipes(), 'recipes.ndjson')
+
+
+@require_GET
+@_login_required
+def my_export(request, user):
+    """The meals and shopping list of the user and of the groups they're a member of"""
+    return _export(request, export_user(user), 'me.ndjson')
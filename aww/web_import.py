@@ -0,0 +1,269 @@
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from utils.recipe_pages import extract_recipe
+
+from .importer import clean, import_recipes
+from .models import Recipe
+
+# Imports recipes from the schema.org data of their web pages (c.f. utils/recipe_pages.py).
+# The pages are downloaded on a pool of threads and, as each one arrives, parsed on a pool of processes
+# (the parsing is CPU bound, so threads would wait on each other). What was read from a page is kept
+# on disk by URL with the page's ETag and a hash of the page: importing the page again sends the ETag,
+# and nothing is parsed if the site answers 304 or the page hasn't changed.
+# The fetcher is a function fetch(url, etag) that returns a Page, settings.RECIPE_PAGE_FETCHER being
+# its import path, so tests (or a proxy) can serve the pages from somewhere else.
+# The URLs come from users, so http_fetch only connects to public addresses: the host is resolved and refused
+# if any of its addresses is private, loopback, link-local... (the server's own network, cloud metadata),
+# and redirects are followed one at a time so each Location is checked the same way.
+# Only FetchError messages are shown to the user, other errors could tell what's on the server's network.
+# The parser processes are spawned rather than forked, so they don't inherit the threads/connections
+# of the process, and a pool whose process died is replaced on the next import.
+FETCH_WORKERS = 8
+PARSE_WORKERS = 2
+MAX_URLS = 20
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+FETCH_TIMEOUT = 10
+MAX_REDIRECTS = 5
+
+_parsers = None
+_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """Why a page couldn't be fetched, in words that can be shown to the user"""
+
+
+class Page:
+    def __init__(self, status, text='', etag=None):
+        self.status = status
+        self.text = text
+        self.etag = etag
+
+
+class ImportedPage:
+    """What was read from a page (data, c.f. extract_recipe) and, once it's imported, the Recipe"""
+    def __init__(self, url, data=None, error=None, cached=False):
+        self.url = url
+        self.data = data
+        self.error = error
+        self.cached = cached
+        self.recipe = None
+
+
+def check_public(url):
+    """Raises FetchError unless the URL is http(s) and every address its host resolves to is public"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError("The address is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        raise FetchError("The site could not be found")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if getattr(address, 'ipv4_mapped', None):
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise FetchError("The address is not allowed")
+
+
+def http_fetch(url, etag=None):
+    headers = {'Accept': 'text/html', 'User-Agent': "A Week's Worth recipe importer"}
+    if etag:
+        headers['If-None-Match'] = etag
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public(url)
+        try:
+            response = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT, stream=True, allow_redirects=False)
+        except requests.RequestException:
+            raise FetchError("The site could not be reached")
+        with response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers['Location'])
+                continue
+            if response.status_code == 304:
+                return Page(304, etag=etag)
+            if response.status_code >= 400:
+                raise FetchError(f"The site answered {response.status_code}")
+            try:
+                content = response.raw.read(MAX_PAGE_BYTES + 1, decode_content=True)
+            except Exception:
+                raise FetchError("The page could not be downloaded")
+            if len(content) > MAX_PAGE_BYTES:
+                raise FetchError("The page is too big")
+            # Without a charset, requests assumes ISO-8859-1 for text/html, but JSON-LD is almost always UTF-8
+            encoding = response.encoding if 'charset' in response.headers.get('Content-Type', '') else 'utf-8'
+            return Page(response.status_code, content.decode(encoding, errors='replace'), response.headers.get('ETag'))
+    raise FetchError("The page redirects too many times")
+
+
+class PageCache:
+    """What was read from each page, a JSON file per URL"""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), encoding='utf-8') as entry:
+                return json.load(entry)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written to another file first so a concurrent import never reads half an entry
+        handle, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as temporary:
+            json.dump(entry, temporary)
+        os.replace(path, self._path(url))
+
+
+def _parser_pool():
+    global _parsers
+    with _lock:
+        if _parsers is None:
+            _parsers = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=get_context('spawn'))
+        return _parsers
+
+
+def _discard_parser_pool(pool):
+    """Forgets a pool that broke (one of its processes died) so the next import starts a new one"""
+    global _parsers
+    with _lock:
+        if _parsers is pool:
+            _parsers = None
+    pool.shutdown(wait=False)
+
+
+def _parse(text):
+    """Submits the page to the parser processes, returns (the pool, the future of extract_recipe)"""
+    pool = _parser_pool()
+    try:
+        return pool, pool.submit(extract_recipe, text)
+    except BrokenProcessPool:
+        # Broke since the last import
+        _discard_parser_pool(pool)
+        pool = _parser_pool()
+        return pool, pool.submit(extract_recipe, text)
+
+
+def _fetch(fetcher, cache, url):
+    """Returns the page and, if the page hasn't changed since it was read, its cache entry"""
+    entry = cache.get(url)
+    page = fetcher(url, entry['etag'] if entry else None)
+    if entry is not None and page.status == 304:
+        return page, entry
+    digest = hashlib.sha256(page.text.encode()).hexdigest()
+    if entry is not None and entry['digest'] == digest:
+        return page, entry
+    return page, {'url': url, 'etag': page.etag, 'digest': digest}
+
+
+def read_pages(urls, fetcher=None, cache=None):
+    """Returns {url: ImportedPage} with what was read from each page, nothing is saved"""
+    fetcher = fetcher or import_string(settings.RECIPE_PAGE_FETCHER)
+    cache = cache or PageCache(settings.RECIPE_PAGE_CACHE_DIR)
+    pages, parsing = {}, {}
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls) or 1)) as fetchers:
+        fetches = {fetchers.submit(_fetch, fetcher, cache, url): url for url in urls}
+        for fetch in as_completed(fetches):
+            url = fetches[fetch]
+            try:
+                page, entry = fetch.result()
+            except FetchError as error:
+                pages[url] = ImportedPage(url, error=f"Could not fetch the page: {error}")
+                continue
+            except Exception:
+                pages[url] = ImportedPage(url, error="Could not fetch the page")
+                continue
+            if 'recipe' in entry:
+                pages[url] = ImportedPage(url, data=entry['recipe'], cached=True)
+                continue
+            pool, parse = _parse(page.text)
+            parsing[parse] = (pool, entry)
+    for parse in as_completed(parsing):
+        pool, entry = parsing[parse]
+        try:
+            entry['recipe'] = parse.result()
+        except Exception as error:
+            if isinstance(error, BrokenProcessPool):
+                _discard_parser_pool(pool)
+            pages[entry['url']] = ImportedPage(entry['url'], error="Could not read the page")
+            continue
+        # Pages without a recipe are cached too, so they aren't parsed again either
+        cache.put(entry['url'], entry)
+        pages[entry['url']] = ImportedPage(entry['url'], data=entry['recipe'])
+    return pages
+
+
+def _row(url, data):
+    return {
+        'name': data['name'][:200],
+        'photo': data['photo'] if len(data['photo']) <= 300 else '',
+        'url': url,
+        'servings': data['servings'] or None,
+        # Split into name, quantity and unit by clean (c.f. importer.py)
+        'ingredients': data['ingredients'],
+        'steps': data['steps'],
+    }
+
+
+def import_from_urls(urls, author=None, fetcher=None, cache=None):
+    """
+    Creates the recipes of the pages, returns an ImportedPage per URL with the Recipe
+    (the existing recipe if one already has that URL) or why there isn't one
+    """
+    if len(urls) > MAX_URLS:
+        raise Exception(f"At most {MAX_URLS} URLs can be imported at once")
+    urls = list(dict.fromkeys(url.strip() for url in urls))
+    for url in urls:
+        if not url.startswith(('http://', 'https://')) or len(url) > 200:
+            raise Exception(f"{url} is not a valid URL")
+
+    existing = {recipe.url: recipe for recipe in Recipe.objects.filter(url__in=urls)}
+    pages = read_pages([url for url in urls if url not in existing], fetcher, cache)
+    rows = []
+    for url, page in pages.items():
+        if page.data is None:
+            page.error = page.error or "No recipe found on the page"
+            continue
+        row = _row(url, page.data)
+        try:
+            clean(row)
+        except Exception as error:
+            page.error = str(error)
+            continue
+        rows.append((url, row))
+    import_recipes(rows, author=author)
+
+    created = {recipe.url: recipe for recipe in Recipe.objects.filter(url__in=[url for url, _ in rows])}
+    results = []
+    for url in urls:
+        if url in existing:
+            page = ImportedPage(url, cached=True)
+            page.recipe = existing[url]
+        else:
+            page = pages[url]
+            page.recipe = created.get(url)
+            if page.recipe is None and page.error is None:
+                page.error = "A recipe with that name already exists"
+        results.append(page)
+    return results
@@ -0,0 +1,80 @@
+import argparse
+import os
+import time
+
+import django
+
+# How many activation emails are rendered per second (subject, html and text, what graphql_auth sends),
+# the way graphql_auth renders each one (render_to_string of the templates, then strip_tags of the html),
+# with and without the compiled templates, and the way aww/emails.py renders them in bulk.
+# Nothing is sent and the database isn't used. Run from the repository's folder, with the environment
+# variables of the settings: python -m benchmarks.account_emails [--users 10000]
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.template import Engine  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+from django.utils.html import strip_tags  # noqa: E402
+from graphql_auth.constants import TokenAction  # noqa: E402
+from graphql_auth.settings import graphql_auth_settings as auth_settings  # noqa: E402
+from graphql_auth.utils import get_token  # noqa: E402
+
+from aww.emails import compiled, render_emails  # noqa: E402
+
+SUBJECT = auth_settings.EMAIL_SUBJECT_ACTIVATION_RESEND
+TEMPLATE = auth_settings.EMAIL_TEMPLATE_ACTIVATION_RESEND
+
+
+def recipients(size):
+    User = get_user_model()
+    users = [User(pk=number, username=f"user{number}", email=f"user{number}@example.com") for number in range(size)]
+    return [{"user": user, "token": get_token(user, TokenAction.ACTIVATION)} for user in users]
+
+
+def shared():
+    return {"path": auth_settings.ACTIVATION_PATH_ON_EMAIL, "timestamp": time.time(), **auth_settings.EMAIL_TEMPLATE_VARIABLES}
+
+
+def from_scratch(users):
+    """Each email's templates read and compiled again (the template loader without its cache)"""
+    engine = Engine(dirs=settings.TEMPLATES[0]['DIRS'], loaders=['django.template.loaders.filesystem.Loader'])
+    for variables in users:
+        context = {**shared(), **variables}
+        engine.render_to_string(SUBJECT, context).replace("\n", " ").strip()
+        strip_tags(engine.render_to_string(TEMPLATE, context))
+
+
+def one_at_a_time(users):
+    """graphql_auth's UserStatus.send, with the templates in the cached loader"""
+    for variables in users:
+        context = {**shared(), **variables}
+        render_to_string(SUBJECT, context).replace("\n", " ").strip()
+        strip_tags(render_to_string(TEMPLATE, context))
+
+
+def in_bulk(users):
+    for _ in render_emails(compiled(SUBJECT, TEMPLATE), shared(), users):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times how many activation emails are rendered per second")
+    parser.add_argument('--users', type=int, default=10000, help="Emails per batch")
+    parser.add_argument('--repeat', type=int, default=3, help="Batches timed, the fastest is reported")
+    options = parser.parse_args()
+
+    users = recipients(options.users)
+    for name, render in (("from scratch", from_scratch), ("render_to_string", one_at_a_time), ("compiled, in bulk", in_bulk)):
+        timings = []
+        for _ in range(options.repeat):
+            started = time.perf_counter()
+            render(users)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        print(f"{name:>18}: {options.users} emails in {best * 1000:.0f} ms, {options.users / best:,.0f} emails/s")
+
+
+if __name__ == '__main__':
+    main()
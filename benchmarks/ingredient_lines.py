@@ -0,0 +1,42 @@
+import argparse
+import random
+import time
+
+from utils.ingredient_lines import parse_lines
+
+# How many ingredient lines utils/ingredient_lines.py splits per second, on lines made up like the ones
+# of recipe pages. Run from the repository's folder: python -m benchmarks.ingredient_lines [--lines 10000]
+QUANTITIES = ['1', '2', '1/2', '2 1/2', '1½', '¾', '200', '2-3', '1 to 2', '1.5', 'a', '']
+UNITS = ['cup', 'cups', 'tbsp.', 'teaspoons', 'g', 'kg', 'ml', 'fl oz', 'lb', 'cloves', 'pinch of', 'can', '']
+NAMES = [
+    'all-purpose flour, sifted', 'large eggs', 'unsalted butter, softened', 'garlic, minced', 'olive oil',
+    'salt and pepper to taste', 'whole milk', '(14 oz) diced tomatoes', 'fresh basil leaves', 'brown sugar',
+]
+
+
+def corpus(size, seed=0):
+    generator = random.Random(seed)
+    return [
+        ' '.join(part for part in (generator.choice(QUANTITIES), generator.choice(UNITS), generator.choice(NAMES)) if part)
+        for _ in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times how many ingredient lines are split per second")
+    parser.add_argument('--lines', type=int, default=10000, help="Lines per batch")
+    parser.add_argument('--repeat', type=int, default=5, help="Batches timed, the fastest is reported")
+    options = parser.parse_args()
+
+    lines = corpus(options.lines)
+    timings = []
+    for _ in range(options.repeat):
+        started = time.perf_counter()
+        parse_lines(lines)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{options.lines} lines in {best * 1000:.1f} ms: {options.lines / best:,.0f} lines/s (best of {options.repeat})")
+
+
+if __name__ == '__main__':
+    main()
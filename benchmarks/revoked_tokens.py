@@ -0,0 +1,48 @@
+import argparse
+import binascii
+import os
+import sys
+import time
+
+from utils.fingerprints import FingerprintSet
+
+# Memory and false positive rate of the revoked refresh tokens kept in memory (c.f. aww/refresh_tokens.py),
+# for made up tokens like graphql_jwt's (20 random bytes in hex), next to a Python set of the tokens themselves.
+# The false positives are measured on tokens that weren't revoked, next to the expected rate (n / 2^64).
+# Run from the repository's folder: python -m benchmarks.revoked_tokens [--tokens 1000000]
+
+
+def token():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+def set_bytes(tokens):
+    return sys.getsizeof(tokens) + sum(sys.getsizeof(text) for text in tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and false positive rate of the revoked refresh tokens")
+    parser.add_argument('--tokens', type=int, default=1000000, help="Revoked tokens")
+    parser.add_argument('--lookups', type=int, default=1000000, help="Tokens that weren't revoked looked up")
+    options = parser.parse_args()
+
+    revoked = [token() for _ in range(options.tokens)]
+    started = time.perf_counter()
+    fingerprints = FingerprintSet(revoked)
+    built = time.perf_counter() - started
+
+    others = [token() for _ in range(options.lookups)]
+    started = time.perf_counter()
+    false_positives = sum(text in fingerprints for text in others)
+    lookups = time.perf_counter() - started
+
+    print(f"{options.tokens:,} revoked tokens, built in {built * 1000:.0f} ms")
+    print(f"memory: {fingerprints.nbytes / 2 ** 20:.1f} MiB ({fingerprints.nbytes / options.tokens:.1f} bytes a token), "
+          f"a set of the tokens: {set_bytes(set(revoked)) / 2 ** 20:.1f} MiB")
+    print(f"false positives: {false_positives} of {options.lookups:,} tokens that weren't revoked "
+          f"(expected rate {fingerprints.false_positive_rate:.1e})")
+    print(f"lookups: {options.lookups / lookups:,.0f}/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'corsheaders',
     'graphene_django',
@@ -73,8 +74,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, "templates")],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates are compiled once per process, even in DEBUG (runserver reloads them when they change),
+            # c.f. aww/emails.py
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -106,6 +114,28 @@ if AM_I_RUNNING_ON_MY_HOME_COMPUTER:
 else:
     DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Shared by every process (web and worker) so the recipes' generation and the cached shopping
+# lists/scaled ingredients are the same whichever process answers. It's memcached if MEMCACHED_SERVERS is set
+# (host:port,host:port...), otherwise a table of the database, created by `python manage.py createcachetable`
+# (the release phase of the Procfile). The rate limits count in a table of their own (c.f. schema/rate_limits.py).
+if os.getenv('MEMCACHED_SERVERS'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.getenv('MEMCACHED_SERVERS').split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'aww_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -153,13 +183,33 @@ GRAPHENE = {
     # For your schema object, go to the schema folder, then from the schema.py file
     # take the schema object. It's an instantation of the Schema class
     'SCHEMA': 'schema.schema.schema',
+    # The first one is the last to run, right before the field is resolved
     'MIDDLEWARE': [
+        'schema.rate_limits.RateLimitMiddleware',
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
+        'schema.loaders.LoaderMiddleware',
     ]
 }
 
+# (calls, period in seconds) of each operation by user and/or by IP address (c.f. schema/rate_limits.py)
+RATE_LIMITS = {
+    'register': {'ip': (5, 3600)},
+    'tokenAuth': {'ip': (20, 300)},
+    'resendActivationEmail': {'ip': (5, 3600)},
+    'sendPasswordResetEmail': {'ip': (5, 3600)},
+    'messageMe': {'user': (5, 3600), 'ip': (10, 3600)},
+    'createRecipe': {'user': (30, 60), 'ip': (60, 60)},
+    'updateGroup': {'user': (60, 60)},
+    'importRecipes': {'user': (10, 3600)},
+    'importRecipeFromUrl': {'user': (30, 3600)},
+}
+# How many proxies (that add the address they're called from to X-Forwarded-For) are in front of the app,
+# Heroku's router on Heroku
+RATE_LIMIT_PROXIES = int(os.getenv('RATE_LIMIT_PROXIES', '0' if AM_I_RUNNING_ON_MY_HOME_COMPUTER else '1'))
+
 AUTHENTICATION_BACKENDS = [
-    'graphql_auth.backends.GraphQLAuthBackend',
+    # graphql_auth's backend, authenticating each request once (c.f. aww/auth.py)
+    'aww.auth.JWTBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -177,7 +227,9 @@ GRAPHQL_JWT = {
     'JWT_VERIFY_EXPIRATION': True,
     'JWT_LONG_RUNNING_REFRESH_TOKEN': True,
     'JWT_EXPIRATION_DELTA': timedelta(hours=2),
-    'JWT_REFRESH_EXPIRATION_DELTA': timedelta(days=14)
+    'JWT_REFRESH_EXPIRATION_DELTA': timedelta(days=14),
+    # Refuses the revoked refresh tokens without a query (c.f. aww/refresh_tokens.py)
+    'JWT_GET_REFRESH_TOKEN_HANDLER': 'aww.refresh_tokens.get_refresh_token'
 }
 
 GRAPHQL_AUTH = {
@@ -188,15 +240,18 @@ GRAPHQL_AUTH = {
     }
 }
 
-# Uncomment the following line to not send emails
-# but instead capture their content in the console
-# EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-
-# To see a copy of what the email will look like, uncommen the following two lines:
-# EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
-# EMAIL_FILE_PATH = 'email/'
-
-EMAIL_BACKEND = "sendgrid_backend.SendgridBackend"
+# How importRecipeFromUrl downloads the pages (c.f. aww/web_import.py) and where it keeps what it read from them
+RECIPE_PAGE_FETCHER = 'aww.web_import.http_fetch'
+RECIPE_PAGE_CACHE_DIR = os.getenv('RECIPE_PAGE_CACHE_DIR', os.path.join(BASE_DIR, '.recipe_pages'))
+
+# Emails are put in the outbox and sent by the deliver_outbox worker (c.f. aww/outbox.py)
+# with OUTBOX_DELIVERY_BACKEND. To not send emails but instead capture their content in the console,
+# set EMAIL_DELIVERY_BACKEND to 'django.core.mail.backends.console.EmailBackend'.
+# To see a copy of what the email will look like, set it to 'django.core.mail.backends.filebased.EmailBackend'
+# (the emails are written in EMAIL_FILE_PATH)
+EMAIL_BACKEND = 'aww.outbox.OutboxBackend'
+OUTBOX_DELIVERY_BACKEND = os.getenv('EMAIL_DELIVERY_BACKEND', 'sendgrid_backend.SendgridBackend')
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'email'))
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 SENDGRID_SANDBOX_MODE_IN_DEBUG = False
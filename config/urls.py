@@ -4,9 +4,12 @@ from django.urls import path, include
 from django.conf.urls import url
 from django.views.decorators.csrf import csrf_exempt
 
-from graphene_django.views import GraphQLView
+from aww.views import my_export, recipes_export
+from schema.views import BatchGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    url('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True)))
+    url('graphql/', csrf_exempt(BatchGraphQLView.as_view(graphiql=True))),
+    path('export/recipes.ndjson', recipes_export),
+    path('export/me.ndjson', my_export),
 ]
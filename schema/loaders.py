@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from aww.models import RecipeIngredient, RecipeSimilarity, RecipeStep
+
+# Loaders batch the ingredients/steps/similar recipes of every recipe in a response into one query per relation.
+# They're kept on the request so all the operations of a batch (c.f. views.py) share their cache,
+# and cleared before each mutation so nothing that was cached before the mutation is returned after it.
+
+
+class RecipeIngredientLoader(DataLoader):
+    def batch_load_fn(self, recipe_ids):
+        ingredients = defaultdict(list)
+        for ingredient in RecipeIngredient.objects.filter(recipe_id__in=recipe_ids):
+            ingredients[ingredient.recipe_id].append(ingredient)
+        return Promise.resolve([ingredients[recipe_id] for recipe_id in recipe_ids])
+
+
+class RecipeStepLoader(DataLoader):
+    def batch_load_fn(self, recipe_ids):
+        steps = defaultdict(list)
+        # Sorted by position (c.f. RecipeStep.Meta.ordering)
+        for step in RecipeStep.objects.filter(recipe_id__in=recipe_ids):
+            steps[step.recipe_id].append(step)
+        return Promise.resolve([steps[recipe_id] for recipe_id in recipe_ids])
+
+
+class SimilarRecipeLoader(DataLoader):
+    def batch_load_fn(self, recipe_ids):
+        similar = defaultdict(list)
+        # Most similar first (c.f. RecipeSimilarity.Meta.ordering)
+        for similarity in RecipeSimilarity.objects.filter(
+            recipe_id__in=recipe_ids, similar__deleted_at__isnull=True
+        ).select_related('similar'):
+            similar[similarity.recipe_id].append(similarity.similar)
+        return Promise.resolve([similar[recipe_id] for recipe_id in recipe_ids])
+
+
+class Loaders:
+    def __init__(self):
+        self.recipe_ingredients = RecipeIngredientLoader()
+        self.recipe_steps = RecipeStepLoader()
+        self.similar_recipes = SimilarRecipeLoader()
+
+
+def get_loaders(info):
+    context = info.context
+    if getattr(context, 'loaders', None) is None:
+        context.loaders = Loaders()
+    return context.loaders
+
+
+def clear_loaders(context):
+    context.loaders = None
+
+
+class LoaderMiddleware:
+    """Graphene middleware that clears the request's loaders before each mutation field is resolved"""
+    def resolve(self, next, root, info, **kwargs):
+        if info.parent_type is info.schema.get_mutation_type():
+            clear_loaders(info.context)
+        return next(root, info, **kwargs)
@@ -1,6 +1,5 @@
-import copy
-
 import graphene
+from django.db import transaction
 from graphql_jwt.decorators import login_required
 
 from utils.comparison import compare_as_key
@@ -12,8 +11,10 @@ from aww.models import (
     Group,
     Recipe
 )
+from aww.versioning import bump_version, current_version
 from ..types import (
     GroupType,
+    VersionConflictType,
     IndividualType,
     IngredientInputType,
     MealInputType
@@ -43,66 +44,78 @@ class CreateGroup(graphene.Mutation):
 
 
 class UpdateGroup(graphene.Mutation):
+    """
+    Update the group's name, shopping list and/or meals.
+    If expectedVersion is provided and someone else has updated the group since that version,
+    nothing is changed and a conflict is returned instead.
+    """
     class Arguments:
         id = graphene.ID(required=True)
         name = graphene.String(required=False)
         shopping_list = graphene.List(IngredientInputType, required=False)
         meals = graphene.List(MealInputType, required=False)
+        expected_version = graphene.Int(required=False)
 
     group = graphene.Field(GroupType)
+    conflict = graphene.Field(VersionConflictType)
 
     @classmethod
     @login_required
-    def mutate(cls, root, info, id, name="", shopping_list=None, meals=None):
+    def mutate(cls, root, info, id, name="", shopping_list=None, meals=None, expected_version=None):
         try:
             group = Group.objects.get(id=id)
         except:
             raise Exception("No group found corresponding to that ID")
         if info.context.user not in [member.user for member in group.members.all()]:
             raise Exception("Only a member of a group can update the group")
-        if name:
-            group.name = name
-            group.save()
-
-        if shopping_list is not None:
-            queryset = GroupShoppingItem.objects.filter(group=group)
-            for item in queryset:
-                item.delete()
-            for item in shopping_list:
-                group.groupshoppingitem_set.create(
-                    name=item.name, quantity=item.quantity, unit=item.unit)
-        if meals is not None:
-            queryset = GroupMeal.objects.filter(group=group)
-            for meal in queryset:
-                meal.delete()
-            meals.sort(key=compare_as_key)
-            for meal in meals:
-                # If there's a recipe and some text (note)
-                if meal.recipeId and meal.text:
-                    try:
-                        # Try to get the recipe, put it in
-                        _recipe = Recipe.objects.get(id=meal.recipeId)
-                        group.groupmeal_set.create(
-                            recipe=_recipe, text=meal.text, day=meal.day, time=meal.time)
-                    except:
-                        # If we fail: make it without the recipe
+        with transaction.atomic():
+            if not bump_version(group, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(group))
+                return UpdateGroup(group=group, conflict=conflict)
+            if name:
+                group.name = name
+                group.save()
+
+            if shopping_list is not None:
+                queryset = GroupShoppingItem.objects.filter(group=group)
+                for item in queryset:
+                    item.delete()
+                for item in shopping_list:
+                    group.groupshoppingitem_set.create(
+                        name=item.name, quantity=item.quantity, unit=item.unit)
+            if meals is not None:
+                queryset = GroupMeal.objects.filter(group=group)
+                for meal in queryset:
+                    meal.delete()
+                meals.sort(key=compare_as_key)
+                for meal in meals:
+                    # If there's a recipe and some text (note)
+                    if meal.recipeId and meal.text:
+                        try:
+                            # Try to get the recipe, put it in
+                            _recipe = Recipe.objects.get(id=meal.recipeId)
+                            group.groupmeal_set.create(
+                                recipe=_recipe, text=meal.text, day=meal.day, time=meal.time)
+                        except:
+                            # If we fail: make it without the recipe
+                            group.groupmeal_set.create(
+                                text=meal.text, day=meal.day, time=meal.time)
+                    # If there's a recipe but no text (note)
+                    elif meal.recipeId and not meal.text:
+                        try:
+                            # Idem
+                            _recipe = Recipe.objects.get(id=meal.recipeId)
+                            group.groupmeal_set.create(
+                                recipe=_recipe, day=meal.day, time=meal.time)
+                        except:
+                            # If there's no recipe and no text, then this isn't a meal
+                            continue
+                    # If there's a text/note but there's no recipe
+                    elif not meal.recipeId and meal.text:
                         group.groupmeal_set.create(
                             text=meal.text, day=meal.day, time=meal.time)
-                # If there's a recipe but no text (note)
-                elif meal.recipeId and not meal.text:
-                    try:
-                        # Idem
-                        _recipe = Recipe.objects.get(id=meal.recipeId)
-                        group.groupmeal_set.create(
-                            recipe=_recipe, day=meal.day, time=meal.time)
-                    except:
-                        # If there's no recipe and no text, then this isn't a meal
-                        continue
-                # If there's a text/note but there's no recipe
-                elif not meal.recipeId and meal.text:
-                    group.groupmeal_set.create(
-                        text=meal.text, day=meal.day, time=meal.time)
-                # If there's no recipe and no text, then this isn't a meal
+                    # If there's no recipe and no text, then this isn't a meal
         return UpdateGroup(group=group)
 
 
@@ -125,14 +138,10 @@ class DeleteGroup(graphene.Mutation):
             raise Exception("No group found by that ID")
         if info.context.user not in [member.user for member in group.members.all()]:
             raise Exception("Only a member of a group can update the group")
-        # Make sure all the users still in the group remove it
-        if group.members:
-            for member in group.members.all():
-                member.groups.remove(group)
-                member.save()
-        _group = copy.copy(group)
-        group.delete()
-        return DeleteGroup(group=_group)
+        # Deleted groups are hidden from the members' groups by the default manager
+        # The memberships, meals and shopping list are removed by the purge_deleted command
+        Group.objects.filter(id=group.id).soft_delete()
+        return DeleteGroup(group=group)
 
 class Mutation(graphene.ObjectType):
     update_group = UpdateGroup.Field()
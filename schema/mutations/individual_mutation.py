@@ -1,4 +1,5 @@
 import graphene
+from django.db import transaction
 from graphql_jwt.decorators import login_required
 
 from utils.comparison import compare_as_key
@@ -10,10 +11,12 @@ from aww.models import (
     Individual,
     Recipe
 )
+from aww.versioning import bump_version, current_version
 
 from ..types import (
     GroupType,
     IndividualType,
+    VersionConflictType,
     IngredientInputType,
     RecipeStepInputType,
     MealInputType
@@ -24,53 +27,62 @@ class UpdateIndividual(graphene.Mutation):
     """
     Update the individual with a new shopping list and/or meals.
     This mutation will delete all current shopping list items or meals if either of those values are provided.
+    If expectedVersion is provided and the individual has been updated since that version,
+    nothing is changed and a conflict is returned instead.
     """
     class Arguments:
         shopping_list = graphene.List(IngredientInputType, required=False)
         meals = graphene.List(MealInputType, required=False)
+        expected_version = graphene.Int(required=False)
 
     individual = graphene.Field(IndividualType)
+    conflict = graphene.Field(VersionConflictType)
 
     @classmethod
     @login_required
-    def mutate(cls, root, info, shopping_list=None, meals=None):
+    def mutate(cls, root, info, shopping_list=None, meals=None, expected_version=None):
         individual = info.context.user.individual
-        if shopping_list is not None:
-            queryset = IndividualShoppingItem.objects.filter(
-                individual=individual)
-            for item in queryset:
-                item.delete()
-            for item in shopping_list:
-                individual.individualshoppingitem_set.create(
-                    name=item.name, quantity=item.quantity, unit=item.unit)
-        if meals is not None:
-            queryset = IndividualMeal.objects.filter(individual=individual)
-            for meal in queryset:
-                meal.delete()
-            meals.sort(key=compare_as_key)
-            for meal in meals:
-                if meal.recipeId and meal.text:
-                    try:
-                        # Try to get the recipe, put it in
-                        _recipe = Recipe.objects.get(id=meal.recipeId)
-                        individual.individualmeal_set.create(
-                            recipe=_recipe, text=meal.text, day=meal.day, time=meal.time)
-                    except:
-                        # If we fail: make it without the recipe
+        with transaction.atomic():
+            if not bump_version(individual, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(individual))
+                return UpdateIndividual(individual=individual, conflict=conflict)
+            if shopping_list is not None:
+                queryset = IndividualShoppingItem.objects.filter(
+                    individual=individual)
+                for item in queryset:
+                    item.delete()
+                for item in shopping_list:
+                    individual.individualshoppingitem_set.create(
+                        name=item.name, quantity=item.quantity, unit=item.unit)
+            if meals is not None:
+                queryset = IndividualMeal.objects.filter(individual=individual)
+                for meal in queryset:
+                    meal.delete()
+                meals.sort(key=compare_as_key)
+                for meal in meals:
+                    if meal.recipeId and meal.text:
+                        try:
+                            # Try to get the recipe, put it in
+                            _recipe = Recipe.objects.get(id=meal.recipeId)
+                            individual.individualmeal_set.create(
+                                recipe=_recipe, text=meal.text, day=meal.day, time=meal.time)
+                        except:
+                            # If we fail: make it without the recipe
+                            individual.individualmeal_set.create(
+                                text=meal.text, day=meal.day, time=meal.time)
+                    elif meal.recipeId and not meal.text:
+                        try:
+                            # Idem
+                            _recipe = Recipe.objects.get(id=meal.recipeId)
+                            individual.individualmeal_set.create(
+                                recipe=_recipe, day=meal.day, time=meal.time)
+                        except:
+                            # If there's no recipe and no text, then this isn't a meal
+                            continue
+                    elif not meal.recipeId and meal.text:
                         individual.individualmeal_set.create(
                             text=meal.text, day=meal.day, time=meal.time)
-                elif meal.recipeId and not meal.text:
-                    try:
-                        # Idem
-                        _recipe = Recipe.objects.get(id=meal.recipeId)
-                        individual.individualmeal_set.create(
-                            recipe=_recipe, day=meal.day, time=meal.time)
-                    except:
-                        # If there's no recipe and no text, then this isn't a meal
-                        continue
-                elif not meal.recipeId and meal.text:
-                    individual.individualmeal_set.create(
-                        text=meal.text, day=meal.day, time=meal.time)
         return UpdateIndividual(individual=individual)
 
 class RequestAccess(graphene.Mutation):
@@ -195,7 +207,7 @@ class LeaveGroup(graphene.Mutation):
 
         # If a group has lost its last member, delete it
         if len(group.members.all()) == 1:
-            group.delete()
+            Group.objects.filter(id=group.id).soft_delete()
         else:
         # Otherwise just remove that individual from its members
             group.members.remove(individual)
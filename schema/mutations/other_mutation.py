@@ -13,6 +13,7 @@ class MessageMe(graphene.Mutation):
     @classmethod
     @login_required
     def mutate(cls, root, info, message):
+        # Only put in the outbox, the deliver_outbox worker sends it (c.f. aww/outbox.py)
         emails_sent = send_mail(
             f'{info.context.user.email} has sent you a message from A Week\'s Worth',
             message,
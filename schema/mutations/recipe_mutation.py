@@ -1,20 +1,37 @@
-import copy
-
 import graphene
-from graphql_jwt.decorators import login_required
+from django.db import transaction
+from django.db.models import Max
+from graphql_jwt.decorators import login_required, superuser_required
 
+from aww.importer import import_recipes, read_csv, read_ndjson
 from aww.models import (
-    RecipeIngredient,
     RecipeStep,
     Recipe
 )
+from aww.revisions import (
+    EMPTY_STATE,
+    snapshot,
+    record_revision,
+    state_at,
+    write_ingredients,
+    write_steps,
+    write_state
+)
+from aww.signals import recipes_changed
+from aww.web_import import import_from_urls
+from aww.versioning import bump_version, current_version
+from aww.step_positions import position_for, reorder
 
 from ..types import (
     GroupType,
+    ImportFormat,
     IndividualType,
     RecipeType,
+    RecipeStepType,
+    VersionConflictType,
     IngredientInputType,
     RecipeStepInputType,
+    UrlImportType,
     MealInputType
 )
 
@@ -25,6 +42,7 @@ class CreateRecipe(graphene.Mutation):
         photo = graphene.String(required=False)
         # URL can only be set on creation, never updated
         url = graphene.String(required=False)
+        servings = graphene.Int(required=False)
         ingredients = graphene.List(IngredientInputType, required=False)
         steps = graphene.List(RecipeStepInputType, required=False)
 
@@ -32,58 +50,71 @@ class CreateRecipe(graphene.Mutation):
 
     @classmethod
     @login_required
-    def mutate(cls, root, info, name, photo="", url="", ingredients=[], steps = []):
+    def mutate(cls, root, info, name, photo="", url="", servings=None, ingredients=[], steps = []):
         if len(ingredients) > 150:
             raise Exception("A recipe may only have 150 ingredients")
         if len(steps) > 200:
             raise Exception("A recipe may only have 200 steps")
+        if servings is not None and servings < 1:
+            raise Exception("A recipe must serve at least 1 person")
 
-        recipe = Recipe(name=name)
-        if photo:
-            recipe.photo = photo
-        if url:
-            # If the URL isn't unique, an error will be raised by Django
-            recipe.url = url
-        recipe.save()
-
-        if ingredients:
-            for i in ingredients:
-                recipe.recipeingredient_set.create(
-                    name=i.name,
-                    quantity=i.quantity,
-                    unit=i.unit
-                )
-        if steps:
-            for step in steps:
-                if step.order:
-                    recipe.recipestep_set.create(
-                        step=step.step,
-                        order=step.order
-                    )
-                else:
-                    recipe.recipestep_set.create(
-                        step=step.step
+        with transaction.atomic():
+            recipe = Recipe(name=name)
+            if photo:
+                recipe.photo = photo
+            if url:
+                # If the URL isn't unique, an error will be raised by Django
+                recipe.url = url
+            if servings:
+                recipe.servings = servings
+            recipe.save()
+
+            if ingredients:
+                for i in ingredients:
+                    recipe.recipeingredient_set.create(
+                        name=i.name,
+                        quantity=i.quantity,
+                        unit=i.unit
                     )
+            if steps:
+                for step in steps:
+                    if step.order:
+                        recipe.recipestep_set.create(
+                            step=step.step,
+                            order=step.order
+                        )
+                    else:
+                        recipe.recipestep_set.create(
+                            step=step.step
+                        )
+            record_revision(recipe, EMPTY_STATE, info.context.user)
+            recipes_changed.send(sender=Recipe, recipe_ids=[recipe.id])
         return CreateRecipe(recipe=recipe)
 
 
 class UpdateRecipe(graphene.Mutation):
     """
     Update a recipe with a new name/photo/ingredients/steps.
-    This mutation will delete all current ingredients and steps if either of those values are provided.
+    This mutation will replace all current ingredients and steps if either of those values are provided.
+    Every change is recorded as a revision (c.f. recipeHistory and revertRecipe).
+    If expectedVersion is provided and the recipe has been updated since that version,
+    nothing is changed and a conflict is returned instead.
     """
     class Arguments:
         id = graphene.ID()
         name = graphene.String(required=False)
         photo = graphene.String(required=False)
+        servings = graphene.Int(required=False)
         ingredients = graphene.List(IngredientInputType, required=False)
         steps = graphene.List(RecipeStepInputType, required=False)
+        expected_version = graphene.Int(required=False)
 
     recipe = graphene.Field(RecipeType)
+    conflict = graphene.Field(VersionConflictType)
 
     @classmethod
     @login_required
-    def mutate(cls, root, info, id, name="", photo="", ingredients=[], steps=[]):
+    def mutate(cls, root, info, id, name="", photo="", servings=None, ingredients=[], steps=[], expected_version=None):
         # We have to update by ID because the name may change
         try:
             recipe = Recipe.objects.get(id=id)
@@ -96,43 +127,49 @@ class UpdateRecipe(graphene.Mutation):
         if steps and len(steps) > 200:
             raise Exception("A recipe may only have 200 ingredients")
 
-        if name:
-            recipe.name = name
-        if photo:
-            recipe.photo = photo
+        if servings is not None and servings < 1:
+            raise Exception("A recipe must serve at least 1 person")
 
-        if name or photo:
-            recipe.save()
-        # We just delete all the past ingredients and make new ones
-        # We could make it more efficient by checking which have changed,
-        # deleting all the excess ones, making a special case for no ingredients
-        # ([] versus ommiting ingredients) and bulk updating
-        # which would make this more efficient - I constructed it
-        # and this is much simpler and more legible.
-        # I prefer this because it is much simpler despite its obvious ineffeciency
-        if ingredients:
-            queryset = RecipeIngredient.objects.filter(recipe=recipe)
-            for ing in queryset:
-                ing.delete()
-            for ing in ingredients:
-                recipe.recipeingredient_set.create(
-                    name=ing.name, quantity=ing.quantity, unit=ing.unit)
-
-        # Process is more or less the same for ingredients
-        if steps:
-            queryset = RecipeStep.objects.filter(recipe=recipe)
-            for step in queryset:
-                step.delete()
-            for step in steps:
-                if step.order:
-                    recipe.recipestep_set.create(
-                        step=step.step,
-                        order=step.order
-                    )
+        with transaction.atomic():
+            # Bumping the version also locks the row, so concurrent edits are recorded as consecutive revisions
+            if not bump_version(recipe, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(recipe))
+                return UpdateRecipe(recipe=recipe, conflict=conflict)
+            before = snapshot(recipe)
+
+            if name:
+                recipe.name = name
+            if photo:
+                recipe.photo = photo
+            if servings:
+                recipe.servings = servings
+
+            if name or photo or servings:
+                recipe.save()
+            # Only the ingredients that aren't in the new list are deleted
+            # and only the ones that weren't there before are created
+            if ingredients:
+                write_ingredients(recipe, [[ing.name, ing.quantity, ing.unit] for ing in ingredients])
+
+            if steps:
+                # Without explicit orders, the steps are only rewritten if they changed
+                if not any(step.order for step in steps):
+                    write_steps(recipe, [step.step for step in steps])
                 else:
-                    recipe.recipestep_set.create(
-                        step=step.step
-                    )
+                    RecipeStep.objects.filter(recipe=recipe).delete()
+                    for step in steps:
+                        if step.order:
+                            recipe.recipestep_set.create(
+                                step=step.step,
+                                order=step.order
+                            )
+                        else:
+                            recipe.recipestep_set.create(
+                                step=step.step
+                            )
+            record_revision(recipe, before, info.context.user)
+            recipes_changed.send(sender=Recipe, recipe_ids=[recipe.id])
 
         return UpdateRecipe(recipe=recipe)
 
@@ -157,13 +194,228 @@ class DeleteRecipe(graphene.Mutation):
                 recipe = Recipe.objects.get(id=id)
             if name:
                 recipe = Recipe.objects.get(name=name)
-            _recipe = copy.deepcopy(recipe)
-            recipe.delete()
-            return DeleteRecipe(recipe=_recipe)
         except:
             raise Exception("No recipe found with that ID or name")
+        # The recipe is only marked as deleted, its ingredients and steps
+        # are still there to be returned until the purge_deleted command runs
+        Recipe.objects.filter(id=recipe.id).soft_delete()
+        recipes_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+        return DeleteRecipe(recipe=recipe)
+
+class RevertRecipe(graphene.Mutation):
+    """
+    Revert a recipe to how it was right after one of its revisions.
+    The revert itself is recorded as a new revision so no history is lost.
+    """
+    class Arguments:
+        id = graphene.ID(required=True)
+        revision = graphene.Int(required=True)
+        expected_version = graphene.Int(required=False)
+
+    recipe = graphene.Field(RecipeType)
+    conflict = graphene.Field(VersionConflictType)
+
+    @classmethod
+    @login_required
+    def mutate(cls, root, info, id, revision, expected_version=None):
+        try:
+            recipe = Recipe.objects.get(id=id)
+        except:
+            raise Exception("No recipe found by that ID")
+        with transaction.atomic():
+            if not bump_version(recipe, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(recipe))
+                return RevertRecipe(recipe=recipe, conflict=conflict)
+            before = snapshot(recipe)
+            write_state(recipe, state_at(recipe, revision))
+            record_revision(recipe, before, info.context.user)
+            recipes_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+        return RevertRecipe(recipe=recipe)
+
+def get_step(recipe, id):
+    if not id:
+        return None
+    try:
+        return recipe.recipestep_set.get(id=id)
+    except:
+        raise Exception("No step found by that ID for this recipe")
+
+
+class InsertRecipeStep(graphene.Mutation):
+    """
+    Insert a step right after the step with the ID after, right before the step with the ID before
+    or at the end of the recipe if neither is provided.
+    Only the new step is written, the other steps are left as they are.
+    """
+    class Arguments:
+        recipe_id = graphene.ID(required=True)
+        step = graphene.String(required=True)
+        after = graphene.ID(required=False)
+        before = graphene.ID(required=False)
+        expected_version = graphene.Int(required=False)
+
+    recipe = graphene.Field(RecipeType)
+    step = graphene.Field(RecipeStepType)
+    conflict = graphene.Field(VersionConflictType)
+
+    @classmethod
+    @login_required
+    def mutate(cls, root, info, recipe_id, step, after=None, before=None, expected_version=None):
+        if after and before:
+            raise Exception("Both after and before cannot be provided")
+        try:
+            recipe = Recipe.objects.get(id=recipe_id)
+        except:
+            raise Exception("No recipe found by that ID")
+        with transaction.atomic():
+            # Bumping the version locks the recipe, so two inserts can't get the same position
+            if not bump_version(recipe, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(recipe))
+                return InsertRecipeStep(recipe=recipe, conflict=conflict)
+            if recipe.recipestep_set.count() >= 200:
+                raise Exception("A recipe may only have 200 steps")
+            before_snapshot = snapshot(recipe)
+            position = position_for(recipe, after=get_step(recipe, after), before=get_step(recipe, before))
+            # The order only has to be unique, the position decides where the step goes
+            last_order = recipe.recipestep_set.aggregate(last=Max('order'))['last'] or 0
+            new_step = recipe.recipestep_set.create(step=step, order=last_order + 1, position=position)
+            record_revision(recipe, before_snapshot, info.context.user)
+            recipes_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+        return InsertRecipeStep(recipe=recipe, step=new_step)
+
+
+class MoveRecipeStep(graphene.Mutation):
+    """
+    Move a step right after the step with the ID after, right before the step with the ID before
+    or to the end of the recipe if neither is provided. Only the moved step is written.
+    """
+    class Arguments:
+        id = graphene.ID(required=True)
+        after = graphene.ID(required=False)
+        before = graphene.ID(required=False)
+        expected_version = graphene.Int(required=False)
+
+    recipe = graphene.Field(RecipeType)
+    step = graphene.Field(RecipeStepType)
+    conflict = graphene.Field(VersionConflictType)
+
+    @classmethod
+    @login_required
+    def mutate(cls, root, info, id, after=None, before=None, expected_version=None):
+        if after and before:
+            raise Exception("Both after and before cannot be provided")
+        try:
+            step = RecipeStep.objects.get(id=id)
+            recipe = Recipe.objects.get(id=step.recipe_id)
+        except:
+            raise Exception("No step found by that ID")
+        if id in (after, before):
+            raise Exception("A step cannot be moved next to itself")
+        with transaction.atomic():
+            if not bump_version(recipe, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(recipe))
+                return MoveRecipeStep(recipe=recipe, step=step, conflict=conflict)
+            before_snapshot = snapshot(recipe)
+            step.position = position_for(
+                recipe,
+                after=get_step(recipe, after),
+                before=get_step(recipe, before),
+                exclude=step
+            )
+            step.save(update_fields=['position'])
+            record_revision(recipe, before_snapshot, info.context.user)
+        return MoveRecipeStep(recipe=recipe, step=step)
+
+
+class ReorderRecipeSteps(graphene.Mutation):
+    """
+    Put all the steps of a recipe in the order of stepIds.
+    Steps that are already in the right order relative to each other aren't written,
+    so moving a single step only writes that step.
+    """
+    class Arguments:
+        recipe_id = graphene.ID(required=True)
+        step_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+        expected_version = graphene.Int(required=False)
+
+    recipe = graphene.Field(RecipeType)
+    conflict = graphene.Field(VersionConflictType)
+
+    @classmethod
+    @login_required
+    def mutate(cls, root, info, recipe_id, step_ids, expected_version=None):
+        try:
+            recipe = Recipe.objects.get(id=recipe_id)
+        except:
+            raise Exception("No recipe found by that ID")
+        with transaction.atomic():
+            if not bump_version(recipe, expected_version):
+                conflict = VersionConflictType(
+                    expected_version=expected_version, current_version=current_version(recipe))
+                return ReorderRecipeSteps(recipe=recipe, conflict=conflict)
+            steps = {str(step.id): step for step in recipe.recipestep_set.all()}
+            if len(step_ids) != len(steps) or set(step_ids) != set(steps):
+                raise Exception("stepIds must contain every step of the recipe exactly once")
+            before_snapshot = snapshot(recipe)
+            reorder(recipe, [steps[step_id] for step_id in step_ids])
+            record_revision(recipe, before_snapshot, info.context.user)
+        return ReorderRecipeSteps(recipe=recipe)
+
+class ImportRecipes(graphene.Mutation):
+    """
+    Create recipes from NDJSON (a recipe per line, as exported by /export/recipes.ndjson) or CSV, superusers only.
+    The recipes whose name or URL is already taken are skipped and the invalid ones are returned as errors,
+    the others are created in chunks (c.f. importer.py).
+    """
+    class Arguments:
+        data = graphene.String(required=True)
+        format = ImportFormat(required=False)
+
+    created = graphene.Int()
+    skipped = graphene.Int()
+    errors = graphene.List(graphene.String)
+    recipes_per_second = graphene.Float()
+
+    @classmethod
+    @superuser_required
+    def mutate(cls, root, info, data, format=ImportFormat.NDJSON.value):
+        lines = data.splitlines(keepends=True)
+        rows = read_csv(lines) if format == ImportFormat.CSV.value else read_ndjson(lines)
+        result = import_recipes(rows, author=info.context.user)
+        return ImportRecipes(
+            created=result.created,
+            skipped=result.skipped,
+            errors=result.errors,
+            recipes_per_second=result.recipes_per_second
+        )
+
+
+class ImportRecipeFromUrl(graphene.Mutation):
+    """
+    Create recipes from the schema.org data of their web pages (at most 20 at once).
+    The ingredient lines of the page are split into name, quantity and unit.
+    """
+    class Arguments:
+        urls = graphene.List(graphene.NonNull(graphene.String), required=True)
+
+    results = graphene.List(UrlImportType)
+
+    @classmethod
+    @login_required
+    def mutate(cls, root, info, urls):
+        return ImportRecipeFromUrl(results=import_from_urls(urls, author=info.context.user))
+
 
 class Mutation(graphene.ObjectType):
     create_recipe = CreateRecipe.Field()
     update_recipe = UpdateRecipe.Field()
-    delete_recipe = DeleteRecipe.Field()
\ No newline at end of file
+    delete_recipe = DeleteRecipe.Field()
+    revert_recipe = RevertRecipe.Field()
+    insert_recipe_step = InsertRecipeStep.Field()
+    move_recipe_step = MoveRecipeStep.Field()
+    reorder_recipe_steps = ReorderRecipeSteps.Field()
+    import_recipes = ImportRecipes.Field()
+    import_recipe_from_url = ImportRecipeFromUrl.Field()
\ No newline at end of file
@@ -2,12 +2,24 @@ import graphene
 from graphene_django import DjangoListField
 from graphql_jwt.decorators import login_required, superuser_required
 
-from aww.models import Individual, Group, Recipe
+from aww.models import Individual, Group, Ingredient, Recipe, RecipeRevision
+from aww.ingredient_index import recipes_by_ingredients
+from aww.planner import suggest_week_plan
+from aww.search import search_recipes
+from aww.suggestions import autocomplete, suggest
+from utils.ingredient_lines import parse_line
 
 from .types import (
     RecipeStepType,
     RecipeIngredientType,
     RecipeType,
+    RecipeRevisionType,
+    RecipeMatchType,
+    CompletionType,
+    AutocompleteKind,
+    ParsedIngredientType,
+    PlannedMealType,
+    WeekPlanConstraintsInputType,
     GroupShoppingItemType,
     GroupMealType,
     GroupType,
@@ -38,6 +50,136 @@ class Query(graphene.ObjectType):
         except:
             raise Exception("No recipe found by that id or name")
     
+    recipe_history = graphene.List(
+        RecipeRevisionType,
+        id=graphene.ID(required=True),
+        first=graphene.Int(required=False),
+        after=graphene.Int(required=False)
+    )
+
+    # Newest revisions first, after is the revision number of the last revision of the previous page
+    def resolve_recipe_history(root, info, id, first=20, after=None):
+        if first < 1 or first > 100:
+            raise Exception("First must be between 1 and 100")
+        try:
+            recipe = Recipe.objects.get(id=id)
+        except:
+            raise Exception("No recipe found by that id")
+        revisions = RecipeRevision.objects.filter(recipe=recipe).select_related('author')
+        if after is not None:
+            revisions = revisions.filter(revision__lt=after)
+        return revisions[:first]
+
+    search_recipes = graphene.List(
+        RecipeType,
+        query=graphene.String(required=True),
+        first=graphene.Int(required=False),
+        after=graphene.Int(required=False)
+    )
+
+    # Best matches first, after is the number of results that have already been received
+    def resolve_search_recipes(root, info, query, first=20, after=0):
+        if first < 1 or first > 100:
+            raise Exception("First must be between 1 and 100")
+        if after < 0:
+            raise Exception("After cannot be negative")
+        return search_recipes(query, first, after)
+
+    recipes_by_ingredients = graphene.List(
+        RecipeMatchType,
+        have=graphene.List(graphene.NonNull(graphene.String), required=True),
+        min_match=graphene.Int(required=False),
+        first=graphene.Int(required=False)
+    )
+
+    # The recipes that can be made with (or are the closest to being made with) the ingredients in have
+    def resolve_recipes_by_ingredients(root, info, have, min_match=1, first=20):
+        if first < 1 or first > 100:
+            raise Exception("First must be between 1 and 100")
+        if len(have) > 100:
+            raise Exception("Have may only have 100 ingredients")
+        return recipes_by_ingredients(have, max(min_match, 1), first)
+
+    suggest_recipes = graphene.List(
+        RecipeType,
+        name=graphene.String(required=True),
+        first=graphene.Int(required=False)
+    )
+
+    # The recipes with the most similar names, for when the name given to recipe doesn't match exactly
+    def resolve_suggest_recipes(root, info, name, first=5):
+        if first < 1 or first > 20:
+            raise Exception("First must be between 1 and 20")
+        return suggest(Recipe, name, first)
+
+    suggest_groups = graphene.List(
+        GroupsType,
+        name=graphene.String(required=True),
+        first=graphene.Int(required=False)
+    )
+
+    def resolve_suggest_groups(root, info, name, first=5):
+        if first < 1 or first > 20:
+            raise Exception("First must be between 1 and 20")
+        return suggest(Group, name, first)
+
+    autocomplete = graphene.List(
+        CompletionType,
+        prefix=graphene.String(required=True),
+        kind=AutocompleteKind(required=False),
+        first=graphene.Int(required=False)
+    )
+
+    # Type-ahead for recipe names or ingredient names (of the ingredient catalogue)
+    def resolve_autocomplete(root, info, prefix, kind=AutocompleteKind.RECIPE.value, first=10):
+        if first < 1 or first > 20:
+            raise Exception("First must be between 1 and 20")
+        return autocomplete(Ingredient if kind == AutocompleteKind.INGREDIENT.value else Recipe, prefix, first)
+
+    parse_ingredients = graphene.List(ParsedIngredientType, lines=graphene.List(graphene.NonNull(graphene.String), required=True))
+
+    # Splits pasted ingredient lines ("2 1/2 cups flour, sifted") into name, quantity and unit
+    def resolve_parse_ingredients(root, info, lines):
+        if len(lines) > 5000:
+            raise Exception("At most 5000 lines can be parsed at once")
+        parsed = []
+        for line in lines:
+            if line.strip():
+                name, quantity, unit = parse_line(line)
+                parsed.append(ParsedIngredientType(line=line, name=name, quantity=quantity, unit=unit))
+        return parsed
+
+    suggest_week_plan = graphene.List(
+        PlannedMealType,
+        constraints=WeekPlanConstraintsInputType(required=False)
+    )
+
+    # Recipes for the open meal slots of the user's (or one of their groups') week
+    # that keep the shopping list of the week as short as possible
+    @login_required
+    def resolve_suggest_week_plan(root, info, constraints=None):
+        constraints = constraints or {}
+        owner = info.context.user.individual
+        if constraints.get('group_id'):
+            try:
+                owner = Group.objects.get(id=constraints['group_id'])
+            except:
+                raise Exception("No group found by that id")
+            if info.context.user not in [member.user for member in owner.members.all()]:
+                raise Exception("A group's week plan may only be suggested to its members")
+        max_repeats = constraints.get('max_repeats')
+        if max_repeats is None:
+            max_repeats = 1
+        if max_repeats < 1 or max_repeats > 28:
+            raise Exception("Max repeats must be between 1 and 28")
+        return suggest_week_plan(
+            owner,
+            days=constraints.get('days'),
+            times=constraints.get('times'),
+            exclude=constraints.get('exclude') or [],
+            max_repeats=max_repeats
+        )
+
     recipe_urls = graphene.List(graphene.String)
 
     def resolve_recipe_urls(root, info):
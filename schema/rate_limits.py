@@ -0,0 +1,105 @@
+import math
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from graphql import GraphQLError
+
+from aww.models import RateLimitCount
+
+# Rate limits of the operations in settings.RATE_LIMITS, by their root field name:
+# {"createRecipe": {"user": (30, 60), "ip": (60, 60)}} lets each user call createRecipe 30 times a minute
+# and each IP address 60 times a minute ("user" counts an anonymous caller by their IP address).
+# The graphene middleware checks them before the field is resolved, once authenticated (c.f. GRAPHENE['MIDDLEWARE']):
+# a call over a limit is refused with a RateLimited error and nothing of it runs.
+# Each limit works like a bucket of `limit` calls that refills continuously over `period` seconds.
+# Rather than the bucket's level (read, refilled and written back, which could race between processes)
+# the calls are counted per window of `period` seconds: the calls of the current window plus those of the
+# previous one weighted by how much of it is still within the last `period` seconds. A refused call isn't counted.
+# The counts are rows of the database (RateLimitCount), shared by every process: a call is counted by a single
+# upsert per limit, atomic whatever the number of processes, which also returns the previous window's count,
+# and a refused call costs one more update to take its counts back.
+COUNT_SQL = """
+    INSERT INTO {table} ({key}, calls, expires_at) VALUES (%s, 1, %s)
+    ON CONFLICT ({key}) DO UPDATE SET calls = {table}.calls + 1
+    RETURNING calls, (SELECT previous.calls FROM {table} previous WHERE previous.{key} = %s)
+"""
+
+
+class RateLimited(GraphQLError):
+    def __init__(self, operation, retry_after):
+        super().__init__(
+            f"Too many {operation} calls, try again in {retry_after} seconds",
+            extensions={'code': 'RATE_LIMITED', 'operation': operation, 'retryAfter': retry_after}
+        )
+
+
+def client_ip(request):
+    """The caller's IP address, as seen by the last of the RATE_LIMIT_PROXIES proxies in front of the app (if any)"""
+    proxies = settings.RATE_LIMIT_PROXIES
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _elapsed(period, now):
+    """How much of the current window has passed, from 0 to 1"""
+    return now / period - int(now // period)
+
+
+def _count(key, period, now):
+    """
+    Counts a call, returns (calls of the current window, this one included, calls of the previous window,
+    the current window's key)
+    """
+    window = int(now // period)
+    current = f"{key}:{window}"
+    expires_at = datetime.fromtimestamp((window + 2) * period, timezone.utc)
+    sql = COUNT_SQL.format(table=RateLimitCount._meta.db_table, key=connection.ops.quote_name('key'))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [current, connection.ops.adapt_datetimefield_value(expires_at), f"{key}:{window - 1}"])
+        calls, previous = cursor.fetchone()
+    return calls, previous or 0, current
+
+
+def _retry_after(calls, previous, limit, period, now):
+    """Seconds until a call would be within the limit again, given the counted calls of the current and previous windows"""
+    elapsed = _elapsed(period, now)
+    if calls + 1 > limit or not previous:
+        wait = (1 - elapsed) * period
+    else:
+        # When the previous window's share has dropped enough
+        wait = (1 - (limit - calls - 1) / previous - elapsed) * period
+    return max(1, math.ceil(round(wait, 6)))
+
+
+def check_rate_limits(operation, request, now=None):
+    """Counts a call of the operation, raises RateLimited if it's over one of its limits"""
+    limits = settings.RATE_LIMITS.get(operation)
+    if not limits:
+        return
+    now = time.time() if now is None else now
+    user = getattr(request, 'user', None)
+    counted = []
+    for kind, (limit, period) in limits.items():
+        if kind == 'user' and user is not None and user.is_authenticated:
+            who = user.pk
+        else:
+            who = client_ip(request)
+        key = f"{operation}:{kind}:{who}"
+        calls, previous, current = _count(key, period, now)
+        counted.append(current)
+        if previous * (1 - _elapsed(period, now)) + calls > limit:
+            RateLimitCount.objects.filter(key__in=counted).update(calls=F('calls') - 1)
+            raise RateLimited(operation, _retry_after(calls - 1, previous, limit, period, now))
+
+
+class RateLimitMiddleware:
+    """Graphene middleware that checks the rate limits of the root fields before they're resolved"""
+    def resolve(self, next, root, info, **kwargs):
+        if len(info.path) == 1:
+            check_rate_limits(info.field_name, info.context)
+        return next(root, info, **kwargs)
@@ -10,47 +10,131 @@ from aww.models import (
     Individual,
     RecipeIngredient,
     RecipeStep,
+    RecipeRevision,
     Recipe
 )
 
+from aww.scaling import scale_factor, scaled_ingredients
+from aww.shopping import generated_shopping_list
+from aww.similarity import SIMILAR_RECIPES
+
+from .loaders import get_loaders
+
+# A meal keeps pointing at a soft-deleted recipe until the recipe is purged
+# (at which point it's set to null), so it is hidden here in the meantime
+def visible_recipe(meal):
+    if meal.recipe is None or meal.recipe.deleted_at is not None:
+        return None
+    return meal.recipe
+
 # *** Query Types ***
 # Recipe
 class RecipeStepType(DjangoObjectType):
     """
-    A step for a recipe with a step and an order
-    The order is the order that the step comes in. It should be positive and grow linearly, but that constraint isn't enforced on the backend.
+    A step for a recipe with a step, an order and a position
+    The order is the number the step was given when it was created. It should be positive and grow linearly, but that constraint isn't enforced on the backend.
+    The position is what the steps are sorted by, it changes when steps are inserted/moved with insertRecipeStep, moveRecipeStep and reorderRecipeSteps.
     """
     class Meta:
         model = RecipeStep
-        fields = ('id', 'step', 'order')
+        fields = ('id', 'step', 'order', 'position')
 
 
 class RecipeIngredientType(DjangoObjectType):
     """Ingredient for a recipe"""
     class Meta:
         model = RecipeIngredient
-        fields = ('id', 'name', 'quantity', 'unit')
+        fields = ('id', 'name', 'quantity', 'unit', 'amount', 'canonical_unit')
 
 
 class RecipeType(DjangoObjectType):
     """
     Global recipe available to all users.
     Ingredients and the steps are resolved instead of their model's field names, recipeingredient_set and recipestep_set respectively
+    The ingredients can be scaled to a number of servings (if the recipe has servings) or by a scale
+    Similar are the recipes that share the most ingredients with it, most similar first
     """
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'photo', 'url')
+        fields = ('id', 'name', 'photo', 'url', 'servings', 'version')
 
     # To make these fields more clear-cut instead of having to be called as
     # recipeingredient_set (recipeingredientSet) and recipestep_set (recipestepSet)
-    ingredients = graphene.List(RecipeIngredientType)
+    ingredients = graphene.List(
+        RecipeIngredientType,
+        servings=graphene.Int(required=False),
+        scale=graphene.Float(required=False)
+    )
     steps = graphene.List(RecipeStepType)
+    similar = graphene.List(lambda: RecipeType, first=graphene.Int(required=False))
 
-    def resolve_ingredients(self, info):
-        return self.recipeingredient_set.all()
+    # Loaded for all the recipes of the response at once (c.f. loaders.py)
+    # With servings or scale, the quantities are scaled (c.f. scaling.py)
+    def resolve_ingredients(self, info, servings=None, scale=None):
+        loader = get_loaders(info).recipe_ingredients
+        factor = scale_factor(self, servings, scale)
+        if factor is None:
+            return loader.load(self.id)
+        return scaled_ingredients(self, factor, loader)
 
     def resolve_steps(self, info):
-        return self.recipestep_set.all()
+        return get_loaders(info).recipe_steps.load(self.id)
+
+    # Precomputed by the refresh_similar_recipes command (c.f. similarity.py)
+    def resolve_similar(self, info, first=5):
+        if first < 1 or first > SIMILAR_RECIPES:
+            raise Exception(f"First must be between 1 and {SIMILAR_RECIPES}")
+        return get_loaders(info).similar_recipes.load(self.id).then(lambda recipes: recipes[:first])
+
+class RecipeRevisionType(DjangoObjectType):
+    """
+    A single edit of a recipe. The delta only contains what changed:
+    name/photo as [old, new], ingredients as {"-": [...], "+": [...]} with each ingredient as [name, quantity, unit]
+    and steps as a list of [old index, new index, old steps, new steps]
+    """
+    class Meta:
+        model = RecipeRevision
+        fields = ('id', 'revision', 'created_at', 'delta')
+
+    author = graphene.String()
+
+    def resolve_author(self, info):
+        return self.author.username if self.author else None
+
+class RecipeMatchType(graphene.ObjectType):
+    """
+    A recipe found by recipesByIngredients: matched of its total ingredients are covered by what was given
+    (coverage being matched / total) and missing are the names of the ingredients that aren't
+    """
+    recipe = graphene.Field(RecipeType)
+    matched = graphene.Int()
+    total = graphene.Int()
+    coverage = graphene.Float()
+    missing = graphene.List(graphene.String)
+
+class CompletionType(graphene.ObjectType):
+    """A name found by autocomplete, with the id of the recipe/ingredient it's the name of"""
+    id = graphene.ID()
+    name = graphene.String()
+
+class UrlImportType(graphene.ObjectType):
+    """
+    The result of importRecipeFromUrl for one URL: the recipe (the existing one if a recipe already has that URL)
+    or why there isn't one. cached is true if the page wasn't read again
+    """
+    url = graphene.String()
+    recipe = graphene.Field(RecipeType)
+    error = graphene.String()
+    cached = graphene.Boolean()
+
+# Conflict
+class VersionConflictType(graphene.ObjectType):
+    """
+    Returned by the update mutations instead of applying the update when the expectedVersion
+    that was sent isn't the current version anymore, i.e. someone else updated it in the meantime
+    """
+    expected_version = graphene.Int()
+    current_version = graphene.Int()
 
 # Request
 class RequestType(graphene.ObjectType):
@@ -58,12 +142,26 @@ class RequestType(graphene.ObjectType):
     id = graphene.ID()
     name = graphene.String()
 
+# Shopping list generated from the recipes of the meals
+class ShoppingItemType(graphene.ObjectType):
+    """An ingredient of the generated shopping list, with the quantities of every meal that needs it summed"""
+    name = graphene.String()
+    quantity = graphene.String()
+    unit = graphene.String()
+
+class ParsedIngredientType(graphene.ObjectType):
+    """An ingredient line split by parseIngredients, ready to be sent as an IngredientInputType"""
+    line = graphene.String()
+    name = graphene.String()
+    quantity = graphene.String()
+    unit = graphene.String()
+
 # Group
 class GroupShoppingItemType(DjangoObjectType):
     """Shopping Item based on the GroupShoppingItem"""
     class Meta:
         model = GroupShoppingItem
-        fields = ('id', 'name', 'quantity', 'unit')
+        fields = ('id', 'name', 'quantity', 'unit', 'amount', 'canonical_unit')
 
 
 class GroupMealType(DjangoObjectType):
@@ -72,6 +170,9 @@ class GroupMealType(DjangoObjectType):
         model = GroupMeal
         fields = ('id', 'recipe', 'text', 'day', 'time')
 
+    def resolve_recipe(self, info):
+        return visible_recipe(self)
+
 
 class GroupsType(DjangoObjectType):
     """Publically available group item with limited information"""
@@ -90,12 +191,14 @@ class GroupType(DjangoObjectType):
     """Group type that will only be available for members of a group."""
     class Meta:
         model = Group
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'version')
 
     members = graphene.List(graphene.String)
     requests = graphene.List(RequestType)
     shopping_list = graphene.List(GroupShoppingItemType)
     meals = graphene.List(GroupMealType)
+    # The ingredients of the recipes of the meals (only those of the given days if days is provided)
+    generated_shopping_list = graphene.List(ShoppingItemType, days=graphene.List(graphene.NonNull(lambda: Day)))
 
     def resolve_members(self, info):
         _members = self.members.all()
@@ -109,6 +212,9 @@ class GroupType(DjangoObjectType):
 
     def resolve_meals(self, info):
         return self.groupmeal_set.all()
+
+    def resolve_generated_shopping_list(self, info, days=None):
+        return generated_shopping_list(self, days)
     
     
 
@@ -117,7 +223,7 @@ class IndividualShoppingItemType(DjangoObjectType):
     """Shopping Item based on the IndividualShoppingItem"""
     class Meta:
         model = IndividualShoppingItem
-        fields = ('id', 'name', 'quantity', 'unit')
+        fields = ('id', 'name', 'quantity', 'unit', 'amount', 'canonical_unit')
 
 
 class IndividualMealType(DjangoObjectType):
@@ -126,6 +232,9 @@ class IndividualMealType(DjangoObjectType):
         model = IndividualMeal
         fields = ('id', 'recipe', 'text', 'day', 'time')
 
+    def resolve_recipe(self, info):
+        return visible_recipe(self)
+
 
 class IndividualType(DjangoObjectType):
     """
@@ -134,10 +243,11 @@ class IndividualType(DjangoObjectType):
     """
     class Meta:
         model = Individual
-        fields = ('id',)
+        fields = ('id', 'version')
 
     shopping_list = graphene.List(IndividualShoppingItemType)
     meals = graphene.List(IndividualMealType)
+    generated_shopping_list = graphene.List(ShoppingItemType, days=graphene.List(graphene.NonNull(lambda: Day)))
     groups = graphene.List(GroupType)
     requests = graphene.List(RequestType)
     email = graphene.String()
@@ -149,6 +259,9 @@ class IndividualType(DjangoObjectType):
     def resolve_meals(self, info):
         return self.individualmeal_set.all()
 
+    def resolve_generated_shopping_list(self, info, days=None):
+        return generated_shopping_list(self, days)
+
     def resolve_groups(self, info):
         return self.groups.all()
 
@@ -202,6 +315,12 @@ class RecipeStepInputType(graphene.InputObjectType):
     step = graphene.String(required=True)
     order = graphene.Int(required=False)
 
+class AutocompleteKind(graphene.Enum):
+    """Enum for what the autocomplete query completes the names of"""
+    RECIPE = "recipe"
+    INGREDIENT = "ingredient"
+
+
 class Day(graphene.Enum):
     """Enum for the day of the week, values corresponding to what is expected by Django for the database"""
     MONDAY = "MON"
@@ -221,9 +340,30 @@ class Time(graphene.Enum):
     OTHER = "O"
 
 
+class PlannedMealType(graphene.ObjectType):
+    """A meal suggested by suggestWeekPlan for a slot that's open, not saved until it's added to the meals"""
+    day = Day()
+    time = Time()
+    recipe = graphene.Field(RecipeType)
+
+
+class WeekPlanConstraintsInputType(graphene.InputObjectType):
+    """Input type of what suggestWeekPlan has to respect"""
+    group_id = graphene.ID(required=False)
+    days = graphene.List(graphene.NonNull(Day), required=False)
+    times = graphene.List(graphene.NonNull(Time), required=False)
+    exclude = graphene.List(graphene.NonNull(graphene.ID), required=False)
+    max_repeats = graphene.Int(required=False)
+
+
 class MealInputType(graphene.InputObjectType):
     """Input type used to create a meal"""
     text = graphene.String(required=False)
     recipeId = graphene.ID(required=False)
     day = Day(required=True)
-    time = Time(required=True)
\ No newline at end of file
+    time = Time(required=True)
+
+class ImportFormat(graphene.Enum):
+    """Enum for the format of the data of importRecipes"""
+    NDJSON = "ndjson"
+    CSV = "csv"
@@ -0,0 +1,120 @@
+import json
+
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from graphene_django.views import GraphQLView, HttpError
+
+# Past this many operations, a batch is refused
+MAX_BATCH_SIZE = 20
+
+
+class BatchGraphQLView(GraphQLView):
+    """
+    GraphQLView that also accepts a batch of operations in a single POST, either as
+    [{"query": ..., "variables": ...}, ...]
+    or, to run them all-or-nothing in a single transaction, as
+    {"atomic": true, "operations": [{"query": ..., "variables": ...}, ...]}
+    The response is a list with a {"id", "data", "errors", "status"} object per operation.
+    In an atomic batch, the operations after the first one that fails aren't run
+    and the ones before it are rolled back.
+    Anything else is handled like a single operation by the GraphQLView (graphiql included).
+    """
+
+    @method_decorator(ensure_csrf_cookie)
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            batch = self.parse_batch(request)
+        except HttpError as e:
+            return self.error_response(request, e)
+        if batch is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        operations, atomic = batch
+        try:
+            responses = self.execute_batch(request, operations, atomic)
+        except HttpError as e:
+            return self.error_response(request, e)
+        status_code = max(response['status'] for response in responses)
+        return HttpResponse(
+            status=status_code,
+            content=self.json_encode(request, responses),
+            content_type="application/json"
+        )
+
+    def parse_batch(self, request):
+        """Returns (operations, atomic) if the request is a batch, None otherwise"""
+        if request.method.lower() != "post" or self.get_content_type(request) != "application/json":
+            return None
+        try:
+            body = json.loads(request.body.decode("utf-8"))
+        except (TypeError, ValueError):
+            # Let the GraphQLView give its usual error
+            return None
+
+        if isinstance(body, list):
+            operations, atomic = body, False
+        elif isinstance(body, dict) and "operations" in body:
+            operations, atomic = body["operations"], body.get("atomic") is True
+        else:
+            return None
+
+        if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+            raise HttpError(HttpResponseBadRequest("A batch should be a list of operations."))
+        if not operations:
+            raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+        if len(operations) > MAX_BATCH_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                f"A batch cannot have more than {MAX_BATCH_SIZE} operations."))
+        return operations, atomic
+
+    def execute_batch(self, request, operations, atomic):
+        if not atomic:
+            return [self.get_batch_response(request, operation) for operation in operations]
+
+        responses = []
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                response = self.get_batch_response(request, operation)
+                responses.append(response)
+                if "errors" in response:
+                    transaction.set_rollback(True)
+                    break
+        if len(responses) == len(operations) and "errors" not in responses[-1]:
+            return responses
+
+        failed = len(responses) - 1
+        for index, response in enumerate(responses[:failed]):
+            responses[index] = self.failed_batch_response(
+                response["id"], f"Rolled back because operation {failed} of the batch failed")
+        for operation in operations[failed + 1:]:
+            responses.append(self.failed_batch_response(
+                operation.get("id"), f"Not run because operation {failed} of the batch failed"))
+        return responses
+
+    def get_batch_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name)
+
+        response = {"id": id}
+        status_code = 200
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        response["status"] = status_code
+        return response
+
+    @staticmethod
+    def failed_batch_response(id, message):
+        return {"id": id, "errors": [{"message": message}], "data": None, "status": 200}
+
+    def error_response(self, request, e):
+        response = e.response
+        response["Content-Type"] = "application/json"
+        response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+        return response
@@ -0,0 +1,167 @@
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+from graphql_jwt.shortcuts import get_token
+
+from aww import auth
+from aww.models import Individual
+from aww.refresh_tokens import REVOKED_TOKENS_TTL, revoked_tokens
+
+MY_GROUPS = '''
+    query {
+        myGroups {
+            name
+        }
+        suggestWeekPlan {
+            day
+        }
+    }
+'''
+
+
+class AuthenticationTest(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username="Test User", email="auth@test.com", password="testpassword")
+        self.user = get_user_model().objects.get(email="auth@test.com")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+    def user_queries(self, headers=None):
+        """The response of MY_GROUPS and the queries of the user, their status or their individual"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.query(MY_GROUPS, headers=headers or self.headers)
+        return res, [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "auth_user"' in query['sql'] or 'FROM "aww_individual" ' in query['sql']
+        ]
+
+    def test_user_loaded_once(self):
+        """
+        Tests that the user is loaded with their status and individual in a single query, then kept for the next requests
+        """
+        res, queries = self.user_queries()
+        self.assertResponseNoErrors(res)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"graphql_auth_userstatus"', queries[0])
+        self.assertIn('"aww_individual"', queries[0])
+
+        res, queries = self.user_queries()
+        self.assertResponseNoErrors(res)
+        self.assertEqual(queries, [])
+
+    def test_invalid_token_decoded_once(self):
+        """
+        Tests that a token that isn't valid is only decoded once, however many fields the request has
+        """
+        with mock.patch('aww.auth.get_payload', wraps=auth.get_payload) as get_payload:
+            res = self.query(MY_GROUPS, headers={"HTTP_AUTHORIZATION": "JWT not.a.token"})
+        self.assertResponseHasErrors(res)
+        self.assertEqual(get_payload.call_count, 1)
+        self.assertIsNone(json.loads(res.content)['data']['myGroups'])
+
+    def test_saved_user_is_forgotten(self):
+        """
+        Tests that a user that is deactivated can't use their token anymore, without waiting for the cache to expire
+        """
+        self.assertResponseNoErrors(self.user_queries()[0])
+        self.user.is_active = False
+        self.user.save()
+        self.assertResponseHasErrors(self.user_queries()[0])
+
+    def test_individual_version_is_not_cached(self):
+        """
+        Tests that the individual of a cached user has its current version
+        """
+        self.assertEqual(auth.cached_user("Test User").individual.version, 1)
+        Individual.objects.filter(user=self.user).update(version=5)
+        individual = auth.cached_user("Test User").individual
+        self.assertEqual((individual.id, individual.version), (self.user.individual.id, 5))
+
+
+TOKEN_AUTH = '''
+    mutation tokenAuth($username: String!, $password: String!) {
+        tokenAuth(username: $username, password: $password) {
+            success
+            refreshToken
+        }
+    }
+'''
+
+REFRESH_TOKEN = '''
+    mutation refreshToken($refreshToken: String!) {
+        refreshToken(refreshToken: $refreshToken) {
+            success
+            token
+        }
+    }
+'''
+
+
+class RefreshTokenTest(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username="Test User", email="refresh@test.com", password="testpassword")
+        res = self.query(TOKEN_AUTH, op_name='tokenAuth', variables={'username': "Test User", 'password': "testpassword"})
+        self.refresh_token = json.loads(res.content)['data']['tokenAuth']['refreshToken']
+        revoked_tokens.clear()
+
+    def refresh(self):
+        """Whether the refresh token could be used, and the queries of the refresh tokens"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.query(REFRESH_TOKEN, op_name='refreshToken', variables={'refreshToken': self.refresh_token})
+        return json.loads(res.content)['data']['refreshToken']['success'], [
+            query['sql'] for query in queries.captured_queries if 'FROM "refresh_token_refreshtoken"' in query['sql']
+        ]
+
+    def test_refresh_token(self):
+        """
+        Tests that a refresh token that can be used is looked up with its user in a single query
+        """
+        revoked_tokens.get()
+        success, queries = self.refresh()
+        self.assertTrue(success)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('INNER JOIN "auth_user"', queries[0])
+
+    def test_revoked_token_refused_without_query(self):
+        """
+        Tests that a token this process revoked is refused from memory, once the revocation is committed
+        """
+        revoked_tokens.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            get_refresh_token_model().objects.get(token=self.refresh_token).revoke()
+        self.assertEqual(self.refresh(), (False, []))
+
+    def test_token_revoked_elsewhere_is_refused(self):
+        """
+        Tests that a token revoked by another process (or before the revoked tokens were loaded) is refused too
+        """
+        revoked_tokens.get()
+        get_refresh_token_model().objects.filter(token=self.refresh_token).update(revoked=timezone.now())
+        self.assertFalse(self.refresh()[0])
+        revoked_tokens.clear()
+        self.assertTrue(self.refresh_token in revoked_tokens.get())
+        self.assertEqual(self.refresh(), (False, []))
+
+    def test_only_new_revocations_are_loaded(self):
+        """
+        Tests that once the revoked tokens are older than their ttl, only the tokens revoked since they were loaded are read,
+        by a single request
+        """
+        revoked_tokens.get()
+        get_refresh_token_model().objects.filter(token=self.refresh_token).update(revoked=timezone.now())
+        later = time.monotonic() + REVOKED_TOKENS_TTL + 1
+        with mock.patch('aww.refresh_tokens.time.monotonic', return_value=later), CaptureQueriesContext(connection) as queries:
+            self.assertIn(self.refresh_token, revoked_tokens.get())
+            revoked_tokens.get()
+        [query] = queries.captured_queries
+        self.assertIn('"revoked" >=', query['sql'])
+        self.assertEqual(self.refresh(), (False, []))
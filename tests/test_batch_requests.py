@@ -0,0 +1,100 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+
+from aww.models import Recipe
+
+CREATE_RECIPE = '''
+    mutation createRecipe($name: String!) {
+        createRecipe(name: $name) {
+            recipe {
+                id
+                name
+            }
+        }
+    }
+'''
+
+class BatchRequestTest(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username="Test User", email="batch@test.com", password="testpassword")
+        self.user = get_user_model().objects.get(email="batch@test.com")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+    def post_batch(self, body):
+        return self.client.post(
+            self.GRAPHQL_URL, json.dumps(body), content_type="application/json", **self.headers)
+
+    def test_batch_runs_every_operation(self):
+        res = self.post_batch([
+            {"id": "first", "query": CREATE_RECIPE, "variables": {"name": "First batched recipe"}},
+            {"id": "second", "query": CREATE_RECIPE, "variables": {"name": "First batched recipe"}},
+            {"id": "third", "query": "query { recipes { name } }"},
+        ])
+        self.assertEqual(res.status_code, 200)
+        content = json.loads(res.content)
+        self.assertEqual([response["id"] for response in content], ["first", "second", "third"])
+        self.assertEqual(content[0]["data"]["createRecipe"]["recipe"]["name"], "First batched recipe")
+        # Without the atomic flag, a failed operation doesn't undo the others
+        self.assertIn("errors", content[1])
+        self.assertEqual(content[2]["data"]["recipes"], [{"name": "First batched recipe"}])
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        res = self.post_batch({"atomic": True, "operations": [
+            {"query": CREATE_RECIPE, "variables": {"name": "Atomic recipe 1"}},
+            {"query": CREATE_RECIPE, "variables": {"name": "Atomic recipe 2"}},
+        ]})
+        content = json.loads(res.content)
+        self.assertNotIn("errors", content[0])
+        self.assertNotIn("errors", content[1])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        res = self.post_batch({"atomic": True, "operations": [
+            {"query": CREATE_RECIPE, "variables": {"name": "Atomic recipe 3"}},
+            {"query": CREATE_RECIPE, "variables": {"name": "Atomic recipe 1"}},
+            {"query": CREATE_RECIPE, "variables": {"name": "Atomic recipe 4"}},
+        ]})
+        content = json.loads(res.content)
+        self.assertEqual(len(content), 3)
+        self.assertIn("Rolled back", content[0]["errors"][0]["message"])
+        self.assertIsNone(content[0]["data"])
+        self.assertIn("errors", content[1])
+        self.assertIn("Not run", content[2]["errors"][0]["message"])
+        self.assertEqual(
+            sorted(recipe.name for recipe in Recipe.objects.all()),
+            ["Atomic recipe 1", "Atomic recipe 2"]
+        )
+
+    def test_batch_refuses_bad_lists(self):
+        res = self.post_batch([])
+        self.assertEqual(res.status_code, 400)
+        res = self.post_batch({"operations": ["query { recipes { name } }"]})
+        self.assertEqual(res.status_code, 400)
+
+    def test_single_operations_still_work(self):
+        res = self.query(CREATE_RECIPE, op_name='createRecipe', variables={'name': 'Single recipe'}, headers=self.headers)
+        self.assertResponseNoErrors(res)
+
+    def test_steps_and_ingredients_are_loaded_in_one_query_each(self):
+        for i in range(5):
+            recipe = Recipe.objects.create(name=f"Loaded recipe {i}")
+            recipe.recipeingredient_set.create(name="Salt", quantity="1", unit="pinch")
+            recipe.recipestep_set.create(step="Cook", order=1)
+            recipe.recipestep_set.create(step="Eat", order=2)
+
+        query = "query { recipes { name ingredients { name } steps { step } } }"
+        with CaptureQueriesContext(connection) as queries:
+            res = self.post_batch([{"query": query}])
+        content = json.loads(res.content)
+        self.assertEqual(len(content[0]["data"]["recipes"]), 5)
+        self.assertEqual(
+            [step["step"] for step in content[0]["data"]["recipes"][0]["steps"]], ["Cook", "Eat"])
+        # The user (from the JWT), the recipes, their ingredients and their steps
+        self.assertEqual(len(queries), 4)
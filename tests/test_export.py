@@ -0,0 +1,79 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from graphql_jwt.shortcuts import get_token
+
+from aww.export import export_recipes
+from aww.models import Group, GroupMeal, IndividualShoppingItem, Recipe, RecipeIngredient, RecipeStep
+
+class ExportTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username="Test User", email="export@test.com", password="testpassword")
+        self.user = get_user_model().objects.get(email="export@test.com")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+        for name in ["Soup", "Pancakes", "Salad"]:
+            recipe = Recipe.objects.create(name=name)
+            RecipeIngredient.objects.create(name=f"{name} base", quantity="1", unit="cup", recipe=recipe)
+            RecipeStep.objects.create(step=f"Make the {name}", order=1, recipe=recipe)
+            RecipeStep.objects.create(step="Serve", order=2, recipe=recipe)
+
+        self.group = Group.objects.create(name="Export Group")
+        self.group.members.add(self.user.individual)
+        GroupMeal.objects.create(text="Dinner", day="MON", time="D", group=self.group)
+        Group.objects.create(name="Someone else's group")
+        IndividualShoppingItem.objects.create(name="Milk", quantity="1", unit="l", individual=self.user.individual)
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_export_requires_authentication(self):
+        self.assertEqual(self.client.get('/export/recipes.ndjson').status_code, 401)
+        self.assertEqual(self.client.get('/export/me.ndjson', HTTP_AUTHORIZATION="JWT nope").status_code, 401)
+
+    def test_export_recipes(self):
+        """
+        Every recipe is a line with its ingredients and steps in order
+        """
+        recipes = self.lines(self.client.get('/export/recipes.ndjson', **self.headers))
+        self.assertCountEqual([recipe['name'] for recipe in recipes], ["Soup", "Pancakes", "Salad"])
+        soup = next(recipe for recipe in recipes if recipe['name'] == "Soup")
+        self.assertEqual(soup['type'], 'recipe')
+        self.assertEqual(soup['ingredients'], [{'name': "Soup base", 'quantity': "1", 'unit': "cup"}])
+        self.assertEqual(soup['steps'], ["Make the Soup", "Serve"])
+
+    def test_export_in_chunks(self):
+        """
+        The chunks give the same recipes, each with its own ingredients and steps
+        """
+        recipes = list(export_recipes(chunk_size=2))
+        self.assertEqual(len(recipes), 3)
+        for recipe in recipes:
+            self.assertEqual(recipe['ingredients'][0]['name'], f"{recipe['name']} base")
+            self.assertEqual(recipe['steps'][0], f"Make the {recipe['name']}")
+
+    def test_export_me(self):
+        """
+        The user's individual and the groups they're a member of, nobody else's
+        """
+        objects = self.lines(self.client.get('/export/me.ndjson', **self.headers))
+        self.assertEqual([obj['type'] for obj in objects], ['individual', 'group'])
+        individual, group = objects
+        self.assertEqual(individual['email'], "export@test.com")
+        self.assertEqual(individual['shopping_list'], [{'name': "Milk", 'quantity': "1", 'unit': "l"}])
+        self.assertEqual(group['name'], "Export Group")
+        self.assertEqual(group['members'], ["export@test.com"])
+        self.assertEqual(group['meals'], [{'day': "MON", 'time': "D", 'text': "Dinner", 'recipe_id': None}])
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_ndjson', stdout=out)
+        types = [json.loads(line)['type'] for line in out.getvalue().splitlines()]
+        self.assertEqual(types, ['recipe'] * 3 + ['group'] * 2 + ['individual'])
@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 
@@ -6,6 +7,7 @@ from graphene_django.utils.testing import GraphQLTestCase
 from graphql_jwt.shortcuts import get_token
 
 from aww.models import Group
+from aww.versioning import bump_version
 
 class GroupMutationTest(GraphQLTestCase):
     def setUp(self):
@@ -179,4 +181,97 @@ class GroupMutationTest(GraphQLTestCase):
         with self.assertRaises(Group.DoesNotExist):
             Group.objects.get(name=group_object.name)
         with self.assertRaises(Group.DoesNotExist):
-            Group.objects.get(name=group_object.id)
\ No newline at end of file
+            Group.objects.get(name=group_object.id)
+
+    def test_update_group_version_conflict(self):
+        self.group.members.add(self.user.individual)
+        update = '''
+            mutation updateGroup($id: ID!, $shoppingList: [IngredientInputType!], $expectedVersion: Int) {
+                updateGroup(id: $id, shoppingList: $shoppingList, expectedVersion: $expectedVersion) {
+                    group {
+                        version
+                        shoppingList {
+                            name
+                        }
+                    }
+                    conflict {
+                        expectedVersion
+                        currentVersion
+                    }
+                }
+            }
+        '''
+        res_first = self.query(
+            update,
+            op_name='updateGroup',
+            variables={
+                'id': str(self.group.id),
+                'shoppingList': [{'name': 'Milk', 'quantity': '1', 'unit': 'l'}],
+                'expectedVersion': 1
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_first)
+        first = json.loads(res_first.content)['data']['updateGroup']
+        self.assertIsNone(first['conflict'])
+        self.assertEqual(first['group']['version'], 2)
+
+        # A second family member still has version 1 and tries to overwrite the list
+        res_second = self.query(
+            update,
+            op_name='updateGroup',
+            variables={
+                'id': str(self.group.id),
+                'shoppingList': [{'name': 'Eggs', 'quantity': '12', 'unit': ''}],
+                'expectedVersion': 1
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_second)
+        second = json.loads(res_second.content)['data']['updateGroup']
+        self.assertEqual(second['conflict'], {'expectedVersion': 1, 'currentVersion': 2})
+        self.assertEqual(second['group']['shoppingList'], [{'name': 'Milk'}])
+
+        # Without an expected version the update always goes through
+        res_third = self.query(
+            update,
+            op_name='updateGroup',
+            variables={
+                'id': str(self.group.id),
+                'shoppingList': [{'name': 'Eggs', 'quantity': '12', 'unit': ''}]
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_third)
+        third = json.loads(res_third.content)['data']['updateGroup']
+        self.assertIsNone(third['conflict'])
+        self.assertEqual(third['group']['version'], 3)
+
+    def test_update_group_after_concurrent_update(self):
+        """
+        Tests that the group is reloaded once its row is locked, so an update returns what another one committed meanwhile
+        """
+        self.group.members.add(self.user.individual)
+
+        def renamed_meanwhile(group, expected_version=None):
+            Group.objects.filter(id=group.id).update(name="Renamed Test Group")
+            return bump_version(group, expected_version)
+
+        with mock.patch('schema.mutations.group_mutation.bump_version', side_effect=renamed_meanwhile):
+            res = self.query(
+                '''
+                    mutation updateGroup($id: ID!, $shoppingList: [IngredientInputType!]) {
+                        updateGroup(id: $id, shoppingList: $shoppingList) {
+                            group {
+                                name
+                                version
+                            }
+                        }
+                    }
+                ''',
+                op_name='updateGroup',
+                variables={'id': str(self.group.id), 'shoppingList': [{'name': 'Milk', 'quantity': '1', 'unit': 'l'}]},
+                headers=self.headers
+            )
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['updateGroup']['group'], {'name': "Renamed Test Group", 'version': 2})
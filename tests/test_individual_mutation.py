@@ -5,7 +5,7 @@ from django.contrib.auth import get_user_model
 from graphene_django.utils.testing import GraphQLTestCase
 from graphql_jwt.shortcuts import get_token
 
-from aww.models import Individual, Group
+from aww.models import Individual, Group, Recipe
 
 class IndividualMutationTest(GraphQLTestCase):
     def setUp(self):
@@ -362,3 +362,86 @@ class IndividualMutationTest(GraphQLTestCase):
         self.assertResponseNoErrors(res_leave)
         self.assertNotIn(self.individual, self.group.members.all())
         self.assertNotIn(self.group, self.individual.groups.all())
+
+    def test_generated_shopping_list(self):
+        """
+        Tests that the generated shopping list sums the ingredients of the recipes of the meals
+        and is up to date once the meals or the recipes change
+        """
+        pasta = Recipe.objects.create(name="Shopping Pasta")
+        pasta.recipeingredient_set.create(name="Tomatoes", quantity="2", unit="cups")
+        pasta.recipeingredient_set.create(name="Salt", quantity="a pinch", unit="")
+        soup = Recipe.objects.create(name="Shopping Soup")
+        soup.recipeingredient_set.create(name="tomato, diced", quantity="1 1/2", unit="cup")
+        soup.recipeingredient_set.create(name="Onion", quantity="1", unit="")
+
+        update = '''
+            mutation updateIndividual($meals: [MealInputType!]) {
+                updateIndividual(meals: $meals) {
+                    individual {
+                        version
+                    }
+                }
+            }
+        '''
+        me = '''
+            query me($days: [Day!]) {
+                me {
+                    individual {
+                        generatedShoppingList(days: $days) {
+                            name
+                            quantity
+                            unit
+                        }
+                    }
+                }
+            }
+        '''
+        res = self.query(
+            update,
+            op_name='updateIndividual',
+            variables={'meals': [
+                {'recipeId': str(pasta.id), 'day': 'MONDAY', 'time': 'DINNER'},
+                {'recipeId': str(soup.id), 'day': 'TUESDAY', 'time': 'LUNCH'},
+                {'recipeId': str(pasta.id), 'day': 'WEDNESDAY', 'time': 'DINNER'},
+            ]},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+
+        res = self.query(me, op_name='me', headers=self.headers)
+        self.assertResponseNoErrors(res)
+        items = json.loads(res.content)['data']['me']['individual']['generatedShoppingList']
+        self.assertEqual(items, [
+            {'name': 'Tomatoes', 'quantity': '5 1/2', 'unit': 'cups'},
+            {'name': 'Salt', 'quantity': 'a pinch', 'unit': ''},
+            {'name': 'Onion', 'quantity': '1', 'unit': ''},
+        ])
+
+        res = self.query(me, op_name='me', variables={'days': ['TUESDAY']}, headers=self.headers)
+        items = json.loads(res.content)['data']['me']['individual']['generatedShoppingList']
+        self.assertEqual([item['name'] for item in items], ['tomato, diced', 'Onion'])
+
+        # Changing a recipe makes the cached list stale
+        res = self.query(
+            '''
+                mutation updateRecipe($id: ID!, $ingredients: [IngredientInputType!]) {
+                    updateRecipe(id: $id, ingredients: $ingredients) {
+                        recipe {
+                            id
+                        }
+                    }
+                }
+            ''',
+            op_name='updateRecipe',
+            variables={'id': str(soup.id), 'ingredients': [{'name': 'Onions', 'quantity': '2', 'unit': ''}]},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        res = self.query(me, op_name='me', headers=self.headers)
+        items = json.loads(res.content)['data']['me']['individual']['generatedShoppingList']
+        self.assertEqual(items, [
+            {'name': 'Tomatoes', 'quantity': '4', 'unit': 'cups'},
+            {'name': 'Salt', 'quantity': 'a pinch', 'unit': ''},
+            {'name': 'Onions', 'quantity': '2', 'unit': ''},
+        ])
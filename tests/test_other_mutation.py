@@ -7,6 +7,9 @@ from django.test import override_settings
 from graphene_django.utils.testing import GraphQLTestCase
 from graphql_jwt.shortcuts import get_token
 
+from aww.models import OutgoingEmail
+from aww.outbox import deliver_outbox
+
 # Django does this by default when running testing, but it never hurts to be safe
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
 class MessageMeTest(GraphQLTestCase):
@@ -39,5 +42,32 @@ class MessageMeTest(GraphQLTestCase):
         email = mail.outbox[0]
         self.assertIn(self.message, email.body)
 
+    @override_settings(
+        EMAIL_BACKEND='aww.outbox.OutboxBackend',
+        OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+    )
+    def test_send_email_through_outbox(self):
+        """
+        The email is only put in the outbox, the worker sends it
+        """
+        res = self.query(
+            '''
+                mutation messageMe($message: String!) {
+                    messageMe(message: $message) {
+                        success
+                    }
+                }
+            ''',
+            op_name='messageMe',
+            variables={'message': self.message},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        self.assertTrue(json.loads(res.content)['data']['messageMe']['success'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().body, self.message)
 
-        
\ No newline at end of file
+        self.assertEqual(deliver_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(self.message, mail.outbox[0].body)
+        self.assertIsNotNone(OutgoingEmail.objects.get().sent_at)
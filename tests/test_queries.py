@@ -4,6 +4,10 @@ from graphene_django.utils.testing import GraphQLTestCase
 from graphql_jwt.shortcuts import get_token
 from django.contrib.auth import get_user_model
 
+from aww import planner
+from aww.indexes import recipe_prefixes, ingredient_prefixes
+from aww.shopping import bump_recipes_generation
+from aww.similarity import refresh_similar_recipes
 from aww.models import (
     RecipeIngredient,
     RecipeStep,
@@ -484,4 +488,174 @@ class QueriesTest(GraphQLTestCase):
         groups = Group.objects.all()
         group_ids_expected = [str(group.id) for group in groups if self.user1.individual in group.members.all()]
 
-        self.assertListEqual(group_ids, group_ids_expected)
\ No newline at end of file
+        self.assertListEqual(group_ids, group_ids_expected)
+
+    def test_suggest_groups_and_recipes(self):
+        """
+        Queries suggestGroups and suggestRecipes return the groups/recipes with the most similar names
+        """
+        Group.objects.create(name="Test Grope 2")
+        res = self.query(
+            '''
+                query suggestGroups($name: String!) {
+                    suggestGroups(name: $name) {
+                        name
+                        members
+                    }
+                }
+            ''',
+            op_name='suggestGroups',
+            variables={'name': 'test group'}
+        )
+        self.assertResponseNoErrors(res)
+        data = json.loads(res.content)['data']
+        self.assertEqual([group['name'] for group in data['suggestGroups']], ['Test Group 1', 'Test Grope 2'])
+        self.assertEqual(data['suggestGroups'][0]['members'], [self.user1.username])
+
+        res = self.query(
+            '''
+                query suggestRecipes($name: String!, $first: Int) {
+                    suggestRecipes(name: $name, first: $first) {
+                        name
+                    }
+                }
+            ''',
+            op_name='suggestRecipes',
+            variables={'name': 'tset recipe 2', 'first': 1}
+        )
+        self.assertResponseNoErrors(res)
+        data = json.loads(res.content)['data']
+        self.assertEqual(data['suggestRecipes'], [{'name': 'Test Recipe 2'}])
+
+    def test_autocomplete(self):
+        """
+        Query autocomplete returns the recipe names or catalogue ingredient names that start with the prefix
+        """
+        # The indexes may have been built by another test, whose rows have been rolled back since
+        recipe_prefixes.invalidate()
+        ingredient_prefixes.invalidate()
+        autocomplete = '''
+            query autocomplete($prefix: String!, $kind: AutocompleteKind, $first: Int) {
+                autocomplete(prefix: $prefix, kind: $kind, first: $first) {
+                    id
+                    name
+                }
+            }
+        '''
+        res = self.query(autocomplete, op_name='autocomplete', variables={'prefix': 'test r'})
+        self.assertResponseNoErrors(res)
+        data = json.loads(res.content)['data']
+        self.assertEqual([completion['name'] for completion in data['autocomplete']], ['Test Recipe 1', 'Test Recipe 2'])
+        self.assertEqual(data['autocomplete'][0]['id'], str(self.recipe.id))
+
+        res = self.query(autocomplete, op_name='autocomplete', variables={'prefix': 'recipe', 'first': 1})
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['autocomplete'], [
+            {'id': str(self.recipe.id), 'name': 'Test Recipe 1'}
+        ])
+
+        # Shown as it was first written (lowercased), found by any of the ways it was written
+        res = self.query(autocomplete, op_name='autocomplete', variables={'prefix': 'NAM', 'kind': 'INGREDIENT'})
+        self.assertResponseNoErrors(res)
+        self.assertEqual([completion['name'] for completion in json.loads(res.content)['data']['autocomplete']], ['test name 1'])
+        res = self.query(autocomplete, op_name='autocomplete', variables={'prefix': 'Test Name 2', 'kind': 'INGREDIENT'})
+        self.assertResponseNoErrors(res)
+        self.assertEqual([completion['name'] for completion in json.loads(res.content)['data']['autocomplete']], ['test name 1'])
+
+        res = self.query(autocomplete, op_name='autocomplete', variables={'prefix': 'test', 'first': 21})
+        self.assertResponseHasErrors(res)
+
+    def test_parse_ingredients(self):
+        """
+        Query parseIngredients splits each line that isn't blank into name, quantity and unit
+        """
+        res = self.query(
+            '''
+            query parseIngredients($lines: [String!]!) {
+                parseIngredients(lines: $lines) {
+                    line
+                    name
+                    quantity
+                    unit
+                }
+            }
+            ''',
+            op_name='parseIngredients',
+            variables={'lines': ["2 1/2 cups flour, sifted", " ", "Salt to taste"]}
+        )
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['parseIngredients'], [
+            {'line': "2 1/2 cups flour, sifted", 'name': "flour, sifted", 'quantity': "2 1/2", 'unit': "cups"},
+            {'line': "Salt to taste", 'name': "Salt to taste", 'quantity': "", 'unit': ""},
+        ])
+
+    def test_similar_recipes(self):
+        """
+        RecipeType.similar returns the recipes that share the most ingredients, once they've been refreshed
+        """
+        other = Recipe.objects.get(name="Test Recipe 2")
+        RecipeIngredient.objects.create(name="Test Name 1", unit="", quantity="1", recipe=other)
+        Recipe.objects.create(name="Test Recipe 3")
+        refresh_similar_recipes()
+        res = self.query(
+            '''
+                query recipe($id: ID!, $first: Int) {
+                    recipe(id: $id) {
+                        similar(first: $first) {
+                            name
+                        }
+                    }
+                }
+            ''',
+            op_name='recipe',
+            variables={'id': str(self.recipe.id), 'first': 1}
+        )
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['recipe']['similar'], [{'name': 'Test Recipe 2'}])
+
+    def test_suggest_week_plan(self):
+        """
+        Query suggestWeekPlan fills the open slots with the recipes that add the fewest ingredients
+        """
+        soup = Recipe.objects.create(name="Soup")
+        RecipeIngredient.objects.create(name="Test Name 1", unit="", quantity="1", recipe=soup)
+        RecipeIngredient.objects.create(name="Water", unit="l", quantity="1", recipe=soup)
+        salad = Recipe.objects.create(name="Salad")
+        RecipeIngredient.objects.create(name="Lettuce", unit="", quantity="1", recipe=salad)
+        RecipeIngredient.objects.create(name="Tomato", unit="", quantity="2", recipe=salad)
+        bump_recipes_generation()
+        # A process's first suggestion builds the matrix, the next ones would use it while it's rebuilt
+        planner._matrix.clear()
+
+        plan = '''
+            query suggestWeekPlan($constraints: WeekPlanConstraintsInputType) {
+                suggestWeekPlan(constraints: $constraints) {
+                    day
+                    time
+                    recipe {
+                        name
+                    }
+                }
+            }
+        '''
+        constraints = {'groupId': str(self.group.id), 'days': ['MONDAY'], 'times': ['BREAKFAST', 'LUNCH', 'DINNER']}
+        res = self.query(
+            plan,
+            op_name='suggestWeekPlan',
+            variables={'constraints': constraints},
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(self.user1)}"}
+        )
+        self.assertResponseNoErrors(res)
+        # Monday's breakfast is already planned
+        self.assertEqual(json.loads(res.content)['data']['suggestWeekPlan'], [
+            {'day': 'MONDAY', 'time': 'LUNCH', 'recipe': {'name': 'Test Recipe 1'}},
+            {'day': 'MONDAY', 'time': 'DINNER', 'recipe': {'name': 'Soup'}},
+        ])
+
+        res = self.query(
+            plan,
+            op_name='suggestWeekPlan',
+            variables={'constraints': constraints},
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(self.user2)}"}
+        )
+        self.assertResponseHasErrors(res)
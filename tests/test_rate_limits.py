@@ -0,0 +1,115 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+
+from aww.models import RateLimitCount, Recipe
+from schema.rate_limits import RateLimited, check_rate_limits
+
+CREATE_RECIPE = '''
+    mutation createRecipe($name: String!) {
+        createRecipe(name: $name) {
+            recipe {
+                name
+            }
+        }
+    }
+'''
+
+TOKEN_AUTH = '''
+    mutation tokenAuth($username: String!, $password: String!) {
+        tokenAuth(username: $username, password: $password) {
+            success
+        }
+    }
+'''
+
+
+@override_settings(
+    RATE_LIMITS={'createRecipe': {'user': (2, 60)}, 'tokenAuth': {'ip': (2, 60)}},
+    RATE_LIMIT_PROXIES=1
+)
+class RateLimitTest(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers = {}
+        for number in range(2):
+            get_user_model().objects.create_user(username=f"user{number}", email=f"rate{number}@test.com", password="testpassword")
+            user = get_user_model().objects.get(username=f"user{number}")
+            self.headers[number] = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"}
+
+    def create_recipe(self, name, user=0):
+        res = self.query(CREATE_RECIPE, op_name='createRecipe', variables={'name': name}, headers=self.headers[user])
+        return json.loads(res.content)
+
+    def test_limit_per_user(self):
+        """
+        Tests that a call over the limit is refused with a typed error without creating anything, and that each user has their own limit
+        """
+        self.assertNotIn('errors', self.create_recipe("First"))
+        self.assertNotIn('errors', self.create_recipe("Second"))
+        content = self.create_recipe("Third")
+        self.assertIsNone(content['data']['createRecipe'])
+        [error] = content['errors']
+        self.assertEqual(error['extensions']['code'], 'RATE_LIMITED')
+        self.assertEqual(error['extensions']['operation'], 'createRecipe')
+        self.assertGreater(error['extensions']['retryAfter'], 0)
+        self.assertFalse(Recipe.objects.filter(name="Third").exists())
+        self.assertNotIn('errors', self.create_recipe("Third", user=1))
+
+    def test_limit_per_ip(self):
+        """
+        Tests that anonymous calls are limited by the IP address the proxy saw, not the one the client claims
+        """
+        def token_auth(forwarded_for):
+            res = self.query(
+                TOKEN_AUTH, op_name='tokenAuth', variables={'username': "user0", 'password': "testpassword"},
+                headers={"HTTP_X_FORWARDED_FOR": forwarded_for}
+            )
+            return json.loads(res.content)
+
+        self.assertTrue(token_auth("10.0.0.1")['data']['tokenAuth']['success'])
+        self.assertTrue(token_auth("1.2.3.4, 10.0.0.1")['data']['tokenAuth']['success'])
+        self.assertEqual(token_auth("5.6.7.8, 10.0.0.1")['errors'][0]['extensions']['code'], 'RATE_LIMITED')
+        self.assertTrue(token_auth("10.0.0.2")['data']['tokenAuth']['success'])
+
+    def test_limit_refills(self):
+        """
+        Tests that calls are allowed again as the previous ones get older than the period
+        """
+        request = RequestFactory().post('/graphql/', REMOTE_ADDR='10.0.0.3')
+        request.user = AnonymousUser()
+        check_rate_limits('tokenAuth', request, now=0)
+        check_rate_limits('tokenAuth', request, now=1)
+        with self.assertRaises(RateLimited):
+            check_rate_limits('tokenAuth', request, now=2)
+        # Half of the previous window is still within the last minute: 1 of its 2 calls
+        check_rate_limits('tokenAuth', request, now=90)
+        with self.assertRaises(RateLimited) as refused:
+            check_rate_limits('tokenAuth', request, now=91)
+        self.assertEqual(refused.exception.extensions['retryAfter'], 29)
+        check_rate_limits('tokenAuth', request, now=120)
+
+    @override_settings(RATE_LIMITS={'tokenAuth': {'ip': (5, 60), 'user': (1, 60)}})
+    def test_limit_queries(self):
+        """
+        Tests that each limit counts a call in a single query, and that a refused call takes back the counts of every limit
+        """
+        request = RequestFactory().post('/graphql/', REMOTE_ADDR='10.0.0.4')
+        request.user = AnonymousUser()
+        with CaptureQueriesContext(connection) as queries:
+            check_rate_limits('tokenAuth', request, now=0)
+        self.assertEqual(len(queries), 2)
+        with CaptureQueriesContext(connection) as queries, self.assertRaises(RateLimited):
+            check_rate_limits('tokenAuth', request, now=1)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(
+            dict(RateLimitCount.objects.values_list('key', 'calls')),
+            {'tokenAuth:user:10.0.0.4:0': 1, 'tokenAuth:ip:10.0.0.4:0': 1}
+        )
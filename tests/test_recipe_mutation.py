@@ -1,11 +1,14 @@
 import json
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 
 from graphene_django.utils.testing import GraphQLTestCase
 from graphql_jwt.shortcuts import get_token
 
 from aww.models import Recipe
+from aww.versioning import bump_version
 
 class RecipeMutationTest(GraphQLTestCase):
     def setUp(self):
@@ -186,4 +189,476 @@ class RecipeMutationTest(GraphQLTestCase):
         with self.assertRaises(Recipe.DoesNotExist):
             Recipe.objects.get(name=recipe_object.name)
         with self.assertRaises(Recipe.DoesNotExist):
-            Recipe.objects.get(name=recipe_object.id)
\ No newline at end of file
+            Recipe.objects.get(name=recipe_object.id)
+
+    def test_history_and_revert(self):
+        update = '''
+            mutation updateRecipe($id: ID!, $name: String, $ingredients: [IngredientInputType!], $steps: [RecipeStepInputType!]) {
+                updateRecipe(id: $id, name: $name, ingredients: $ingredients, steps: $steps) {
+                    recipe {
+                        id
+                    }
+                }
+            }
+        '''
+        res = self.query(
+            update,
+            op_name='updateRecipe',
+            variables={
+                'id': str(self.recipe.id),
+                'ingredients': [{'name': 'Flour', 'quantity': '1', 'unit': 'cup'}],
+                'steps': [{'step': 'Mix'}, {'step': 'Bake'}]
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        res = self.query(
+            update,
+            op_name='updateRecipe',
+            variables={
+                'id': str(self.recipe.id),
+                'name': 'Totally cool renamed recipe',
+                'ingredients': [{'name': 'Flour', 'quantity': '2', 'unit': 'cup'}],
+                'steps': [{'step': 'Mix'}, {'step': 'Rest'}, {'step': 'Bake'}]
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+
+        res_history = self.query(
+            '''
+                query recipeHistory($id: ID!, $first: Int, $after: Int) {
+                    recipeHistory(id: $id, first: $first, after: $after) {
+                        revision
+                        author
+                        delta
+                    }
+                }
+            ''',
+            op_name='recipeHistory',
+            variables={'id': str(self.recipe.id), 'first': 1}
+        )
+        self.assertResponseNoErrors(res_history)
+        history = json.loads(res_history.content)['data']['recipeHistory']
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]['revision'], 2)
+        self.assertEqual(history[0]['author'], self.user.username)
+        # Only the changes are stored: the unchanged step 'Mix' and 'Bake' aren't in the delta
+        delta = json.loads(history[0]['delta'])
+        self.assertEqual(delta['name'], ['Totally cool test recipe', 'Totally cool renamed recipe'])
+        self.assertEqual(delta['ingredients'], {'-': [['Flour', '1', 'cup']], '+': [['Flour', '2', 'cup']]})
+        self.assertEqual(delta['steps'], [[1, 1, [], ['Rest']]])
+
+        res_older = self.query(
+            '''
+                query recipeHistory($id: ID!, $after: Int) {
+                    recipeHistory(id: $id, after: $after) {
+                        revision
+                    }
+                }
+            ''',
+            op_name='recipeHistory',
+            variables={'id': str(self.recipe.id), 'after': 2}
+        )
+        self.assertResponseNoErrors(res_older)
+        self.assertEqual(json.loads(res_older.content)['data']['recipeHistory'], [{'revision': 1}])
+
+        res_revert = self.query(
+            '''
+                mutation revertRecipe($id: ID!, $revision: Int!) {
+                    revertRecipe(id: $id, revision: $revision) {
+                        recipe {
+                            name
+                            ingredients {
+                                quantity
+                            }
+                            steps {
+                                step
+                            }
+                        }
+                    }
+                }
+            ''',
+            op_name='revertRecipe',
+            variables={'id': str(self.recipe.id), 'revision': 1},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_revert)
+        reverted = json.loads(res_revert.content)['data']['revertRecipe']['recipe']
+        self.assertEqual(reverted['name'], 'Totally cool test recipe')
+        self.assertEqual(reverted['ingredients'], [{'quantity': '1'}])
+        self.assertEqual(reverted['steps'], [{'step': 'Mix'}, {'step': 'Bake'}])
+        self.assertEqual(self.recipe.reciperevision_set.count(), 3)
+
+    def test_update_after_concurrent_update(self):
+        """
+        Tests that updates and reverts don't write back what they read before another update committed,
+        i.e. that the recipe is reloaded once its row is locked
+        """
+        update = '''
+            mutation updateRecipe($id: ID!, $servings: Int) {
+                updateRecipe(id: $id, servings: $servings) {
+                    recipe {
+                        name
+                        servings
+                    }
+                }
+            }
+        '''
+        revert = '''
+            mutation revertRecipe($id: ID!, $revision: Int!) {
+                revertRecipe(id: $id, revision: $revision) {
+                    recipe {
+                        name
+                        servings
+                    }
+                }
+            }
+        '''
+
+        def renamed_meanwhile(recipe, expected_version=None):
+            Recipe.objects.filter(id=recipe.id).update(name="Renamed meanwhile")
+            return bump_version(recipe, expected_version)
+
+        with mock.patch('schema.mutations.recipe_mutation.bump_version', side_effect=renamed_meanwhile):
+            res = self.query(update, op_name='updateRecipe', variables={'id': str(self.recipe.id), 'servings': 4}, headers=self.headers)
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['updateRecipe']['recipe'], {'name': "Renamed meanwhile", 'servings': 4})
+        # The revision only has what this update changed
+        self.assertEqual(list(self.recipe.reciperevision_set.get(revision=1).delta), ['servings'])
+
+        res = self.query(update, op_name='updateRecipe', variables={'id': str(self.recipe.id), 'servings': 6}, headers=self.headers)
+        self.assertResponseNoErrors(res)
+        Recipe.objects.filter(id=self.recipe.id).update(name="Totally cool test recipe")
+        with mock.patch('schema.mutations.recipe_mutation.bump_version', side_effect=renamed_meanwhile):
+            res = self.query(revert, op_name='revertRecipe', variables={'id': str(self.recipe.id), 'revision': 1}, headers=self.headers)
+        self.assertResponseNoErrors(res)
+        self.assertEqual(json.loads(res.content)['data']['revertRecipe']['recipe'], {'name': "Renamed meanwhile", 'servings': 4})
+
+    def test_insert_move_and_reorder_steps(self):
+        first = self.recipe.recipestep_set.create(step='Mix')
+        last = self.recipe.recipestep_set.create(step='Bake')
+        steps_query = '''
+            query recipe($id: ID!) {
+                recipe(id: $id) {
+                    steps {
+                        id
+                        step
+                    }
+                }
+            }
+        '''
+
+        res_insert = self.query(
+            '''
+                mutation insertRecipeStep($recipeId: ID!, $step: String!, $after: ID) {
+                    insertRecipeStep(recipeId: $recipeId, step: $step, after: $after) {
+                        step {
+                            id
+                            order
+                        }
+                    }
+                }
+            ''',
+            op_name='insertRecipeStep',
+            variables={'recipeId': str(self.recipe.id), 'step': 'Rest', 'after': str(first.id)},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_insert)
+        inserted = json.loads(res_insert.content)['data']['insertRecipeStep']['step']
+        self.assertEqual(inserted['order'], 3)
+        # The other steps weren't touched
+        first_position, last_position = first.position, last.position
+        first.refresh_from_db()
+        last.refresh_from_db()
+        self.assertEqual((first.position, last.position), (first_position, last_position))
+
+        res = self.query(steps_query, op_name='recipe', variables={'id': str(self.recipe.id)})
+        steps = json.loads(res.content)['data']['recipe']['steps']
+        self.assertEqual([step['step'] for step in steps], ['Mix', 'Rest', 'Bake'])
+
+        res_move = self.query(
+            '''
+                mutation moveRecipeStep($id: ID!, $before: ID) {
+                    moveRecipeStep(id: $id, before: $before) {
+                        recipe {
+                            steps {
+                                step
+                            }
+                        }
+                    }
+                }
+            ''',
+            op_name='moveRecipeStep',
+            variables={'id': str(last.id), 'before': str(first.id)},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_move)
+        moved = json.loads(res_move.content)['data']['moveRecipeStep']['recipe']['steps']
+        self.assertEqual([step['step'] for step in moved], ['Bake', 'Mix', 'Rest'])
+
+        res_reorder = self.query(
+            '''
+                mutation reorderRecipeSteps($recipeId: ID!, $stepIds: [ID!]!) {
+                    reorderRecipeSteps(recipeId: $recipeId, stepIds: $stepIds) {
+                        recipe {
+                            steps {
+                                step
+                            }
+                        }
+                    }
+                }
+            ''',
+            op_name='reorderRecipeSteps',
+            variables={'recipeId': str(self.recipe.id), 'stepIds': [str(first.id), inserted['id'], str(last.id)]},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res_reorder)
+        reordered = json.loads(res_reorder.content)['data']['reorderRecipeSteps']['recipe']['steps']
+        self.assertEqual([step['step'] for step in reordered], ['Mix', 'Rest', 'Bake'])
+
+        res_missing = self.query(
+            '''
+                mutation reorderRecipeSteps($recipeId: ID!, $stepIds: [ID!]!) {
+                    reorderRecipeSteps(recipeId: $recipeId, stepIds: $stepIds) {
+                        recipe {
+                            id
+                        }
+                    }
+                }
+            ''',
+            op_name='reorderRecipeSteps',
+            variables={'recipeId': str(self.recipe.id), 'stepIds': [str(first.id)]},
+            headers=self.headers
+        )
+        self.assertResponseHasErrors(res_missing)
+
+    def test_search_recipes(self):
+        create = '''
+            mutation createRecipe($name: String!, $ingredients: [IngredientInputType], $steps: [RecipeStepInputType]) {
+                createRecipe(name: $name, ingredients: $ingredients, steps: $steps) {
+                    recipe {
+                        id
+                    }
+                }
+            }
+        '''
+        for name, ingredient, step in [
+            ('Tomato soup', 'Tomatoes', 'Simmer the tomatoes'),
+            ('Pancakes', 'Flour', 'Fry the batter'),
+            ('Bruschetta', 'Bread', 'Top the bread with chopped tomato'),
+        ]:
+            res = self.query(
+                create,
+                op_name='createRecipe',
+                variables={
+                    'name': name,
+                    'ingredients': [{'name': ingredient, 'quantity': '1', 'unit': 'cup'}],
+                    'steps': [{'step': step}]
+                },
+                headers=self.headers
+            )
+            self.assertResponseNoErrors(res)
+
+        search = '''
+            query searchRecipes($query: String!, $first: Int, $after: Int) {
+                searchRecipes(query: $query, first: $first, after: $after) {
+                    name
+                }
+            }
+        '''
+        res = self.query(search, op_name='searchRecipes', variables={'query': 'tomato'})
+        self.assertResponseNoErrors(res)
+        # A match in the name/ingredients ranks above a match in the steps only
+        names = [recipe['name'] for recipe in json.loads(res.content)['data']['searchRecipes']]
+        self.assertEqual(names, ['Tomato soup', 'Bruschetta'])
+
+        res = self.query(search, op_name='searchRecipes', variables={'query': 'tomato', 'first': 1, 'after': 1})
+        names = [recipe['name'] for recipe in json.loads(res.content)['data']['searchRecipes']]
+        self.assertEqual(names, ['Bruschetta'])
+
+        # The search is updated when the recipe is
+        pancakes = Recipe.objects.get(name='Pancakes')
+        res = self.query(
+            '''
+                mutation updateRecipe($id: ID!, $steps: [RecipeStepInputType!]) {
+                    updateRecipe(id: $id, steps: $steps) {
+                        recipe {
+                            id
+                        }
+                    }
+                }
+            ''',
+            op_name='updateRecipe',
+            variables={'id': str(pancakes.id), 'steps': [{'step': 'Serve with stewed tomatoes'}]},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        res = self.query(search, op_name='searchRecipes', variables={'query': 'tomatoes -bread'})
+        names = [recipe['name'] for recipe in json.loads(res.content)['data']['searchRecipes']]
+        self.assertCountEqual(names, ['Tomato soup', 'Pancakes'])
+
+        Recipe.objects.filter(name='Tomato soup').soft_delete()
+        res = self.query(search, op_name='searchRecipes', variables={'query': 'tomato'})
+        names = [recipe['name'] for recipe in json.loads(res.content)['data']['searchRecipes']]
+        # Both only match in their steps: ts_rank ties them and they're ordered by name,
+        # bm25 (SQLite) ranks the shorter steps first
+        if connection.vendor == 'postgresql':
+            self.assertEqual(names, ['Bruschetta', 'Pancakes'])
+        else:
+            self.assertCountEqual(names, ['Bruschetta', 'Pancakes'])
+
+    def test_recipes_by_ingredients(self):
+        create = '''
+            mutation createRecipe($name: String!, $ingredients: [IngredientInputType]) {
+                createRecipe(name: $name, ingredients: $ingredients) {
+                    recipe {
+                        id
+                    }
+                }
+            }
+        '''
+        for name, ingredients in [
+            ('Chicken and rice', ['Boneless chicken breasts', 'Rice']),
+            ('Chicken curry', ['Chicken thighs', 'Rice', 'Curry paste', 'Coconut milk']),
+            ('Fried rice', ['Rice', 'Eggs', 'Peas']),
+            ('Pancakes', ['Flour', 'Eggs', 'Milk']),
+        ]:
+            res = self.query(
+                create,
+                op_name='createRecipe',
+                variables={
+                    'name': name,
+                    'ingredients': [{'name': ing, 'quantity': '1', 'unit': 'cup'} for ing in ingredients]
+                },
+                headers=self.headers
+            )
+            self.assertResponseNoErrors(res)
+
+        query = '''
+            query recipesByIngredients($have: [String!]!, $minMatch: Int) {
+                recipesByIngredients(have: $have, minMatch: $minMatch) {
+                    recipe {
+                        name
+                    }
+                    matched
+                    total
+                    coverage
+                    missing
+                }
+            }
+        '''
+        res = self.query(query, op_name='recipesByIngredients', variables={'have': ['chicken', 'rice']})
+        self.assertResponseNoErrors(res)
+        matches = json.loads(res.content)['data']['recipesByIngredients']
+        self.assertEqual(
+            [(match['recipe']['name'], match['matched'], match['total']) for match in matches],
+            [('Chicken and rice', 2, 2), ('Chicken curry', 2, 4), ('Fried rice', 1, 3)]
+        )
+        self.assertEqual(matches[0]['coverage'], 1.0)
+        self.assertEqual(matches[1]['missing'], ['Coconut milk', 'Curry paste'])
+
+        res = self.query(query, op_name='recipesByIngredients', variables={'have': ['chicken', 'rice'], 'minMatch': 2})
+        matches = json.loads(res.content)['data']['recipesByIngredients']
+        self.assertEqual([match['recipe']['name'] for match in matches], ['Chicken and rice', 'Chicken curry'])
+
+        # "chicken breast" doesn't cover the chicken thighs of the curry
+        res = self.query(query, op_name='recipesByIngredients', variables={'have': ['chicken breast', 'egg']})
+        matches = json.loads(res.content)['data']['recipesByIngredients']
+        self.assertEqual(
+            [match['recipe']['name'] for match in matches], ['Chicken and rice', 'Fried rice', 'Pancakes'])
+
+    def test_scaled_ingredients(self):
+        res = self.query(
+            '''
+                mutation createRecipe($name: String!, $servings: Int, $ingredients: [IngredientInputType]) {
+                    createRecipe(name: $name, servings: $servings, ingredients: $ingredients) {
+                        recipe {
+                            id
+                            servings
+                        }
+                    }
+                }
+            ''',
+            op_name='createRecipe',
+            variables={
+                'name': 'Scaled soup',
+                'servings': 2,
+                'ingredients': [
+                    {'name': 'Butter', 'quantity': '2', 'unit': 'tbsp'},
+                    {'name': 'Water', 'quantity': '500', 'unit': 'ml'},
+                    {'name': 'Salt', 'quantity': 'a pinch', 'unit': ''},
+                ]
+            },
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        recipe = json.loads(res.content)['data']['createRecipe']['recipe']
+        self.assertEqual(recipe['servings'], 2)
+
+        scaled = '''
+            query recipe($id: ID!, $servings: Int, $scale: Float) {
+                recipe(id: $id) {
+                    ingredients(servings: $servings, scale: $scale) {
+                        name
+                        quantity
+                        unit
+                    }
+                }
+            }
+        '''
+        res = self.query(scaled, op_name='recipe', variables={'id': recipe['id'], 'servings': 4})
+        self.assertResponseNoErrors(res)
+        self.assertCountEqual(
+            [(ing['quantity'], ing['unit']) for ing in json.loads(res.content)['data']['recipe']['ingredients']],
+            [('1/4', 'cup'), ('1', 'l'), ('a pinch', '')]
+        )
+        res = self.query(scaled, op_name='recipe', variables={'id': recipe['id'], 'scale': 0.5})
+        self.assertResponseNoErrors(res)
+        self.assertCountEqual(
+            [(ing['quantity'], ing['unit']) for ing in json.loads(res.content)['data']['recipe']['ingredients']],
+            [('1', 'tbsp'), ('250', 'ml'), ('a pinch', '')]
+        )
+        res = self.query(scaled, op_name='recipe', variables={'id': recipe['id'], 'servings': 4, 'scale': 2})
+        self.assertResponseHasErrors(res)
+
+    def test_import_recipes_needs_superuser(self):
+        res = self.query(
+            '''
+                mutation importRecipes($data: String!) {
+                    importRecipes(data: $data) {
+                        created
+                    }
+                }
+            ''',
+            op_name='importRecipes',
+            variables={'data': '{"name": "Imported recipe"}'},
+            headers=self.headers
+        )
+        self.assertResponseHasErrors(res)
+        self.assertFalse(Recipe.objects.filter(name="Imported recipe").exists())
+
+    def test_import_recipes(self):
+        get_user_model().objects.create_superuser(username="Test Superuser", email="importsuperuser@test.com", password="testpassword")
+        superuser = get_user_model().objects.get(email="importsuperuser@test.com")
+        res = self.query(
+            '''
+                mutation importRecipes($data: String!, $format: ImportFormat) {
+                    importRecipes(data: $data, format: $format) {
+                        created
+                        skipped
+                        errors
+                    }
+                }
+            ''',
+            op_name='importRecipes',
+            variables={'data': 'name,steps\nImported recipe,Cook\nTotally cool test recipe,\n', 'format': 'CSV'},
+            headers={"HTTP_AUTHORIZATION": f"JWT {get_token(superuser)}"}
+        )
+        self.assertResponseNoErrors(res)
+        self.assertEqual(
+            json.loads(res.content)['data']['importRecipes'], {'created': 1, 'skipped': 1, 'errors': []}
+        )
+        recipe = Recipe.objects.get(name="Imported recipe")
+        self.assertEqual(recipe.recipestep_set.get().step, "Cook")
+        self.assertEqual(recipe.reciperevision_set.get().author, superuser)
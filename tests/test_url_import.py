@@ -0,0 +1,215 @@
+import json
+import os
+import socket
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+
+from aww.models import Recipe
+from aww import web_import
+from aww.web_import import FetchError, Page, check_public, http_fetch, import_from_urls
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'recipe_pages')
+fetched = []
+# What the test hosts resolve to, other hosts (IP addresses) are resolved as usual
+HOSTS = {'recipes.example.com': '93.184.216.34', 'intranet.example.com': '10.0.0.5'}
+getaddrinfo = socket.getaddrinfo
+
+
+def fixture_fetch(url, etag=None):
+    """Serves https://recipes.example.com/<name> from fixtures/recipe_pages/<name>, with the name as ETag"""
+    name = url.rsplit('/', 1)[-1]
+    fetched.append((name, etag))
+    path = os.path.join(FIXTURES, name)
+    if not os.path.exists(path):
+        raise FetchError("The site answered 404")
+    if etag == f'"{name}"':
+        return Page(304, etag=etag)
+    with open(path, encoding='utf-8') as page:
+        return Page(200, page.read(), f'"{name}"')
+
+
+def fake_getaddrinfo(host, port, *args, **kwargs):
+    return getaddrinfo(HOSTS.get(host, host), port, *args, **kwargs)
+
+
+def redirect(location):
+    response = mock.MagicMock(is_redirect=True, headers={'Location': location})
+    response.__enter__.return_value = response
+    return response
+
+
+IMPORT = '''
+    mutation importRecipeFromUrl($urls: [String!]!) {
+        importRecipeFromUrl(urls: $urls) {
+            results {
+                url
+                error
+                cached
+                recipe {
+                    name
+                    photo
+                    servings
+                    ingredients {
+                        name
+                        quantity
+                        unit
+                    }
+                    steps {
+                        step
+                    }
+                }
+            }
+        }
+    }
+'''
+
+
+class UrlImportTest(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username="Test User", email="urlimport@test.com", password="testpassword")
+        self.user = get_user_model().objects.get(email="urlimport@test.com")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.cache = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            RECIPE_PAGE_FETCHER='tests.test_url_import.fixture_fetch', RECIPE_PAGE_CACHE_DIR=self.cache.name
+        )
+        self.settings.enable()
+        fetched.clear()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.cache.cleanup()
+        super().tearDown()
+
+    def import_urls(self, *names):
+        res = self.query(
+            IMPORT,
+            op_name='importRecipeFromUrl',
+            variables={'urls': [f"https://recipes.example.com/{name}" for name in names]},
+            headers=self.headers
+        )
+        self.assertResponseNoErrors(res)
+        return json.loads(res.content)['data']['importRecipeFromUrl']['results']
+
+    def test_import_needs_authentication(self):
+        res = self.query(IMPORT, op_name='importRecipeFromUrl', variables={'urls': ["https://recipes.example.com/soup.html"]})
+        self.assertResponseHasErrors(res)
+        self.assertEqual(fetched, [])
+
+    def test_import_from_url(self):
+        pancakes, soup, about, missing = self.import_urls('pancakes.html', 'soup.html', 'about.html', 'missing.html')
+
+        self.assertIsNone(pancakes['error'])
+        self.assertFalse(pancakes['cached'])
+        self.assertEqual(pancakes['recipe']['name'], "Fluffy Pancakes")
+        self.assertEqual(pancakes['recipe']['photo'], "https://recipes.example.com/pancakes.jpg")
+        self.assertEqual(pancakes['recipe']['servings'], 4)
+        self.assertCountEqual(
+            [(ing['name'], ing['quantity'], ing['unit']) for ing in pancakes['recipe']['ingredients']],
+            [("all-purpose flour, sifted", "2 1/2", "cups"), ("eggs", "2", ""), ("milk & cream", "1", "cup")]
+        )
+        self.assertEqual(
+            [step['step'] for step in pancakes['recipe']['steps']],
+            ["Whisk the flour and the eggs.", "Add the milk little by little.", "Fry in a hot pan."]
+        )
+        self.assertEqual(soup['recipe']['servings'], 6)
+        self.assertEqual([step['step'] for step in soup['recipe']['steps']], ["Boil the carrots in the stock.", "Blend."])
+        self.assertEqual((about['recipe'], about['error']), (None, "No recipe found on the page"))
+        self.assertIsNone(missing['recipe'])
+        self.assertIn("404", missing['error'])
+
+    def test_import_again(self):
+        """
+        A URL that's already a recipe isn't fetched, a page that was read before is only revalidated with its ETag
+        """
+        self.import_urls('pancakes.html', 'about.html')
+        fetched.clear()
+        pancakes, about = self.import_urls('pancakes.html', 'about.html')
+        self.assertTrue(pancakes['cached'])
+        self.assertEqual(pancakes['recipe']['name'], "Fluffy Pancakes")
+        self.assertTrue(about['cached'])
+        self.assertEqual(fetched, [('about.html', '"about.html"')])
+
+        Recipe.objects.filter(name="Fluffy Pancakes").soft_delete()
+        fetched.clear()
+        [pancakes] = self.import_urls('pancakes.html')
+        self.assertTrue(pancakes['cached'])
+        self.assertEqual(pancakes['recipe']['name'], "Fluffy Pancakes")
+        self.assertEqual(fetched, [('pancakes.html', '"pancakes.html"')])
+        self.assertEqual(Recipe.objects.filter(name="Fluffy Pancakes").count(), 1)
+
+    def test_invalid_url(self):
+        res = self.query(
+            IMPORT, op_name='importRecipeFromUrl', variables={'urls': ["file:///etc/passwd"]}, headers=self.headers
+        )
+        self.assertResponseHasErrors(res)
+        self.assertEqual(fetched, [])
+
+
+@mock.patch('aww.web_import.socket.getaddrinfo', fake_getaddrinfo)
+class HttpFetchTest(TestCase):
+    def test_only_public_addresses(self):
+        """
+        Tests that the pages can only be fetched from public addresses, whatever the host name
+        """
+        check_public("https://recipes.example.com/soup.html")
+        for url in [
+            "http://127.0.0.1:8000/admin/",
+            "http://[::1]/",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://192.168.1.1/",
+            "http://[::ffff:10.0.0.1]/",
+            "https://intranet.example.com/",
+            "ftp://recipes.example.com/soup.html",
+        ]:
+            with self.subTest(url=url), self.assertRaises(FetchError):
+                check_public(url)
+
+    def test_redirects_are_checked(self):
+        """
+        Tests that a redirect to an address that isn't public isn't followed
+        """
+        with mock.patch('aww.web_import.requests.get', return_value=redirect("http://169.254.169.254/latest/meta-data/")) as get:
+            with self.assertRaisesMessage(FetchError, "The address is not allowed"):
+                http_fetch("https://recipes.example.com/soup.html")
+        self.assertEqual(get.call_count, 1)
+        self.assertFalse(get.call_args.kwargs['allow_redirects'])
+
+        with mock.patch('aww.web_import.requests.get', return_value=redirect("/again")) as get:
+            with self.assertRaisesMessage(FetchError, "The page redirects too many times"):
+                http_fetch("https://recipes.example.com/soup.html")
+        self.assertEqual(get.call_count, web_import.MAX_REDIRECTS + 1)
+
+    def test_errors_are_not_shown(self):
+        """
+        Tests that only the FetchError messages reach the user
+        """
+        def fetcher(url, etag=None):
+            raise ConnectionError("Connection to 10.0.0.5:5432 refused")
+
+        with tempfile.TemporaryDirectory() as directory:
+            [page] = import_from_urls(
+                ["https://recipes.example.com/soup.html"], fetcher=fetcher, cache=web_import.PageCache(directory)
+            )
+        self.assertEqual(page.error, "Could not fetch the page")
+
+    def test_broken_parser_pool_is_replaced(self):
+        """
+        Tests that a pool whose process died is replaced rather than failing every import after it
+        """
+        broken = mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool))
+        with mock.patch('aww.web_import._parsers', broken):
+            pool, parse = web_import._parse('<script type="application/ld+json">{"@type": "Recipe", "name": "Soup"}</script>')
+            self.assertIsNot(pool, broken)
+            self.assertIs(web_import._parsers, pool)
+            self.assertEqual(parse.result()['name'], "Soup")
+        broken.shutdown.assert_called_once_with(wait=False)
+        pool.shutdown()
@@ -0,0 +1,57 @@
+import hashlib
+import sys
+
+import numpy as np
+
+# A set of strings kept as 64 bit fingerprints (blake2b of the string) in a sorted NumPy array:
+# 8 bytes a string whatever its length, looked up with a binary search (searchsorted).
+# The strings added since the array was built are kept in a Python set, merged into the array
+# once there are MERGE_SIZE of them, so adding one doesn't copy the array.
+# A string that was added is always found. One that wasn't is found if its fingerprint is the same
+# as one of the n that were, which happens with probability n / 2^64 (false_positive_rate):
+# about 5e-14 for a million strings.
+MERGE_SIZE = 1024
+# What a Python int of 64 bits costs in the set of recent fingerprints, on top of the set's own table
+INT_BYTES = sys.getsizeof(2 ** 63)
+
+
+def fingerprint(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+
+class FingerprintSet:
+    def __init__(self, texts=()):
+        self._sorted = np.unique(np.fromiter((fingerprint(text) for text in texts), dtype=np.uint64))
+        self._recent = set()
+
+    def _has(self, value):
+        if value in self._recent:
+            return True
+        fingerprints = self._sorted
+        i = int(np.searchsorted(fingerprints, np.uint64(value)))
+        return i < len(fingerprints) and int(fingerprints[i]) == value
+
+    def add(self, text):
+        value = fingerprint(text)
+        if self._has(value):
+            return
+        self._recent.add(value)
+        if len(self._recent) >= MERGE_SIZE:
+            self._sorted = np.union1d(self._sorted, np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent)))
+            self._recent = set()
+
+    def __contains__(self, text):
+        return self._has(fingerprint(text))
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    @property
+    def nbytes(self):
+        """Memory taken by the fingerprints"""
+        return self._sorted.nbytes + sys.getsizeof(self._recent) + INT_BYTES * len(self._recent)
+
+    @property
+    def false_positive_rate(self):
+        """Probability that a string that wasn't added is found"""
+        return len(self) / 2 ** 64
@@ -0,0 +1,64 @@
+# Keys that sort lexicographically and always leave room for another key in between,
+# so an item can be put between two others without renumbering the rest.
+# A key is read as the digits of a fraction between 0 and 1 ("i" ~ 0.5, "9" ~ 0.25, "ii" ~ 0.51...)
+# Only digits and lowercase letters are used so that the keys sort the same
+# in every database collation, and keys never end in the zero digit so each fraction has one key.
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+# Past this length, the whole list should be spread out again (c.f. spread_keys)
+MAX_KEY_LENGTH = 24
+
+
+def _midpoint(a, b):
+    # a is '' for the start of the list, b is None for the end of the list
+    if b is not None:
+        # Strip the common prefix: the midpoint shares it
+        n = 0
+        while (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    # The first digits are consecutive, so the midpoint needs another digit
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(a=None, b=None):
+    """Returns a key that sorts after a and before b, None meaning the start/end of the list"""
+    a = a or ''
+    if b is not None and a >= b:
+        raise ValueError(f"Cannot make a key between {a!r} and {b!r}")
+    if a.endswith(DIGITS[0]) or (b is not None and b.endswith(DIGITS[0])):
+        raise ValueError("Keys cannot end with the zero digit")
+    return _midpoint(a, b)
+
+
+def keys_between(a, b, n):
+    """Returns n sorted keys between a and b, bisecting so they stay as short as possible"""
+    if n == 0:
+        return []
+    middle = key_between(a, b)
+    half = n // 2
+    return keys_between(a, middle, half) + [middle] + keys_between(middle, b, n - half - 1)
+
+
+def spread_keys(n):
+    """Returns n evenly spaced keys of the same length, used to rebalance a whole list"""
+    width = 1
+    # Keep at least a whole digit of room between two consecutive keys
+    while BASE ** width < (n + 1) * BASE:
+        width += 1
+    keys = []
+    for i in range(1, n + 1):
+        value = i * BASE ** width // (n + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append(''.join(reversed(digits)).rstrip(DIGITS[0]))
+    return keys
@@ -0,0 +1,99 @@
+import re
+
+from .quantities import UNICODE_FRACTIONS
+from .units import ALIASES, CONVERSIONS
+
+# Splits free text ingredient lines ("2 1/2 cups all-purpose flour, sifted") into
+# (name, quantity, unit) = ("all-purpose flour, sifted", "2 1/2", "cups"), the quantity and unit
+# being kept as written so parse_amount (c.f. units.py) reads them like the ones that were typed in.
+# The quantity is read by a single regular expression compiled once, the unit by looking the next
+# one or two words up in a set of every spelling of every unit, so a line costs a match and a couple
+# of set lookups whatever the size of the lexicon. A line the parser can't read is all name.
+FRACTIONS = ''.join(UNICODE_FRACTIONS)
+NUMBER = rf'(?:\d+(?:\.\d+)?(?:\s*/\s*\d+)?|[{FRACTIONS}])'
+# "2", "2 1/2", "1½", "1 ½", "1.5", "2-3", "2 to 3", optionally glued to the unit ("200g")
+QUANTITY = re.compile(
+    rf'\s*(?P<quantity>(?:\d+\s*(?=[{FRACTIONS}])|\d+\s+(?=\d+\s*/))?{NUMBER}(?:\s*(?:-|–|to)\s*{NUMBER})?)'
+    rf'(?![\d/])'
+)
+ARTICLE = re.compile(r'\s*(?:a|an|one)\s+(?=\S)', re.IGNORECASE)
+PARENTHESES = re.compile(r'\s*(\([^)]*\))')
+WORDS = re.compile(r"\s*([^\W\d_][\w.'-]*)(?:\s+([^\W\d_][\w.'-]*))?")
+OF = re.compile(r'\s*of\s+', re.IGNORECASE)
+# Units that can't be converted but are still units, not part of the name
+COUNT_UNITS = {
+    'clove', 'can', 'tin', 'jar', 'bottle', 'bag', 'box', 'package', 'pkg', 'packet', 'pack', 'envelope',
+    'pinch', 'dash', 'drop', 'splash', 'handful', 'bunch', 'sprig', 'stalk', 'stick', 'slice', 'piece',
+    'head', 'sheet', 'cube', 'fillet', 'scoop', 'knob', 'leaf',
+}
+
+
+def _spellings():
+    units = set(CONVERSIONS) | set(ALIASES) | COUNT_UNITS
+    spellings = set()
+    for unit in units:
+        spellings.update({unit, unit + 's', unit + 'es'})
+        if unit.endswith('f'):
+            spellings.add(unit[:-1] + 'ves')
+        if unit.endswith('y'):
+            spellings.add(unit[:-1] + 'ies')
+    # "fluid ounces", "fl ozs"...
+    spellings.update({'fluid ounces', 'fl ozs', 'fl. ozs'})
+    return frozenset(spellings)
+
+
+UNITS = _spellings()
+MAX_NAME_LENGTH = 100
+MAX_QUANTITY_LENGTH = 100
+MAX_UNIT_LENGTH = 50
+
+
+def _unit(text, position):
+    """Returns (unit, position after it), the unit being one or two words as written, or ('', position)"""
+    match = WORDS.match(text, position)
+    if match is None:
+        return '', position
+    first, second = match.group(1), match.group(2)
+    if second and f"{first} {second}".lower().rstrip('.') in UNITS:
+        return f"{first} {second}", match.end()
+    if first.lower().rstrip('.') in UNITS:
+        return first, match.end(1)
+    return '', position
+
+
+def parse_line(line):
+    """Returns (name, quantity, unit) of a free text ingredient line, unit and quantity being '' if there's none"""
+    line = ' '.join(line.split())
+    quantity = ''
+    match = QUANTITY.match(line)
+    if match:
+        quantity, position = match.group('quantity'), match.end()
+    else:
+        article = ARTICLE.match(line)
+        position = article.end() if article else 0
+    parentheses = PARENTHESES.match(line, position)
+    if parentheses:
+        position = parentheses.end()
+    unit, after = _unit(line, position)
+    # "a" is only one of something if there's a unit ("a pinch of salt", but "a few eggs")
+    if not quantity and not unit:
+        position = 0
+    elif not quantity:
+        quantity = '1'
+    if unit:
+        position = after
+        of = OF.match(line, position)
+        if of:
+            position = of.end()
+    name = line[position:].strip(' ,;:-')
+    if parentheses and position >= parentheses.end():
+        name = f"{name} {parentheses.group(1)}"
+    # Only a quantity and/or unit, i.e. "2 cups": it's still something, so it's all name
+    if not name:
+        return line[:MAX_NAME_LENGTH], '', ''
+    return name[:MAX_NAME_LENGTH], quantity[:MAX_QUANTITY_LENGTH], unit[:MAX_UNIT_LENGTH]
+
+
+def parse_lines(lines):
+    """parse_line of every line that isn't blank"""
+    return [parse_line(line) for line in lines if line.strip()]
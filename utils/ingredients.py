@@ -0,0 +1,38 @@
+import re
+
+# Turns the free text name of an ingredient into the words that say what it is,
+# so "2 large Tomatoes, diced" and "tomato" both become ["tomato"]
+WORD = re.compile(r"[a-z]+")
+# Words that say how an ingredient is cut, cooked or bought rather than what it is
+DESCRIPTORS = {
+    'a', 'an', 'and', 'or', 'of', 'the', 'to', 'for', 'with', 'into', 'in', 'taste', 'optional',
+    'fresh', 'freshly', 'large', 'small', 'medium', 'big', 'whole', 'raw', 'cooked', 'frozen',
+    'canned', 'dried', 'chopped', 'diced', 'minced', 'sliced', 'grated', 'shredded', 'crushed',
+    'peeled', 'finely', 'roughly', 'thinly', 'boneless', 'skinless', 'ripe', 'softened', 'melted',
+    'beaten', 'room', 'temperature', 'cup', 'cups', 'tbsp', 'tsp', 'g', 'kg', 'ml', 'oz', 'lb',
+}
+MAX_TOKEN_LENGTH = 50
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def ingredient_tokens(name):
+    """Returns the sorted, distinct tokens of an ingredient's name"""
+    return sorted({
+        singular(word)[:MAX_TOKEN_LENGTH]
+        for word in WORD.findall(name.lower())
+        if word not in DESCRIPTORS and len(word) > 1
+    })
+
+
+def ingredient_key(name):
+    """The name ingredients are merged by, "Tomatoes, diced" and "tomato" having the same key"""
+    return ' '.join(ingredient_tokens(name)) or name.strip().lower()
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+
+# Picks a row of a recipes x ingredients matrix (c.f. similarity.py) for each open meal slot so that
+# all the meals together need as few distinct ingredients as possible (the shortest shopping list).
+# A recipe costs the ingredients it adds to the ones already needed, the ties going to the recipe that reuses
+# the most of them, then to the one whose ingredients the most recipes use (so later picks can reuse them).
+# Every cost is computed for all the rows at once: how many of the needed ingredients each row uses
+# is kept up to date by only walking the columns of the ingredients that start/stop being needed.
+# The greedy picks are then improved by replacing one meal at a time with the best recipe given the other meals,
+# until no replacement makes the list shorter or the time budget is spent.
+
+
+def _best(candidates, added, overlap, popularity):
+    rows = np.nonzero(candidates)[0]
+    rows = rows[added[rows] == added[rows].min()]
+    rows = rows[overlap[rows] == overlap[rows].max()]
+    return int(rows[np.argmax(popularity[rows])])
+
+
+class _Plan:
+    def __init__(self, matrix, planned):
+        self.matrix = matrix
+        # How many meals need each ingredient, and how many of the needed ingredients each row uses
+        self.usage = np.zeros(matrix.n_columns, dtype=np.int64)
+        self.overlap = np.zeros(matrix.n_rows, dtype=np.int64)
+        self.repeats = np.zeros(matrix.n_rows, dtype=np.int64)
+        for row in planned:
+            self.add(row)
+
+    def added(self):
+        return self.matrix.sizes - self.overlap
+
+    def add(self, row):
+        columns = self.matrix.columns_of(row)
+        self.overlap += self.matrix.overlaps(columns[self.usage[columns] == 0])
+        self.usage[columns] += 1
+        self.repeats[row] += 1
+
+    def remove(self, row):
+        columns = self.matrix.columns_of(row)
+        self.usage[columns] -= 1
+        self.overlap -= self.matrix.overlaps(columns[self.usage[columns] == 0])
+        self.repeats[row] -= 1
+
+
+def plan_rows(matrix, slots, planned=(), allowed=None, max_repeats=1, budget=0.2):
+    """
+    Returns a row for each of the slots (None if no row can be picked anymore), planned being the rows of the meals
+    that are already planned and allowed a boolean mask of the rows that can be picked. Rows without columns aren't
+    picked since nothing tells whether they'd make the list longer.
+    """
+    deadline = time.monotonic() + budget
+    allowed = np.ones(matrix.n_rows, dtype=bool) if allowed is None else np.array(allowed, dtype=bool)
+    allowed &= matrix.sizes > 0
+    frequencies = np.diff(matrix.column_indptr)
+    popularity = np.bincount(
+        np.repeat(np.arange(matrix.n_rows), matrix.sizes), weights=frequencies[matrix.row_columns], minlength=matrix.n_rows
+    )
+    plan = _Plan(matrix, planned)
+
+    picks = []
+    for _ in slots:
+        candidates = allowed & (plan.repeats < max_repeats)
+        if not candidates.any():
+            picks.append(None)
+            continue
+        row = _best(candidates, plan.added(), plan.overlap, popularity)
+        plan.add(row)
+        picks.append(row)
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i, row in enumerate(picks):
+            if row is None or time.monotonic() >= deadline:
+                continue
+            plan.remove(row)
+            # row itself is a candidate again, so the best is at least as good
+            best = _best(allowed & (plan.repeats < max_repeats), plan.added(), plan.overlap, popularity)
+            # Only a strictly shorter list counts, so the search always ends
+            if plan.added()[best] < plan.added()[row]:
+                picks[i] = row = best
+                improved = True
+            plan.add(row)
+    return picks
@@ -0,0 +1,78 @@
+import bisect
+import unicodedata
+
+# Sorted arrays of (folded text, key) searched with bisect, so the keys whose text starts with a prefix
+# are found in O(log n + limit) without looking at the other texts.
+# Every word of a text can be typed first ("tom" finds "Cherry tomatoes"), the texts that start
+# with the prefix coming before the ones where a later word does.
+# An item can be found by other spellings than the text it shows (i.e. every alias of an ingredient).
+
+
+def fold(text):
+    """Lowercased, without accents and with single spaces: "Jalapeño  Poppers" -> "jalapeno poppers" """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def later_words(folded):
+    """The folded text from each of its words after the first: "a b c" -> ["b c", "c"]"""
+    return [folded[i + 1:] for i, c in enumerate(folded) if c == ' ']
+
+
+def _remove(entries, entry):
+    i = bisect.bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class PrefixIndex:
+    def __init__(self, items=()):
+        self.texts = {}
+        self.spellings = {}
+        self.starts = []
+        self.words = []
+        # Sorted once rather than inserting the items one by one
+        for key, text, *spellings in items:
+            for folded in self._keep(key, text, *spellings):
+                self.starts.append((folded, key))
+                self.words.extend((word, key) for word in later_words(folded))
+        self.starts.sort()
+        self.words.sort()
+
+    def _keep(self, key, text, spellings=None):
+        """Keeps the text key shows, returns the folded spellings it's found by (the text by default)"""
+        self.texts[key] = text
+        self.spellings[key] = sorted({fold(spelling) for spelling in spellings or [text]})
+        return self.spellings[key]
+
+    def add(self, key, text, spellings=None):
+        if key in self.texts:
+            self.remove(key)
+        for folded in self._keep(key, text, spellings):
+            bisect.insort(self.starts, (folded, key))
+            for word in later_words(folded):
+                bisect.insort(self.words, (word, key))
+
+    def remove(self, key):
+        self.texts.pop(key, None)
+        for folded in self.spellings.pop(key, []):
+            _remove(self.starts, (folded, key))
+            for word in later_words(folded):
+                _remove(self.words, (word, key))
+
+    def search(self, prefix, limit=10):
+        """Returns up to limit (key, text) pairs whose text starts with prefix, then those with a word that does"""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        for entries in (self.starts, self.words):
+            i = bisect.bisect_left(entries, (prefix,))
+            while i < len(entries) and len(found) < limit and entries[i][0].startswith(prefix):
+                key = entries[i][1]
+                if key not in seen:
+                    seen.add(key)
+                    found.append((key, self.texts[key]))
+                i += 1
+        return found
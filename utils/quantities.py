@@ -0,0 +1,90 @@
+import re
+from fractions import Fraction
+
+# Quantities are free text ("1", "1.5", "1/2", "1 1/2", "½", "2-3", "a pinch")
+# They're read as exact fractions so that summing them doesn't drift (1/3 + 1/3 + 1/3 == 1)
+UNICODE_FRACTIONS = {
+    '¼': Fraction(1, 4), '½': Fraction(1, 2), '¾': Fraction(3, 4),
+    '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '⅛': Fraction(1, 8),
+}
+NUMBER = r'\d+(?:\.\d+)?'
+QUANTITY = re.compile(
+    rf'^(?:(?P<whole>\d+)\s+)?(?P<number>{NUMBER}(?:\s*/\s*\d+)?)(?:\s*(?:-|to)\s*(?P<upper>{NUMBER}(?:\s*/\s*\d+)?))?$'
+)
+
+
+def _number(text):
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        if int(denominator) == 0:
+            raise ValueError("Division by zero")
+        return Fraction(numerator.strip()) / int(denominator)
+    return Fraction(text)
+
+
+def parse_quantity(text):
+    """Returns the quantity as a Fraction, the upper end for a range, or None if it isn't a number"""
+    text = text.strip()
+    for symbol, value in UNICODE_FRACTIONS.items():
+        if symbol in text:
+            whole = text.replace(symbol, '').strip()
+            if not whole:
+                return value
+            if whole.isdigit():
+                return int(whole) + value
+            return None
+    match = QUANTITY.match(text)
+    if match is None:
+        return None
+    try:
+        if match.group('upper'):
+            return _number(match.group('upper'))
+        value = _number(match.group('number'))
+    except ValueError:
+        return None
+    if match.group('whole'):
+        value += int(match.group('whole'))
+    return value
+
+
+def format_quantity(value):
+    """1 -> "1", 3/2 -> "1 1/2", 0.1234 -> "0.12" """
+    if value.denominator == 1:
+        return str(value.numerator)
+    if value.denominator in (2, 3, 4, 8):
+        whole, rest = divmod(value.numerator, value.denominator)
+        fraction = f"{rest}/{value.denominator}"
+        return f"{whole} {fraction}" if whole else fraction
+    return f"{float(value):.2f}".rstrip('0').rstrip('.')
+
+
+def format_amount(amount, fractions=True):
+    """
+    Formats a Decimal amount, amounts like 0.3333 (i.e. from a conversion) being read as 1/3
+    unless fractions is False (for metric units), 1.5 staying 1.5
+    """
+    value = Fraction(amount)
+    if not fractions:
+        return f"{float(value):.2f}".rstrip('0').rstrip('.')
+    close = value.limit_denominator(8)
+    if abs(close - value) < Fraction(1, 1000):
+        value = close
+    return format_quantity(value)
+
+
+def sum_quantities(quantities):
+    """
+    Sums the quantities that are numbers, the ones that aren't (i.e. "a pinch") are kept
+    as they are, without duplicates, after the sum: ["1", "1/2", "a pinch"] -> "1 1/2 + a pinch"
+    """
+    total = None
+    others = []
+    for quantity in quantities:
+        value = parse_quantity(quantity)
+        if value is None:
+            if quantity.strip() and quantity.strip() not in others:
+                others.append(quantity.strip())
+        else:
+            total = value if total is None else total + value
+    parts = ([format_quantity(total)] if total is not None else []) + others
+    return ' + '.join(parts)
@@ -0,0 +1,100 @@
+import html
+import json
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Reads the recipe of a web page from its schema.org JSON-LD (<script type="application/ld+json">),
+# which is what most recipe sites publish for search engines. Only the JSON-LD scripts are parsed
+# (SoupStrainer), not the rest of the page. The recipe can be the script itself, one of a list
+# or in an @graph, and most of its fields come in several shapes (a string, a list, an object...).
+JSON_LD = SoupStrainer('script', attrs={'type': 'application/ld+json'})
+TAGS = re.compile(r'<[^>]+>')
+NUMBER = re.compile(r'\d+')
+
+
+def _text(value):
+    """The text of a JSON-LD string, without the HTML tags and entities some sites leave in"""
+    if not isinstance(value, str):
+        return ''
+    return ' '.join(html.unescape(TAGS.sub(' ', value)).split())
+
+
+def _is_recipe(node):
+    types = node.get('@type')
+    return 'Recipe' in types if isinstance(types, list) else types == 'Recipe'
+
+
+def _find_recipe(node):
+    if isinstance(node, list):
+        for item in node:
+            recipe = _find_recipe(item)
+            if recipe is not None:
+                return recipe
+    elif isinstance(node, dict):
+        if _is_recipe(node):
+            return node
+        if '@graph' in node:
+            return _find_recipe(node['@graph'])
+    return None
+
+
+def _image(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url')
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _servings(value):
+    """recipeYield is 4, "4", "4 servings", ["4", "4 servings"]..."""
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, int) and not isinstance(item, bool):
+            return item
+        match = NUMBER.search(item) if isinstance(item, str) else None
+        if match:
+            return int(match.group())
+    return None
+
+
+def _steps(value):
+    """recipeInstructions is a string, a list of strings, of HowToSteps or of HowToSections of HowToSteps"""
+    if isinstance(value, str):
+        return [step for step in (_text(line) for line in re.split(r'\n|<br\s*/?>|</p>', value)) if step]
+    steps = []
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, dict) and 'itemListElement' in item:
+            steps.extend(_steps(item['itemListElement']))
+        elif isinstance(item, dict):
+            steps.extend(_steps(item.get('text') or item.get('name') or ''))
+        else:
+            steps.extend(_steps(item))
+    return steps
+
+
+def extract_recipe(page):
+    """
+    Returns the recipe of the HTML page as {name, photo, servings, ingredients, steps}
+    (the ingredients being the lines as written on the page), None if the page doesn't have one
+    """
+    soup = BeautifulSoup(page, 'html.parser', parse_only=JSON_LD)
+    for script in soup.find_all('script'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        recipe = _find_recipe(data)
+        if recipe is None or not _text(recipe.get('name')):
+            continue
+        ingredients = recipe.get('recipeIngredient') or recipe.get('ingredients') or []
+        return {
+            'name': _text(recipe.get('name')),
+            'photo': _image(recipe.get('image')),
+            'servings': _servings(recipe.get('recipeYield')),
+            'ingredients': [
+                line for line in (_text(ing) for ing in (ingredients if isinstance(ingredients, list) else [ingredients])) if line
+            ],
+            'steps': _steps(recipe.get('recipeInstructions') or []),
+        }
+    return None
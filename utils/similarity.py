@@ -0,0 +1,91 @@
+import numpy as np
+
+# Cosine similarity between the rows of a binary matrix (i.e. recipes x the ingredients they use):
+# the number of columns two rows share over the square root of the product of their sizes.
+# The matrix is kept in compressed sparse form both by row (the columns of each row) and by column
+# (the rows of each column), so the shared columns of a batch of rows with every other row are counted
+# by walking the columns of the batch only, with no loop over rows in Python.
+# A batch is at most MAX_BATCH_CELLS (batch size * number of rows) so its dense score block stays small.
+MAX_BATCH_CELLS = 4_000_000
+
+
+def _compress(keys, values, size):
+    """Sorts values by key and returns (indptr, values) where the values of key k are values[indptr[k]:indptr[k + 1]]"""
+    order = np.lexsort((values, keys))
+    indptr = np.searchsorted(keys[order], np.arange(size + 1))
+    return indptr, values[order]
+
+
+def _gather(indptr, values, keys):
+    """Returns (position in keys, value) of every value of every key, with the values of a key together"""
+    starts = indptr[keys]
+    lengths = indptr[keys + 1] - starts
+    total = lengths.sum()
+    positions = np.repeat(np.arange(len(keys)), lengths)
+    # The offset of each value within its key
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return positions, values[np.repeat(starts, lengths) + offsets]
+
+
+class IncidenceMatrix:
+    def __init__(self, rows, columns, n_rows, n_columns):
+        """rows[i] uses columns[i], the (row, column) pairs being distinct"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        self.n_rows = n_rows
+        self.n_columns = n_columns
+        self.row_indptr, self.row_columns = _compress(rows, columns, n_rows)
+        self.column_indptr, self.column_rows = _compress(columns, rows, n_columns)
+        self.sizes = np.diff(self.row_indptr)
+
+    def columns_of(self, row):
+        return self.row_columns[self.row_indptr[row]:self.row_indptr[row + 1]]
+
+    def overlaps(self, columns):
+        """Returns how many of the (distinct) columns each row uses"""
+        _, rows = _gather(self.column_indptr, self.column_rows, np.asarray(columns, dtype=np.int64))
+        return np.bincount(rows, minlength=self.n_rows)
+
+    def scores(self, queries):
+        """Returns the len(queries) x n_rows cosine similarities of the query rows with every row"""
+        positions, columns = _gather(self.row_indptr, self.row_columns, queries)
+        # For every (query, column) pair, the rows that use the column too
+        pair_of, rows = _gather(self.column_indptr, self.column_rows, columns)
+        shared = np.bincount(
+            positions[pair_of] * self.n_rows + rows, minlength=len(queries) * self.n_rows
+        ).reshape(len(queries), self.n_rows)
+        norms = np.sqrt(self.sizes[queries][:, None] * self.sizes[None, :].astype(np.float64))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(shared > 0, shared / norms, 0.0)
+
+    def top_k(self, queries, k, floor=None):
+        """
+        Returns ({query: [(row, score)]}, reached) where each query's list is its k most similar other rows
+        with a score above 0, most similar first. If floor (a score per row) is given, reached is a boolean mask
+        of the rows that one of the queries scored above their floor (i.e. above the k-th score they have)
+        """
+        queries = np.asarray(queries, dtype=np.int64)
+        if floor is not None:
+            floor = np.asarray(floor, dtype=np.float64)
+        neighbours = {}
+        reached = np.zeros(self.n_rows, dtype=bool)
+        batch_size = max(1, MAX_BATCH_CELLS // max(self.n_rows, 1))
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            scores = self.scores(batch)
+            # A row isn't similar to itself
+            scores[np.arange(len(batch)), batch] = 0.0
+            if floor is not None:
+                reached |= (scores > floor[None, :]).any(axis=0)
+            count = min(k, self.n_rows)
+            best = np.argpartition(-scores, count - 1, axis=1)[:, :count] if count else np.empty((len(batch), 0), int)
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            # Sorted by score, then by row
+            order = np.lexsort((best, -best_scores), axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for query, rows, row_scores in zip(batch, best, best_scores):
+                neighbours[int(query)] = [
+                    (int(row), float(score)) for row, score in zip(rows, row_scores) if score > 0
+                ]
+        return neighbours, reached
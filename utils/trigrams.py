@@ -0,0 +1,77 @@
+import heapq
+import re
+from collections import Counter, defaultdict
+
+# Trigrams the way pg_trgm makes them, so the fallback gives the same results as Postgres:
+# lowercased words (runs of letters/digits), each padded with two spaces in front and one after
+# "Lasagna" -> {"  l", " la", "las", "asa", "sag", "agn", "gna", "na "}
+WORD = re.compile(r'[^\W_]+')
+# pg_trgm.similarity_threshold's default
+THRESHOLD = 0.3
+
+
+def trigrams(text):
+    grams = set()
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(a, b):
+    """Shared trigrams over the trigrams of either, between 0 and 1"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    shared = len(grams_a & grams_b)
+    return shared / (len(grams_a) + len(grams_b) - shared)
+
+
+class TrigramIndex:
+    """
+    Maps each trigram to the keys whose text contains it, so a search only looks at
+    the keys that share at least one trigram with the text searched for.
+    """
+    def __init__(self, items=()):
+        self.postings = defaultdict(set)
+        self.sizes = {}
+        self.texts = {}
+        for key, text in items:
+            self.add(key, text)
+
+    def add(self, key, text):
+        if key in self.texts:
+            self.remove(key)
+        grams = trigrams(text)
+        self.texts[key] = text
+        self.sizes[key] = len(grams)
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        del self.sizes[key]
+        for gram in trigrams(text):
+            self.postings[gram].discard(key)
+            if not self.postings[gram]:
+                del self.postings[gram]
+
+    def search(self, text, limit=5, threshold=THRESHOLD):
+        """Returns up to limit (key, similarity) pairs, most similar first"""
+        grams = trigrams(text)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        matches = []
+        for key, count in shared.items():
+            score = count / (len(grams) + self.sizes[key] - count)
+            if score >= threshold:
+                matches.append((score, self.texts[key], key))
+        # Ties are broken by the text so the results are stable
+        best = heapq.nsmallest(limit, matches, key=lambda match: (-match[0], match[1]))
+        return [(key, score) for score, _, key in best]
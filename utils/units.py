@@ -0,0 +1,125 @@
+import re
+from decimal import Decimal
+
+from .ingredients import singular
+from .quantities import parse_quantity
+
+# Every spelling of a unit maps to one canonical unit, and every canonical unit that can be converted
+# has a dimension and how many of the dimension's base unit (ml, g) it's worth.
+# Units that aren't in the table (clove, can, pinch...) are kept as they are, lowercased and singular.
+CONVERSIONS = {
+    'ml': ('volume', Decimal('1')),
+    'cl': ('volume', Decimal('10')),
+    'dl': ('volume', Decimal('100')),
+    'l': ('volume', Decimal('1000')),
+    'tsp': ('volume', Decimal('4.92892')),
+    'tbsp': ('volume', Decimal('14.78676')),
+    'fl oz': ('volume', Decimal('29.57353')),
+    'cup': ('volume', Decimal('236.58824')),
+    'pint': ('volume', Decimal('473.17648')),
+    'quart': ('volume', Decimal('946.35295')),
+    'gallon': ('volume', Decimal('3785.41178')),
+    'mg': ('mass', Decimal('0.001')),
+    'g': ('mass', Decimal('1')),
+    'kg': ('mass', Decimal('1000')),
+    'oz': ('mass', Decimal('28.34952')),
+    'lb': ('mass', Decimal('453.59237')),
+}
+BASE_UNITS = {'volume': 'ml', 'mass': 'g'}
+# The units an amount can be moved to once it's scaled, smallest first
+# (within a system, so 16 tbsp become 1 cup but never 236.59 ml)
+LADDERS = [['tsp', 'tbsp', 'cup'], ['ml', 'l'], ['mg', 'g', 'kg'], ['oz', 'lb']]
+LADDER_OF = {unit: ladder for ladder in LADDERS for unit in ladder}
+# How little of a unit is still written in it, 1 for the units that aren't listed (1/4 cup, but 4 tbsp rather than 1 1/3 tsp)
+LADDER_MINIMUMS = {'cup': Decimal('0.25')}
+# Amounts in these are written as decimals rather than fractions
+METRIC_UNITS = {'ml', 'cl', 'dl', 'l', 'mg', 'g', 'kg'}
+ALIASES = {
+    'milliliter': 'ml', 'millilitre': 'ml', 'mls': 'ml',
+    'centiliter': 'cl', 'centilitre': 'cl',
+    'deciliter': 'dl', 'decilitre': 'dl',
+    'liter': 'l', 'litre': 'l', 'lt': 'l',
+    'teaspoon': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp', 'tb': 'tbsp',
+    'fluid ounce': 'fl oz', 'fl. oz': 'fl oz', 'floz': 'fl oz',
+    'c': 'cup',
+    'pt': 'pint',
+    'qt': 'quart',
+    'gal': 'gallon',
+    'milligram': 'mg', 'milligramme': 'mg',
+    'gram': 'g', 'gramme': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilogramme': 'kg', 'kilo': 'kg', 'kgs': 'kg',
+    'ounce': 'oz',
+    'pound': 'lb', 'lbs': 'lb',
+}
+# Fits in Decimal(max_digits=12, decimal_places=4)
+MAX_AMOUNT = Decimal('99999999.9999')
+AMOUNT_PLACES = Decimal('0.0001')
+SPACES = re.compile(r'\s+')
+# A number followed by a unit in the quantity itself, i.e. "200g" or "2 cups"
+QUANTITY_WITH_UNIT = re.compile(r'^(?P<quantity>.*[\d¼½¾⅓⅔⅛])\s*(?P<unit>[^\W\d_][\w. ]*)$')
+
+
+def canonical_unit(unit):
+    unit = SPACES.sub(' ', unit.strip().lower()).rstrip('.')
+    if unit in CONVERSIONS:
+        return unit
+    if unit in ALIASES:
+        return ALIASES[unit]
+    unit = singular(unit)
+    return ALIASES.get(unit, unit)
+
+
+def parse_amount(quantity, unit):
+    """
+    Returns (amount, canonical unit) from the free text quantity and unit of an ingredient,
+    amount being a Decimal, or None if the quantity isn't a number
+    """
+    value = parse_quantity(quantity)
+    if value is None and not unit.strip():
+        match = QUANTITY_WITH_UNIT.match(quantity.strip())
+        if match:
+            value = parse_quantity(match.group('quantity'))
+            if value is not None:
+                unit = match.group('unit')
+    canonical = canonical_unit(unit)
+    if value is None:
+        return None, canonical
+    amount = Decimal(value.numerator) / Decimal(value.denominator)
+    # Checked before quantizing too, which raises InvalidOperation past the context's 28 digits
+    if amount > MAX_AMOUNT or amount.quantize(AMOUNT_PLACES) > MAX_AMOUNT:
+        return None, canonical
+    amount = amount.quantize(AMOUNT_PLACES)
+    return amount, canonical
+
+
+def to_base_unit(amount, unit):
+    """Returns (amount in the base unit, base unit), or the amount and unit as they are if they can't be converted"""
+    if unit not in CONVERSIONS:
+        return amount, unit
+    dimension, factor = CONVERSIONS[unit]
+    return amount * factor, BASE_UNITS[dimension]
+
+
+def from_base_unit(amount, unit):
+    """Converts an amount in the base unit of unit's dimension into unit"""
+    if unit not in CONVERSIONS:
+        return amount
+    return amount / CONVERSIONS[unit][1]
+
+
+def sensible_unit(amount, unit):
+    """
+    Returns (amount, unit) in the biggest unit of unit's ladder the amount is at least its minimum of
+    (or the smallest one), i.e. 48 tsp -> 1 cup, 0.0625 cup -> 1 tbsp, 1500 g -> 1.5 kg
+    """
+    ladder = LADDER_OF.get(unit)
+    if ladder is None:
+        return amount, unit
+    in_base, _ = to_base_unit(amount, unit)
+    for candidate in reversed(ladder):
+        converted = from_base_unit(in_base, candidate)
+        # The factors are rounded, so 48 tsp are 0.99999 cup
+        if converted >= LADDER_MINIMUMS.get(candidate, 1) - Decimal('0.001'):
+            return converted, candidate
+    return from_base_unit(in_base, ladder[0]), ladder[0]